@@ -0,0 +1,80 @@
+"""Compare ModelSerializer + JSONRenderer with the values_list fast path.
+
+Usage: python benchmarks/list_serialization.py [--rows 10000] [--repeat 5]
+
+Rows are built in memory, so no database is needed; only the settings module
+has to be importable.
+"""
+import argparse
+import datetime
+import os
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'secureinvestor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from investors.models import AuditLog, Document  # noqa: E402
+from investors.renderers import ORJSONRenderer  # noqa: E402
+from investors.rows import row_shaper  # noqa: E402
+from investors.serializers import AuditLogSerializer, DocumentSerializer  # noqa: E402
+
+
+def build(rows):
+    start = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+    documents = [
+        Document(id=i, investor_id=i % 500, name=f'statement-{i}', file=f'documents/s{i}.pdf',
+                 uploaded_at=start + datetime.timedelta(seconds=i), version=i % 7 + 1,
+                 previous_version_id=i - 1 if i % 7 else None, doc_type='statement')
+        for i in range(1, rows + 1)
+    ]
+    logs = [
+        AuditLog(id=i, user_id=i % 500, action='DOWNLOAD', timestamp=start + datetime.timedelta(seconds=i),
+                 details=f"Downloaded/viewed document 'statement-{i}' (ID: {i}, version: 1)")
+        for i in range(1, rows + 1)
+    ]
+    return documents, logs
+
+
+def as_rows(objects, columns):
+    # What values_list() would return for the same objects
+    return [tuple(getattr(obj, Document._meta.get_field(column).attname if isinstance(obj, Document)
+                          else AuditLog._meta.get_field(column).attname) for column in columns) for obj in objects]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    documents, logs = build(args.rows)
+    for label, objects, serializer_class in (
+        ('documents', documents, DocumentSerializer),
+        ('audit logs', logs, AuditLogSerializer),
+    ):
+        columns, shape_rows = row_shaper(serializer_class)
+        rows = as_rows(objects, columns)
+
+        def slow():
+            return JSONRenderer().render(serializer_class(objects, many=True).data)
+
+        def fast():
+            return ORJSONRenderer().render(shape_rows(rows))
+
+        assert slow() == fast(), f"{label}: fast path output differs"
+        slow_time = min(timeit.repeat(slow, number=1, repeat=args.repeat))
+        fast_time = min(timeit.repeat(fast, number=1, repeat=args.repeat))
+        print(f"{label:>10} x {args.rows}: serializer {slow_time * 1000:8.1f} ms | "
+              f"fast path {fast_time * 1000:8.1f} ms | {slow_time / fast_time:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Concurrent-request load test for the S3-bound document endpoints.
+
+Usage:
+    python benchmarks/load_test.py --token TOKEN --document 42 \\
+        --url http://localhost:8000 --url http://localhost:8001 \\
+        [--endpoint download|history|upload] [--concurrency 50] [--requests 500]
+
+Run it against the WSGI deployment (``docker compose up web``, :8000) and the
+ASGI one (``docker compose --profile asgi up web-asgi``, :8001) with the same
+arguments. Each URL gets the same workload: ``--requests`` requests from
+``--concurrency`` clients at once. Throughput, latency percentiles and errors
+are printed per URL. Only the standard library is used, so no Django setup
+is needed.
+"""
+import argparse
+import http.client
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+
+def build_request(args):
+    """Return (method, path, body, headers) for one request of ``args.endpoint``."""
+    headers = {'Authorization': f'Token {args.token}'}
+    if args.endpoint == 'download':
+        return 'GET', f'/api/documents/{args.document}/download/', None, headers
+    if args.endpoint == 'history':
+        return 'GET', f'/api/documents/{args.document}/history/', None, headers
+
+    boundary = uuid.uuid4().hex
+    with open(args.file, 'rb') as fh:
+        content = fh.read()
+    body = b''.join([
+        f'--{boundary}\r\nContent-Disposition: form-data; name="name"\r\n\r\nload-test\r\n'.encode(),
+        f'--{boundary}\r\nContent-Disposition: form-data; name="doc_type"\r\n\r\nother\r\n'.encode(),
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="load-test.pdf"\r\n'
+        f'Content-Type: application/pdf\r\n\r\n'.encode(),
+        content,
+        f'\r\n--{boundary}--\r\n'.encode(),
+    ])
+    headers['Content-Type'] = f'multipart/form-data; boundary={boundary}'
+    return 'POST', '/api/documents/', body, headers
+
+
+def run(url, request, concurrency, total, timeout):
+    method, path, body, headers = request
+    parts = urlsplit(url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    local = threading.local()
+    latencies, errors = [], []
+
+    def one(_):
+        # One keep-alive connection per client thread, like a browser or API client
+        if getattr(local, 'connection', None) is None:
+            local.connection = connection_class(parts.netloc, timeout=timeout)
+        started = time.perf_counter()
+        try:
+            local.connection.request(method, path, body=body, headers=headers)
+            response = local.connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException) as exc:
+            local.connection.close()
+            local.connection = None
+            errors.append(type(exc).__name__)
+            return
+        if status >= 400:
+            errors.append(str(status))
+        else:
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    return time.perf_counter() - started, latencies, errors
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', action='append', required=True, help='Base URL; repeat to compare deployments')
+    parser.add_argument('--token', required=True)
+    parser.add_argument('--endpoint', choices=['download', 'history', 'upload'], default='download')
+    parser.add_argument('--document', type=int, help='Document id for download/history')
+    parser.add_argument('--file', help='File to upload for --endpoint upload')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args()
+    if args.endpoint == 'upload' and not args.file:
+        parser.error('--endpoint upload needs --file')
+    if args.endpoint != 'upload' and args.document is None:
+        parser.error(f'--endpoint {args.endpoint} needs --document')
+
+    request = build_request(args)
+    print(f'{args.endpoint}: {args.requests} requests, {args.concurrency} concurrent')
+    print(f'{"url":<32} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"max ms":>8} {"errors":>7}')
+    for url in args.url:
+        elapsed, latencies, errors = run(url, request, args.concurrency, args.requests, args.timeout)
+        if latencies:
+            ms = [latency * 1000 for latency in latencies]
+            print(f'{url:<32} {len(latencies) / elapsed:8.1f} {statistics.median(ms):8.1f} '
+                  f'{percentile(ms, 95):8.1f} {percentile(ms, 99):8.1f} {max(ms):8.1f} {len(errors):7d}')
+        else:
+            print(f'{url:<32} {"-":>8} {"-":>8} {"-":>8} {"-":>8} {"-":>8} {len(errors):7d}')
+        if errors:
+            print(f'  errors: {", ".join(sorted(set(errors)))}')
+
+
+if __name__ == '__main__':
+    main()
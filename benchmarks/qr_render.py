@@ -0,0 +1,57 @@
+"""Compare QR code rendering for MFA setup: the old inline PNG, the current PNG and SVG.
+
+Usage: python benchmarks/qr_render.py [--number 200] [--repeat 5]
+
+Needs only the project's dependencies, no database or settings.
+"""
+import argparse
+import base64
+import io
+import sys
+import time
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+URI = ('otpauth://totp/SecureInvestor:investor%40example.com'
+       '?secret=JBSWY3DPEHPK3PXPJBSWY3DPEHPK3PXP&issuer=SecureInvestor')
+
+
+def legacy_png():
+    # What setup_mfa used to do on every request
+    import qrcode
+
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(URI)
+    qr.make(fit=True)
+    buffer = io.BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    import qrcode  # noqa: F401
+    print(f"import qrcode (+Pillow): {(time.perf_counter() - started) * 1000:.1f} ms, now deferred to first render")
+
+    from investors.qr import render_qr
+
+    for label, render in (
+        ('legacy png', legacy_png),
+        ('png', lambda: render_qr.__wrapped__(URI, 'png')),
+        ('svg', lambda: render_qr.__wrapped__(URI, 'svg')),
+    ):
+        body = render()
+        best = min(timeit.repeat(render, number=args.number, repeat=args.repeat)) / args.number
+        print(f"{label:>10}: {best * 1000:6.2f} ms/render | {len(body):6d} bytes | "
+              f"{len(base64.b64encode(body)):6d} bytes as base64")
+
+
+if __name__ == '__main__':
+    main()
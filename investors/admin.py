@@ -1,7 +1,9 @@
+import re
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
-from .models import InvestorProfile, Document, AuditLog
+from .models import InvestorProfile, Document, DocumentBlob, DocumentLineage, AuditLog, AuthToken, Job
 from .forms import CustomUserCreationForm
 
 # Register your models here.
@@ -16,10 +18,49 @@ class DocumentAdmin(admin.ModelAdmin):
     list_filter = ('doc_type', 'uploaded_at')
     search_fields = ('name',)
 
+@admin.register(DocumentBlob)
+class DocumentBlobAdmin(admin.ModelAdmin):
+    list_display = ('sha256', 'size', 'content_type', 'ref_count', 'updated_at')
+    search_fields = ('=sha256',)
+    readonly_fields = ('sha256', 's3_key', 'size', 'content_type', 'ref_count', 'created_at', 'updated_at', 'verified_at')
+
+@admin.register(DocumentLineage)
+class DocumentLineageAdmin(admin.ModelAdmin):
+    list_display = ('name', 'investor', 'doc_type', 'latest_version', 'version_count', 'updated_at')
+    list_filter = ('doc_type',)
+    search_fields = ('name',)
+    raw_id_fields = ('head',)
+
+@admin.register(AuthToken)
+class AuthTokenAdmin(admin.ModelAdmin):
+    list_display = ('user', 'device', 'created_at', 'expires_at', 'revoked_at')
+    list_select_related = ('user',)
+    list_filter = ('revoked_at',)
+    search_fields = ('user__username', 'device')
+    readonly_fields = ('created_at',)
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'status', 'attempts', 'run_at', 'created_at')
+    list_filter = ('status', 'task')
+    readonly_fields = ('created_at', 'locked_at', 'last_error')
+
 @admin.register(AuditLog)
 class AuditLogAdmin(admin.ModelAdmin):
     list_display = ('timestamp', 'user', 'action')
-    search_fields = ('action', 'details')
+    list_select_related = ('user',)
+    search_fields = ('=action',)
+    # Skip the unfiltered COUNT(*) over the whole audit table on every page
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if re.fullmatch(r'[A-Z_]+', search_term):
+            # An event type such as LOGIN or MFA_ENABLED: exact, indexed match
+            return queryset.filter(action=search_term), False
+        return queryset.search(search_term), False
 
 class UserAdmin(BaseUserAdmin):
     add_form = CustomUserCreationForm
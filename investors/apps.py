@@ -6,12 +6,36 @@ class InvestorsConfig(AppConfig):
     name = 'investors'
 
     def ready(self):
-        from django.db.models.signals import pre_save
+        from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
         from django.core.exceptions import ValidationError
         from django.contrib.auth.models import User
+        from rest_framework.authtoken.models import Token
+        from . import signals
+        from .models import AuthToken, Document, InvestorProfile
 
         def require_email(sender, instance, **kwargs):
             if not instance.email:
                 raise ValidationError("Email is required for all users.")
 
         pre_save.connect(require_email, sender=User)
+
+        post_save.connect(signals.user_changed, sender=User)
+        post_delete.connect(signals.user_changed, sender=User)
+        post_save.connect(signals.profile_changed, sender=InvestorProfile)
+        post_delete.connect(signals.profile_changed, sender=InvestorProfile)
+        post_delete.connect(signals.token_deleted, sender=Token)
+        post_save.connect(signals.auth_token_changed, sender=AuthToken)
+        post_delete.connect(signals.auth_token_deleted, sender=AuthToken)
+        post_save.connect(signals.document_saved, sender=Document)
+        post_delete.connect(signals.document_deleted, sender=Document)
+
+        def ensure_audit_partitions(sender, using, **kwargs):
+            from django.db import connections, transaction
+            from . import partitions
+
+            connection = connections[using]
+            if partitions.is_partitioned(connection):
+                with transaction.atomic(using=using):
+                    partitions.ensure_partitions(connection)
+
+        post_migrate.connect(ensure_audit_partitions, sender=self)
@@ -0,0 +1,129 @@
+"""Zip archives of documents, assembled while the documents stream from S3.
+
+zipfile writes onto an unseekable sink, so each entry's size and CRC follow
+its data in a data descriptor and nothing is buffered or rewound. Entries
+are stored, not deflated: documents are mostly PDFs and images, which are
+already compressed. Objects are requested ARCHIVE_PREFETCH ahead of the one
+being written, which hides S3's time to first byte. Memory per archive stays
+at a few ARCHIVE_CHUNK_SIZE chunks, whatever the size of the archive.
+"""
+import mimetypes
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .storage import get_s3_client
+from .streaming import streaming_content
+
+COLUMNS = ('id', 'investor__user__username', 'doc_type', 'name', 'version', 'file', 'blob__content_type', 'uploaded_at')
+
+
+class ArchiveEntry:
+    __slots__ = ('id', 'username', 'doc_type', 'name', 'version', 'key', 'content_type', 'uploaded_at')
+
+    def __init__(self, *values):
+        for slot, value in zip(self.__slots__, values):
+            setattr(self, slot, value)
+
+    @property
+    def path(self):
+        # (investor, doc_type, name, version) is unique, so paths never collide
+        extension = os.path.splitext(self.key)[1] or mimetypes.guess_extension(self.content_type or '') or ''
+        name = self.name.replace('/', '_').replace('\\', '_')
+        return f'{self.username}/{self.doc_type}/{name} v{self.version}{extension}'
+
+
+def archive_entries(queryset, limit):
+    """The documents of ``queryset`` as ArchiveEntry objects, at most ``limit`` of them."""
+    return [ArchiveEntry(*row) for row in queryset.values_list(*COLUMNS)[:limit]]
+
+
+class _Sink:
+    """Write-only file object collecting zipfile's output until the generator sends it."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _open(key):
+    return get_s3_client().get_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key)['Body']
+
+
+def _zip_stream(entries):
+    sink = _Sink()
+    archive = zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_STORED)
+    failed = []
+    pending = deque()
+    remaining = iter(entries)
+    with ThreadPoolExecutor(max_workers=settings.ARCHIVE_PREFETCH) as pool:
+        def prefetch():
+            while len(pending) < settings.ARCHIVE_PREFETCH:
+                entry = next(remaining, None)
+                if entry is None:
+                    return
+                pending.append((entry, pool.submit(_open, entry.key)))
+
+        try:
+            prefetch()
+            while pending:
+                entry, future = pending.popleft()
+                prefetch()
+                try:
+                    body = future.result()
+                except Exception as exc:
+                    failed.append(f'{entry.path}: {exc}')
+                    continue
+
+                info = zipfile.ZipInfo(entry.path, date_time=entry.uploaded_at.timetuple()[:6])
+                info.compress_type = zipfile.ZIP_STORED
+                try:
+                    # force_zip64: sizes aren't known up front and may exceed 4 GiB
+                    with archive.open(info, mode='w', force_zip64=True) as member:
+                        for chunk in body.iter_chunks(chunk_size=settings.ARCHIVE_CHUNK_SIZE):
+                            member.write(chunk)
+                            yield sink.drain()
+                except Exception as exc:
+                    # Bytes already sent can't be taken back; the entry stays truncated and is reported
+                    failed.append(f'{entry.path}: incomplete, {exc}')
+                finally:
+                    body.close()
+
+            if failed:
+                archive.writestr('ERRORS.txt', 'These documents could not be read from storage:\n' + '\n'.join(failed) + '\n')
+            archive.close()
+            yield sink.drain()
+        finally:
+            # The client went away (or we're done): release the S3 responses opened ahead
+            for _, future in pending:
+                if future.cancel():
+                    continue
+                try:
+                    future.result().close()
+                except Exception:
+                    pass
+
+
+def archive_response(request, entries, basename):
+    """Stream ``entries`` (see ``archive_entries``) as a zip attachment."""
+    response = StreamingHttpResponse(streaming_content(request, _zip_stream(entries)), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{basename}-{timezone.now():%Y%m%d-%H%M%S}.zip"'
+    # Built per request, so byte offsets aren't stable across requests and ranges can't be served
+    response['Accept-Ranges'] = 'none'
+    return response
@@ -0,0 +1,69 @@
+"""Awaitable S3 calls for the async document views.
+
+boto3 is blocking, so each call runs on a thread pool sized to the shared
+client's connection pool (AWS_S3_MAX_POOL_CONNECTIONS). A slow S3 round trip
+holds one of those threads rather than the event loop, and no more calls are
+in flight than there are connections to carry them.
+"""
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from . import storage
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=settings.AWS_S3_MAX_POOL_CONNECTIONS,
+                                               thread_name_prefix='s3')
+                _executor_pid = pid
+    return _executor
+
+
+async def run(func, *args, **kwargs):
+    """Run a blocking S3 helper on the S3 thread pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+async def head_object(key):
+    return await run(storage.get_s3_client().head_object, Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key)
+
+
+async def upload_document(file_obj, key, content_type=None, sha256=None):
+    await run(storage.upload_document, file_obj, key, content_type=content_type, sha256=sha256)
+
+
+async def file_sha256(file_obj):
+    # Only hashes when the upload handler didn't, but that reads the whole file
+    return await run(storage.file_sha256, file_obj)
+
+
+async def presigned_download_url(key, user_id, disposition=None):
+    # Usually a cache hit, but a miss signs and a shared-cache lookup is a network call
+    return await run(storage.presigned_download_url, key, user_id, disposition)
+
+
+async def iter_body(body, chunk_size=None):
+    """Relay an S3 body in fixed-size chunks, reading each one on the S3 thread pool."""
+    chunk_size = chunk_size or settings.DOCUMENT_STREAM_CHUNK_SIZE
+    try:
+        while True:
+            chunk = await run(body.read, chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        body.close()
@@ -0,0 +1,15 @@
+"""Routes for ``investors.async_views``, mounted under ``api/`` ahead of the router.
+
+Only the async endpoints are listed; every other URL falls through to the
+sync DRF router.
+"""
+from django.urls import path
+
+from . import async_views
+
+urlpatterns = [
+    path('documents/', async_views.documents, name='document-list-async'),
+    path('documents/<int:pk>/download/', async_views.download, name='document-download-async'),
+    path('documents/<int:pk>/history/', async_views.history, name='document-history-async'),
+    path('documents/<uuid:upload_id>/finalize/', async_views.finalize, name='document-finalize-async'),
+]
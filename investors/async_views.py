@@ -0,0 +1,249 @@
+"""Async versions of the S3-bound document endpoints, served when ASYNC_DOCUMENT_VIEWS is on.
+
+Under ASGI a request waiting on S3 no longer holds a worker: S3 calls are
+awaited on ``async_storage``'s thread pool and lookups use the async ORM.
+What the async ORM can't do (transactions, pagination, audit entries) runs
+through ``sync_to_async``.
+
+DRF views are synchronous, so these are plain Django async views built from
+DRF's parts: the configured authenticators and parsers, DocumentViewSet's
+querysets, serializers and paginator, and DRF's exception handler. Responses
+match those of the sync endpoints.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from botocore.exceptions import ClientError
+from django.http import Http404
+from rest_framework import exceptions, serializers
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from . import async_storage, downloads
+from .audit import audit_log
+from .models import DocumentLineage, InvestorProfile, PendingUpload
+from .pagination import paginated_envelope
+from .renderers import ORJSONRenderer
+from .uploads import astore_blob
+from .views import DocumentViewSet, download_filename, record_pending_upload
+
+
+def _authenticate(request):
+    # Reading .user runs the authenticators, which may hit the cache and the database
+    if not request.user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+
+
+def _handle_exception(exc, request):
+    # Same status and header choice as APIView.handle_exception
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        header = request.authenticators[0].authenticate_header(request) if request.authenticators else None
+        if header:
+            exc.auth_header = header
+        else:
+            exc.status_code = 403
+    response = exception_handler(exc, {'request': request})
+    if response is None:
+        raise exc
+    return response
+
+
+def _render(response, request):
+    if not isinstance(response, Response):
+        return response  # streamed or otherwise finished already
+    response.accepted_renderer = ORJSONRenderer()
+    response.accepted_media_type = ORJSONRenderer.media_type
+    response.renderer_context = {'request': request, 'response': response}
+    return response.render()
+
+
+def async_api_view(methods):
+    """Make an async Django view of ``func(request, *args, **kwargs)`` taking a DRF Request.
+
+    Only authenticated users get through, errors are rendered by DRF's
+    exception handler and returned ``Response`` objects are rendered as JSON.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def view(request, *args, **kwargs):
+            request = Request(
+                request,
+                parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+                authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+            )
+            try:
+                await sync_to_async(_authenticate)(request)
+                if request.method not in methods:
+                    raise exceptions.MethodNotAllowed(request.method)
+                response = await func(request, *args, **kwargs)
+            except Exception as exc:
+                response = _handle_exception(exc, request)
+            return _render(response, request)
+
+        # Like APIView: SessionAuthentication enforces CSRF itself and token clients have no cookie
+        view.csrf_exempt = True
+        return view
+    return decorator
+
+
+def _document_view(request, action, **kwargs):
+    """A DocumentViewSet bound to ``request``, for its querysets, serializers and paginator."""
+    return DocumentViewSet(request=request, action=action, args=(), kwargs=kwargs, format_kwarg=None)
+
+
+async def _get_object(view):
+    queryset = view.filter_queryset(view.get_queryset())
+    instance = await queryset.filter(pk=view.kwargs['pk']).afirst()
+    if instance is None:
+        raise Http404
+    return instance
+
+
+def _serialize(view, instance):
+    return view.get_serializer(instance).data
+
+
+def _profile(user):
+    try:
+        return user.profile
+    except InvestorProfile.DoesNotExist:
+        return None
+
+
+def _validated_upload(view):
+    # Parsing spools the multipart body to disk, so this runs off the event loop too
+    serializer = view.get_serializer(data=view.request.data)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+@async_api_view(['POST'])
+async def upload(request):
+    """Async ``DocumentViewSet.create``; responds with the new document."""
+    view = _document_view(request, 'create')
+    investor_profile = await sync_to_async(_profile)(request.user)
+    if investor_profile is None:
+        raise serializers.ValidationError({"error": "User must have an investor profile to upload documents"})
+
+    data = await sync_to_async(_validated_upload)(view)
+    blob = await astore_blob(data['file'])
+    document = await sync_to_async(DocumentLineage.record_version)(
+        investor=investor_profile,
+        name=data['name'],
+        doc_type=data['doc_type'],
+        file=blob.s3_key,
+        blob=blob,
+    )
+    await sync_to_async(audit_log)(
+        user=request.user,
+        action="UPLOAD",
+        details=f"Uploaded document '{document.name}' (ID: {document.id}, version: {document.version})"
+    )
+    return Response(await sync_to_async(_serialize)(view, document), status=201)
+
+
+_document_list = DocumentViewSet.as_view({'get': 'list'})
+
+
+async def documents(request):
+    """``/api/documents/``: uploads are async, listing stays on the sync viewset."""
+    if request.method == 'POST':
+        return await upload(request)
+    return await sync_to_async(_document_list)(request)
+
+
+documents.csrf_exempt = True
+
+
+@async_api_view(['POST'])
+async def finalize(request, upload_id):
+    """Async ``DocumentViewSet.finalize``."""
+    view = _document_view(request, 'finalize', upload_id=upload_id)
+    pending = await PendingUpload.objects.select_related('document').filter(
+        pk=upload_id, investor__user=request.user
+    ).afirst()
+    if pending is None:
+        raise Http404
+    if pending.document_id:
+        return Response(await sync_to_async(_serialize)(view, pending.document))
+    if pending.is_expired():
+        return Response({"error": "Upload has expired; request a new upload URL"}, status=410)
+
+    try:
+        head = await async_storage.head_object(pending.s3_key)
+    except ClientError:
+        return Response({"error": "File has not been uploaded"}, status=400)
+
+    if head['ContentLength'] > pending.max_size or head.get('ContentType') != pending.content_type:
+        return Response({"error": "Uploaded file does not match the requested upload"}, status=400)
+
+    # The async ORM has no transactions; the locked section runs on a sync thread
+    document, created = await sync_to_async(record_pending_upload)(pending)
+    data = await sync_to_async(_serialize)(view, document)
+    if not created:
+        return Response(data)
+
+    await sync_to_async(audit_log)(
+        user=request.user,
+        action="UPLOAD",
+        details=f"Uploaded document '{document.name}' (ID: {document.id}, version: {document.version})"
+    )
+    return Response(data, status=201)
+
+
+@async_api_view(['GET'])
+async def download(request, pk):
+    """Async ``DocumentViewSet.download``."""
+    view = _document_view(request, 'download', pk=pk)
+    document = await _get_object(view)
+
+    mode = request.query_params.get('mode', 'url')
+    if mode not in ('url', 'stream'):
+        return Response({"error": "mode must be 'url' or 'stream'"}, status=400)
+    disposition = request.query_params.get('disposition')
+    if disposition and disposition not in ('inline', 'attachment'):
+        return Response({"error": "disposition must be 'inline' or 'attachment'"}, status=400)
+    if mode == 'stream':
+        s3_object, response = await async_storage.run(
+            downloads.fetch, downloads.get_object_params(request, document.file.name)
+        )
+        if response is not None:
+            return response
+        return downloads.streaming_response(s3_object, async_storage.iter_body(s3_object['Body']),
+                                            download_filename(document), disposition or 'inline')
+    if disposition:
+        disposition = f'{disposition}; filename="{download_filename(document)}"'
+
+    url = await async_storage.presigned_download_url(document.file.name, request.user.id, disposition)
+    return Response({'url': url, 'sha256': document.blob.sha256 if document.blob_id else None})
+
+
+@async_api_view(['GET'])
+async def history(request, pk):
+    """Async ``DocumentViewSet.history``."""
+    view = _document_view(request, 'history', pk=pk)
+    instance = await _get_object(view)
+    versions = view.get_queryset().filter(
+        investor_id=instance.investor_id,
+        name=instance.name,
+        doc_type=instance.doc_type
+    ).order_by('-version')
+    lineage = await DocumentLineage.objects.filter(
+        investor_id=instance.investor_id,
+        name=instance.name,
+        doc_type=instance.doc_type
+    ).afirst()
+
+    await sync_to_async(audit_log)(
+        user=request.user,
+        action="VIEW_HISTORY",
+        details=f"Viewed version history for document '{instance.name}'"
+    )
+    return await sync_to_async(paginated_envelope)(
+        view, versions, 'versions', ordering=('-version',),
+        document_name=instance.name,
+        document_type=instance.doc_type,
+        total_versions=lineage.version_count if lineage else await versions.acount()
+    )
@@ -0,0 +1,210 @@
+"""Buffered AuditLog writer.
+
+Views call ``audit_log()`` instead of ``AuditLog.objects.create()``. Entries
+are appended to a per-process spool file, queued in memory and written with
+``bulk_create`` by a background thread once AUDIT_LOG_BATCH_SIZE entries are
+waiting or AUDIT_LOG_FLUSH_INTERVAL seconds have passed. A spool segment is
+only deleted after its entries are committed, and segments left behind by a
+crashed process are replayed when the next sink starts, so a crash does not
+lose compliance records. With AUDIT_LOG_SYNC every entry is written inline.
+"""
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, close_old_connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+
+def _entry(user, action, details=''):
+    return {
+        'user_id': getattr(user, 'pk', user),
+        'action': action,
+        'details': details,
+        'timestamp': timezone.now().isoformat(),
+    }
+
+
+def _write(entries):
+    rows = [
+        AuditLog(
+            user_id=entry['user_id'],
+            action=entry['action'],
+            details=entry['details'],
+            timestamp=parse_datetime(entry['timestamp']),
+        )
+        for entry in entries
+    ]
+    try:
+        AuditLog.objects.bulk_create(rows, batch_size=500)
+    except IntegrityError:
+        # A user deleted while the entry was queued; keep the record, as SET_NULL would have
+        existing = set(User.objects.filter(pk__in={row.user_id for row in rows}).values_list('pk', flat=True))
+        for row in rows:
+            if row.user_id not in existing:
+                row.user_id = None
+        AuditLog.objects.bulk_create(rows, batch_size=500)
+
+
+class AuditSink:
+    def __init__(self, batch_size, flush_interval, spool_dir):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_dir = Path(spool_dir)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = []
+        self._segment = None
+        self._pid = None
+
+    def record(self, entries):
+        with self._lock:
+            self._ensure_started()
+            for entry in entries:
+                self._segment.write(json.dumps(entry) + '\n')
+            self._segment.flush()
+            self._pending.extend(entries)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._lock:
+            if not self._pending or self._pid != os.getpid():
+                return
+            batch, self._pending = self._pending, []
+            segment, self._segment = self._segment, self._open_segment()
+
+        try:
+            _write(batch)
+        except Exception:
+            logger.exception("Failed to write %d audit log entries; will retry", len(batch))
+            with self._lock:
+                # Carry the entries over into the live segment before dropping the old one
+                for entry in batch:
+                    self._segment.write(json.dumps(entry) + '\n')
+                self._segment.flush()
+                self._pending[:0] = batch
+        self._discard(segment)
+
+    def close(self):
+        """Flush at interpreter exit; the empty live segment is removed once nothing is pending."""
+        self.flush()
+        with self._lock:
+            if self._pid == os.getpid() and not self._pending and self._segment is not None:
+                self._discard(self._segment)
+                self._segment = None
+                self._pid = None
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        # First use in this process (or in a forked child): never share the parent's segment
+        if self._segment is not None:
+            self._segment.close()
+        self._pending = []
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self._segment = self._open_segment()
+        self._pid = os.getpid()
+        threading.Thread(target=self._run, name='audit-log-writer', daemon=True).start()
+        atexit.register(self.close)
+
+    def _open_segment(self):
+        path = self.spool_dir / f'audit-{os.getpid()}-{uuid.uuid4().hex}.jsonl'
+        segment = open(path, 'a', encoding='utf-8')
+        # Held until the segment is deleted; replay skips segments locked by a live process
+        fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return segment
+
+    @staticmethod
+    def _discard(segment):
+        Path(segment.name).unlink(missing_ok=True)
+        segment.close()
+
+    def _run(self):
+        try:
+            self.replay_spool()
+        except Exception:
+            logger.exception("Failed to replay audit log spool")
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def replay_spool(self):
+        """Write out segments left behind by processes that died before flushing them."""
+        for path in sorted(self.spool_dir.glob('audit-*.jsonl')):
+            try:
+                segment = open(path, 'r+', encoding='utf-8')
+            except FileNotFoundError:
+                continue  # replayed by another process since the glob
+            with segment:
+                try:
+                    fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                if os.fstat(segment.fileno()).st_nlink == 0:
+                    # Another replayer wrote and unlinked it between our open and our lock
+                    continue
+                entries = []
+                for line in segment:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        logger.warning("Skipping truncated audit spool line in %s", path)
+                if entries:
+                    _write(entries)
+                    logger.info("Replayed %d audit log entries from %s", len(entries), path)
+                os.unlink(path)
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_sink():
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                _sink = AuditSink(
+                    batch_size=settings.AUDIT_LOG_BATCH_SIZE,
+                    flush_interval=settings.AUDIT_LOG_FLUSH_INTERVAL,
+                    spool_dir=settings.AUDIT_LOG_SPOOL_DIR,
+                )
+    return _sink
+
+
+def audit_log(user, action, details=''):
+    """Record an audit entry for ``user`` (a User, a user id or None)."""
+    audit_log_many([(user, action, details)])
+
+
+def audit_log_many(records):
+    """Record several (user, action, details) entries in one batch."""
+    entries = [_entry(*record) for record in records]
+    if settings.AUDIT_LOG_SYNC:
+        _write(entries)
+    else:
+        get_sink().record(entries)
+
+
+def flush_audit_log():
+    """Write out everything queued in this process."""
+    if _sink is not None:
+        _sink.flush()
@@ -0,0 +1,205 @@
+"""Token authentication backed by short-lived cached user snapshots.
+
+Two token formats are accepted under the ``Token`` keyword:
+
+* signed tokens issued by ``login_with_mfa``: ``signing.dumps`` of
+  ``{'uid', 'tid', 'exp'}``. The HMAC and expiry are checked in-process, and
+  revocation is looked up in the cache, falling back to the ``AuthToken`` row;
+* legacy DRF ``Token`` keys from ``/api/auth/token/``.
+
+Either way the user (with profile) comes from a cached snapshot, so a warm
+request needs no queries. Snapshots hold only the fields requests check;
+credentials are never cached.
+"""
+import datetime
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .models import AuthToken, InvestorProfile
+
+TOKEN_SALT = 'investors.authtoken'
+ACTIVE, REVOKED = 'active', 'revoked'
+
+
+def user_cache_key(user_id):
+    return f'authuser:{user_id}'
+
+
+def token_cache_key(key):
+    # Hash so raw tokens never show up in cache keys
+    return 'authtoken:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def token_state_key(token_id):
+    return f'authtoken:state:{token_id}'
+
+
+def invalidate_user(user_id):
+    """Drop the cached user/profile snapshot so the next request reloads it."""
+    cache.delete(user_cache_key(user_id))
+
+
+def invalidate_token(key):
+    cache.delete(token_cache_key(key))
+
+
+# What requests need of a user and profile. Credentials (password hash, MFA secret,
+# backup codes) stay out of the shared cache; they are deferred and load on access.
+def _loaded_fields(model, names):
+    # from_db takes a subset of fields in the model's field order
+    return tuple(field.attname for field in model._meta.concrete_fields if field.attname in names)
+
+
+USER_FIELDS = _loaded_fields(User, {'id', 'username', 'is_active', 'is_staff', 'is_superuser'})
+PROFILE_FIELDS = _loaded_fields(InvestorProfile, {'id', 'user_id', 'mfa_enabled'})
+
+
+def _snapshot(user):
+    try:
+        profile = user.profile
+    except InvestorProfile.DoesNotExist:
+        profile = None
+    return (
+        tuple(getattr(user, name) for name in USER_FIELDS),
+        tuple(getattr(profile, name) for name in PROFILE_FIELDS) if profile else None,
+    )
+
+
+def _from_snapshot(snapshot):
+    user_values, profile_values = snapshot
+    # from_db marks the other fields deferred, and save() then writes only the loaded ones
+    user = User.from_db('default', USER_FIELDS, user_values)
+    if profile_values is None:
+        user._state.fields_cache['profile'] = None  # hasattr(user, 'profile') is False, without a query
+    else:
+        user.profile = InvestorProfile.from_db('default', PROFILE_FIELDS, profile_values)
+    return user
+
+
+def _cache_user(user):
+    cache.set(user_cache_key(user.pk), _snapshot(user), settings.AUTH_TOKEN_CACHE_TTL)
+
+
+def _cached_user(user_id):
+    snapshot = cache.get(user_cache_key(user_id))
+    if snapshot is None:
+        user = User.objects.select_related('profile').filter(pk=user_id).first()
+        if user is None:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        _cache_user(user)
+        return user
+    return _from_snapshot(snapshot)
+
+
+def issue_token(user, device=''):
+    """Create an AuthToken for ``user`` on ``device`` and return (signed token, row).
+
+    Earlier tokens for the same device are revoked and the user's expired rows pruned.
+    """
+    now = timezone.now()
+    revoke_tokens(AuthToken.objects.filter(user=user, device=device))
+    AuthToken.objects.filter(user=user, expires_at__lte=now).delete()
+
+    row = AuthToken.objects.create(
+        user=user,
+        device=device,
+        expires_at=now + datetime.timedelta(seconds=settings.AUTH_TOKEN_TTL),
+    )
+    cache.set(token_state_key(row.pk), ACTIVE, settings.AUTH_TOKEN_CACHE_TTL)
+    signed = signing.dumps(
+        {'uid': user.pk, 'tid': str(row.pk), 'exp': int(row.expires_at.timestamp())},
+        salt=TOKEN_SALT,
+    )
+    return signed, row
+
+
+def revoke_tokens(queryset):
+    """Revoke every active token in ``queryset``, in the database and in the shared cache."""
+    now = timezone.now()
+    rows = list(queryset.filter(revoked_at__isnull=True, expires_at__gt=now).values_list('pk', 'expires_at'))
+    if not rows:
+        return 0
+    AuthToken.objects.filter(pk__in=[pk for pk, _ in rows]).update(revoked_at=now)
+    for pk, expires_at in rows:
+        mark_revoked(pk, expires_at)
+    return len(rows)
+
+
+def mark_revoked(token_id, expires_at):
+    # Keep the revocation hot for as long as the token could still be presented
+    remaining = (expires_at - timezone.now()).total_seconds()
+    cache.set(token_state_key(token_id), REVOKED, max(1, int(remaining) + 1))
+
+
+def is_token_active(token_id, user_id):
+    state = cache.get(token_state_key(token_id))
+    if state is None:
+        row = AuthToken.objects.filter(pk=token_id, user_id=user_id).values_list('revoked_at', 'expires_at').first()
+        state = ACTIVE if row and row[0] is None and row[1] > timezone.now() else REVOKED
+        # Active states are re-checked against the database every AUTH_TOKEN_CACHE_TTL seconds
+        cache.set(token_state_key(token_id), state, settings.AUTH_TOKEN_CACHE_TTL)
+    return state == ACTIVE
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication for signed AuthTokens and legacy DRF tokens, served from cache.
+
+    Snapshots live for AUTH_TOKEN_CACHE_TTL seconds and are evicted whenever
+    the token, user or profile changes (see ``investors.signals``).
+    """
+
+    def authenticate_credentials(self, key):
+        if ':' in key:  # signing separator; legacy keys are hex
+            user, token = self._authenticate_signed(key)
+        else:
+            user, token = self._authenticate_legacy(key)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (user, token)
+
+    def _authenticate_signed(self, key):
+        try:
+            payload = signing.loads(key, salt=TOKEN_SALT)
+            user_id, token_id, expires = payload['uid'], payload['tid'], payload['exp']
+        except (signing.BadSignature, KeyError, TypeError):
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if expires <= time.time():
+            raise exceptions.AuthenticationFailed(_('Token has expired.'))
+        if not is_token_active(token_id, user_id):
+            raise exceptions.AuthenticationFailed(_('Token has been revoked.'))
+
+        user = _cached_user(user_id)
+        # Unsaved stand-in carrying the claims; logout revokes by its pk
+        token = AuthToken(
+            pk=token_id,
+            user=user,
+            expires_at=datetime.datetime.fromtimestamp(expires, datetime.timezone.utc),
+        )
+        return user, token
+
+    def _authenticate_legacy(self, key):
+        cache_key = token_cache_key(key)
+        user_id = cache.get(cache_key)
+        if user_id is None:
+            try:
+                token = Token.objects.select_related('user__profile').get(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            cache.set(cache_key, token.user_id, settings.AUTH_TOKEN_CACHE_TTL)
+            _cache_user(token.user)
+            return token.user, token
+
+        user = _cached_user(user_id)
+        return user, Token(key=key, user=user)
@@ -0,0 +1,114 @@
+"""Change versions that let polled list endpoints answer conditional GETs cheaply.
+
+Every scope (all documents, one investor's documents, the investor list) has
+a version in the shared cache: a random token and the time it was set.
+Signals and the bulk write paths bump it whenever rows in the scope change.
+A list's ETag is derived from the version, the user and the request, so a
+matching If-None-Match (or If-Modified-Since) gets a 304 without the list
+query or the serializer running.
+
+A version missing from the cache (a cold or evicted cache) is re-created
+with a fresh token, which costs each client one full response. Versions
+expire after CHANGE_VERSION_TTL seconds, so a bump a worker never saw (the
+cache unreachable, or not shared) delays the change by at most that long.
+Without a shared cache CONDITIONAL_LIST_RESPONSES is off and lists are
+always sent in full.
+"""
+import datetime
+import functools
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.views.decorators.http import condition
+
+DOCUMENTS = 'documents'
+INVESTORS = 'investors'
+
+
+def _key(scope):
+    return f'changes:{scope}'
+
+
+def _fresh():
+    return (uuid.uuid4().hex, time.time())
+
+
+def _set(scopes):
+    cache.set_many({_key(scope): _fresh() for scope in scopes}, timeout=settings.CHANGE_VERSION_TTL)
+
+
+def bump(*scopes):
+    """Mark ``scopes`` as changed."""
+    _set(scopes)
+    if transaction.get_connection().in_atomic_block:
+        # A reader may take this version while still seeing the old rows; retire it once they're visible
+        transaction.on_commit(lambda: _set(scopes))
+
+
+def version(scope):
+    """(token, timestamp) of ``scope``'s current version."""
+    value = cache.get(_key(scope))
+    if value is None:
+        cache.add(_key(scope), _fresh(), timeout=settings.CHANGE_VERSION_TTL)
+        value = cache.get(_key(scope))
+    return value
+
+
+def document_scopes(*investor_ids):
+    return [DOCUMENTS, *{f'{DOCUMENTS}:investor:{investor_id}' for investor_id in investor_ids}]
+
+
+def bump_documents(*investor_ids):
+    bump(*document_scopes(*investor_ids))
+
+
+def document_scope(request):
+    """The scope of the documents ``request.user`` can list (see DocumentViewSet.get_queryset)."""
+    user = request.user
+    if user.is_staff:
+        return DOCUMENTS
+    # Token users carry their profile in the cached snapshot, so this is usually free
+    profile = getattr(user, 'profile', None)
+    return f'{DOCUMENTS}:investor:{profile.pk if profile else None}'
+
+
+def investor_scope(request):
+    return INVESTORS
+
+
+def conditional_list(scope_func):
+    """``condition`` decorator for a list view whose rows all belong to ``scope_func(request)``."""
+    def current(request):
+        # Both validator functions run per request; look the version up once
+        if not hasattr(request, '_change_version'):
+            request._change_version = version(scope_func(request))
+        return request._change_version
+
+    def etag(request, *args, **kwargs):
+        token, _ = current(request)
+        # Pages, formats and expansions of the same version are different representations
+        raw = f'{token}|{request.user.pk}|{request.get_full_path()}|{request.headers.get("Accept", "")}'
+        return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+    def last_modified(request, *args, **kwargs):
+        _, changed_at = current(request)
+        # HTTP dates have whole seconds. Withholding the date until its second is over means
+        # any later change gets a later date, so If-Modified-Since never hides it.
+        if time.time() - changed_at < 1:
+            return None
+        return datetime.datetime.fromtimestamp(changed_at, datetime.timezone.utc)
+
+    def decorator(view):
+        conditional = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.CONDITIONAL_LIST_RESPONSES:
+                return view(request, *args, **kwargs)
+            return conditional(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,123 @@
+"""Proxied document downloads (``download?mode=stream``) for clients that can't follow presigned URLs.
+
+The conditional and range headers are passed on to S3, which evaluates them
+against the object itself. S3's 206, 304 and 416 answers are relayed along
+with its ETag and Last-Modified, so the proxy holds no validator state. The
+body is relayed in DOCUMENT_STREAM_CHUNK_SIZE chunks and never buffered whole.
+"""
+import datetime
+import re
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+from .storage import get_s3_client
+from .streaming import streaming_content
+
+# S3 serves a single byte range; for anything else the whole object is sent, as RFC 9110 allows
+_SINGLE_RANGE = re.compile(r'^bytes=(\d+-\d*|-\d+)$')
+
+
+def _http_datetime(value):
+    timestamp = parse_http_date_safe(value)
+    return None if timestamp is None else datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+
+
+def get_object_params(request, key):
+    """get_object arguments for ``key`` carrying the request's Range and conditional headers."""
+    params = {'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': key}
+    headers = request.headers
+
+    range_header = headers.get('Range', '').replace(' ', '')
+    if _SINGLE_RANGE.match(range_header):
+        if_range = headers.get('If-Range')
+        if not if_range:
+            params['Range'] = range_header
+        elif if_range.startswith('"'):
+            # A failed IfMatch (412) means the object changed; fetch() then sends all of it
+            params.update(Range=range_header, IfMatch=if_range)
+        elif _http_datetime(if_range):
+            params.update(Range=range_header, IfUnmodifiedSince=_http_datetime(if_range))
+        # A weak or unparsable If-Range can never match, so the whole object is sent
+
+    if headers.get('If-None-Match'):
+        params['IfNoneMatch'] = headers['If-None-Match']
+    elif headers.get('If-Modified-Since') and _http_datetime(headers['If-Modified-Since']):
+        # If-Modified-Since is ignored when If-None-Match is present (RFC 9110 13.1.3)
+        params['IfModifiedSince'] = _http_datetime(headers['If-Modified-Since'])
+    return params
+
+
+def _copy_validators(source, response):
+    if source.get('etag'):
+        response['ETag'] = source['etag']
+    if source.get('last-modified'):
+        response['Last-Modified'] = source['last-modified']
+
+
+def fetch(params):
+    """Call get_object with ``params``; returns (object, None) or (None, a finished response).
+
+    The finished response is a 304 or a 416. A missing object raises Http404.
+    """
+    try:
+        return get_s3_client().get_object(**params), None
+    except ClientError as exc:
+        metadata = exc.response.get('ResponseMetadata', {})
+        status = metadata.get('HTTPStatusCode')
+        headers = metadata.get('HTTPHeaders', {})
+        if status == 412 and 'Range' in params:
+            # If-Range didn't match: the object changed since the client's partial copy
+            return fetch({name: value for name, value in params.items()
+                          if name not in ('Range', 'IfMatch', 'IfUnmodifiedSince')})
+        if status == 304:
+            response = HttpResponseNotModified()
+            _copy_validators(headers, response)
+            return None, response
+        if status == 416:
+            response = HttpResponse(status=416)
+            if headers.get('content-range'):
+                response['Content-Range'] = headers['content-range']
+            return None, response
+        if status == 404 or exc.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            raise Http404("Document file is missing from storage")
+        raise
+
+
+def iter_body(body, chunk_size=None):
+    """Relay an S3 body in fixed-size chunks, closing it when done or when the client goes away."""
+    try:
+        yield from body.iter_chunks(chunk_size=chunk_size or settings.DOCUMENT_STREAM_CHUNK_SIZE)
+    finally:
+        body.close()
+
+
+def streaming_response(s3_object, chunks, filename, disposition='inline'):
+    """StreamingHttpResponse relaying ``chunks`` of ``s3_object`` with its status and headers."""
+    response = StreamingHttpResponse(
+        chunks,
+        status=206 if s3_object.get('ContentRange') else 200,
+        content_type=s3_object.get('ContentType') or 'application/octet-stream',
+    )
+    response['Content-Length'] = str(s3_object['ContentLength'])
+    if s3_object.get('ContentRange'):
+        response['Content-Range'] = s3_object['ContentRange']
+    response['Accept-Ranges'] = 'bytes'
+    if s3_object.get('ETag'):
+        response['ETag'] = s3_object['ETag']
+    if s3_object.get('LastModified'):
+        response['Last-Modified'] = http_date(s3_object['LastModified'].timestamp())
+    response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+    # Documents are per-user: browsers may revalidate their copy, shared caches must not keep one
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def stream_download(request, key, filename, disposition='inline'):
+    s3_object, response = fetch(get_object_params(request, key))
+    if response is not None:
+        return response
+    chunks = streaming_content(request, iter_body(s3_object['Body']))
+    return streaming_response(s3_object, chunks, filename, disposition)
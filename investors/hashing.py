@@ -0,0 +1,18 @@
+"""Password hashing run in pool worker processes.
+
+Workers import this module before Django is set up, so it must not import
+models (or anything that does) at module level.
+"""
+
+
+def init_worker():
+    # Forkserver and spawned workers start without Django configured
+    import django
+    django.setup()
+
+
+def hash_password(password):
+    from django.contrib.auth.hashers import make_password
+
+    # Blank passwords become unusable ones
+    return make_password(password or None)
@@ -0,0 +1,116 @@
+"""A small job queue kept in the database, for work that shouldn't hold up a request.
+
+``enqueue()`` inserts a Job row. Called inside a transaction, the job only
+becomes visible once that transaction commits. ``manage.py run_worker``
+claims due jobs with SELECT ... FOR UPDATE SKIP LOCKED, so any number of
+workers (threads, processes or hosts) can poll the same table without two
+of them taking the same job.
+
+Failed jobs are retried with exponential backoff until ``max_attempts``, then
+kept as ``failed`` with the last error. A job whose worker died mid-run is
+claimed again once JOB_LOCK_TIMEOUT has passed. Finished jobs are deleted.
+
+Tasks are plain functions registered with ``@task`` (see investors.tasks).
+They take the job payload as keyword arguments and must be idempotent, since
+a job can run twice if its worker dies before recording the result.
+"""
+import datetime
+import logging
+import random
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name):
+    """Register the decorated function as the handler for jobs named ``name``."""
+    def decorator(func):
+        TASKS[name] = func
+        return func
+    return decorator
+
+
+def enqueue(task_name, run_at=None, **payload):
+    return Job.objects.create(task=task_name, payload=payload, run_at=run_at or timezone.now(),
+                              max_attempts=settings.JOB_MAX_ATTEMPTS)
+
+
+def enqueue_many(task_name, payloads):
+    """Queue one job per payload dict with a single insert."""
+    now = timezone.now()
+    return Job.objects.bulk_create([
+        Job(task=task_name, payload=payload, run_at=now, max_attempts=settings.JOB_MAX_ATTEMPTS)
+        for payload in payloads
+    ])
+
+
+def claim(limit=1):
+    """Lock up to ``limit`` due jobs for this worker and mark them running."""
+    now = timezone.now()
+    stale = now - datetime.timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=Job.PENDING, run_at__lte=now) | Q(status=Job.RUNNING, locked_at__lt=stale))
+            .order_by('run_at')[:limit]
+        )
+        if jobs:
+            Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status=Job.RUNNING, locked_at=now, attempts=F('attempts') + 1
+            )
+    for job in jobs:
+        job.status, job.locked_at, job.attempts = Job.RUNNING, now, job.attempts + 1
+    return jobs
+
+
+def backoff(attempts):
+    """Seconds before retry number ``attempts``: doubling from JOB_BACKOFF_BASE, with jitter."""
+    delay = min(settings.JOB_BACKOFF_MAX, settings.JOB_BACKOFF_BASE * 2 ** (attempts - 1))
+    # Jitter spreads out retries of jobs that failed together, e.g. during an S3 outage
+    return delay * random.uniform(0.5, 1.0)
+
+
+def run_job(job):
+    """Run a claimed job; returns True if it succeeded."""
+    from . import tasks  # noqa: F401  registers the task handlers
+
+    func = TASKS.get(job.task)
+    try:
+        if func is None:
+            raise LookupError(f"No task registered as {job.task!r}")
+        func(**job.payload)
+    except Exception as exc:
+        error = f"{type(exc).__name__}: {exc}"
+        if job.attempts >= job.max_attempts:
+            logger.exception("Job %s failed for good after %s attempts", job, job.attempts)
+            Job.objects.filter(pk=job.pk).update(status=Job.FAILED, locked_at=None, last_error=error)
+        else:
+            delay = backoff(job.attempts)
+            logger.warning("Job %s failed (%s), retrying in %.0fs", job, error, delay)
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.PENDING, locked_at=None, last_error=error,
+                run_at=timezone.now() + datetime.timedelta(seconds=delay),
+            )
+        return False
+    Job.objects.filter(pk=job.pk).delete()
+    return True
+
+
+def run_pending(limit=None):
+    """Run due jobs in this thread until none are left (or ``limit`` ran); returns how many ran."""
+    ran = 0
+    while limit is None or ran < limit:
+        jobs = claim()
+        if not jobs:
+            break
+        run_job(jobs[0])
+        ran += 1
+    return ran
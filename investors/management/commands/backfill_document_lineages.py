@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max
+
+from investors.models import Document, DocumentLineage
+
+
+class Command(BaseCommand):
+    help = "Build or refresh DocumentLineage rows from the existing Document table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        stats = {
+            (row['investor'], row['name'], row['doc_type']): row
+            for row in Document.objects.values('investor', 'name', 'doc_type').annotate(
+                count=Count('id'), max_version=Max('version')
+            ).order_by()
+        }
+
+        heads = Document.objects.latest_versions().values_list('id', 'investor', 'name', 'doc_type')
+        batch = []
+        total = 0
+        for head_id, investor_id, name, doc_type in heads.iterator(chunk_size=batch_size):
+            row = stats[(investor_id, name, doc_type)]
+            batch.append(DocumentLineage(
+                investor_id=investor_id,
+                name=name,
+                doc_type=doc_type,
+                head_id=head_id,
+                latest_version=row['max_version'],
+                version_count=row['count'],
+            ))
+            if len(batch) >= batch_size:
+                total += self._write(batch)
+                batch = []
+        if batch:
+            total += self._write(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {total} document lineages"))
+
+    def _write(self, batch):
+        DocumentLineage.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=['investor', 'name', 'doc_type'],
+            update_fields=['head', 'latest_version', 'version_count', 'updated_at'],
+        )
+        return len(batch)
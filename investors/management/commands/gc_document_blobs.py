@@ -0,0 +1,101 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from investors.models import Document, DocumentBlob, PendingUpload
+from investors.storage import delete_objects
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete content-addressed document blobs that no Document references any more, "
+        "and presigned uploads never finalized, from the database and from S3. Run it from cron, e.g. daily."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=int, default=settings.DOCUMENT_BLOB_GC_GRACE_HOURS,
+                            help="Only collect blobs untouched for this long, so in-flight uploads keep theirs")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--recount', action='store_true',
+                            help="Recompute every ref_count from the documents table first")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            counts = (
+                Document.objects.filter(blob=OuterRef('pk'))
+                .order_by().values('blob').annotate(total=Count('pk')).values('total')
+            )
+            updated = DocumentBlob.objects.update(
+                ref_count=Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+            )
+            self.stdout.write(f"Recounted references of {updated} blobs")
+
+        cutoff = timezone.now() - datetime.timedelta(hours=options['grace_hours'])
+        orphans = DocumentBlob.objects.filter(ref_count__lte=0, updated_at__lt=cutoff).exclude(
+            Exists(Document.objects.filter(blob=OuterRef('pk')))
+        )
+
+        if options['dry_run']:
+            for sha256, size in orphans.values_list('sha256', 'size').iterator():
+                self.stdout.write(f"Would delete {sha256} ({size} bytes)")
+            for key in PendingUpload.stale().values_list('s3_key', flat=True).iterator():
+                self.stdout.write(f"Would delete abandoned upload {key}")
+            return
+
+        deleted = freed = 0
+        failed = set()
+        while True:
+            with transaction.atomic():
+                # skip_locked lets several collectors run without blocking each other
+                batch = list(
+                    orphans.exclude(pk__in=failed).select_for_update(skip_locked=True)
+                    .values_list('pk', 's3_key', 'size')[:options['batch_size']]
+                )
+                if not batch:
+                    break
+                # Keys are derived from content, so an upload of the same bytes reuses the key. The objects
+                # go while the rows are locked: such an upload blocks on its row until this commits, then
+                # finds it gone and uploads the object again, instead of registering one deleted under it.
+                unremoved = set(delete_objects([key for _, key, _ in batch]))
+                removed = [(pk, size) for pk, key, size in batch if key not in unremoved]
+                DocumentBlob.objects.filter(pk__in=[pk for pk, _ in removed]).delete()
+
+            # Rows of objects S3 kept stay for the next run
+            failed.update(pk for pk, key, _ in batch if key in unremoved)
+            for key in unremoved:
+                self.stderr.write(f"Could not delete s3://{settings.AWS_STORAGE_BUCKET_NAME}/{key}")
+            deleted += len(removed)
+            freed += sum(size for _, size in removed)
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} unreferenced blobs ({freed} bytes)"))
+        self._collect_stale_uploads(options['batch_size'])
+
+    def _collect_stale_uploads(self, batch_size):
+        removed = 0
+        failed = set()
+        while True:
+            with transaction.atomic():
+                # A finalize in progress holds its row; past the window it would be refused anyway
+                batch = list(
+                    PendingUpload.stale().exclude(pk__in=failed).select_for_update(skip_locked=True)
+                    .values_list('pk', 's3_key')[:batch_size]
+                )
+                if not batch:
+                    break
+                # Missing keys (the client never uploaded) delete without error
+                unremoved = set(delete_objects([key for _, key in batch]))
+                done = [pk for pk, key in batch if key not in unremoved]
+                PendingUpload.objects.filter(pk__in=done).delete()
+
+            failed.update(pk for pk, key in batch if key in unremoved)
+            for key in unremoved:
+                self.stderr.write(f"Could not delete s3://{settings.AWS_STORAGE_BUCKET_NAME}/{key}")
+            removed += len(done)
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {removed} abandoned uploads"))
@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from investors.provisioning import hash_pool, provision_investors, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        "Create investor accounts (user + profile) in bulk from a CSV or JSON Lines file with "
+        "username, email, password and optional phone_number, first_name, last_name columns. "
+        "A blank password leaves the account without a usable password."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for stdin")
+        parser.add_argument('--format', choices=('csv', 'jsonl'),
+                            help="Input format (default: from the file extension)")
+        parser.add_argument('--chunk-size', type=int, default=settings.PROVISIONING_CHUNK_SIZE)
+        parser.add_argument('--workers', type=int, default=settings.PROVISIONING_HASH_WORKERS,
+                            help="Password hashing processes (0 hashes in this process)")
+        parser.add_argument('--actor', help="Username recorded as the creator in the audit log")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt not in ('csv', 'jsonl'):
+            raise CommandError("Cannot tell the format from the file name; pass --format csv or --format jsonl")
+
+        actor = None
+        if options['actor']:
+            actor = User.objects.filter(username=options['actor']).first()
+            if actor is None:
+                raise CommandError(f"Unknown actor '{options['actor']}'")
+
+        started = time.monotonic()
+
+        def progress(report):
+            rate = report.processed / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(f"{report.processed} processed, {report.created} created, "
+                              f"{len(report.errors)} failed ({rate:.0f} records/s)")
+
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        pool = hash_pool(options['workers'])
+        try:
+            report = provision_investors(read_records(stream, fmt), actor=actor,
+                                         chunk_size=options['chunk_size'], pool=pool, progress=progress)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            if stream is not sys.stdin:
+                stream.close()
+
+        for error in report.errors:
+            self.stderr.write(f"line {error['line']} ({error['username'] or '?'}): {error['error']}")
+        summary = f"Created {report.created} of {report.processed} investors in {time.monotonic() - started:.1f}s"
+        if report.errors:
+            self.stdout.write(self.style.WARNING(f"{summary}; {len(report.errors)} failed"))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
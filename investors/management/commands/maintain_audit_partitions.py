@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from investors import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming monthly AuditLog partitions and archive partitions past the retention "
+        "window to S3 as gzip JSONL (PostgreSQL only). Run it from cron, e.g. daily."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=settings.AUDIT_LOG_PARTITIONS_AHEAD,
+                            help="Months of partitions to keep created ahead of time")
+        parser.add_argument('--retention-months', type=int, default=settings.AUDIT_LOG_RETENTION_MONTHS,
+                            help="Months of audit history kept in the database")
+        parser.add_argument('--keep-detached', action='store_true',
+                            help="Detach archived partitions but keep them as standalone tables")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned(connection):
+            self.stdout.write("investors_auditlog is not partitioned on this database; nothing to do")
+            return
+
+        if options['dry_run']:
+            for name, _ in partitions.expired_partitions(connection, options['retention_months']):
+                self.stdout.write(f"Would archive {name}")
+            return
+
+        with transaction.atomic():
+            for name in partitions.ensure_partitions(connection, options['ahead']):
+                self.stdout.write(f"Created {name}")
+
+        for name, _ in partitions.expired_partitions(connection, options['retention_months']):
+            # Export while still attached so the rows stay visible until the archive is safely stored
+            key = partitions.export_partition(connection, name)
+            with transaction.atomic():
+                partitions.drop_partition(connection, name, keep_table=options['keep_detached'])
+            self.stdout.write(self.style.SUCCESS(f"Archived {name} to s3://{settings.AWS_STORAGE_BUCKET_NAME}/{key}"))
@@ -0,0 +1,71 @@
+import logging
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from investors.jobs import claim, run_job, run_pending
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs (checksum verification, hashing of direct uploads) from the job table. "
+        "Start as many of these as needed; jobs are claimed with SKIP LOCKED, so workers never share one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.JOB_WORKERS,
+                            help="Worker threads in this process; tasks mostly wait on S3")
+        parser.add_argument('--poll-interval', type=float, default=settings.JOB_POLL_INTERVAL,
+                            help="Seconds an idle worker waits before looking for jobs again")
+        parser.add_argument('--once', action='store_true',
+                            help="Run the jobs that are due now, then exit (e.g. from cron)")
+
+    def handle(self, *args, **options):
+        if options['once']:
+            ran = run_pending()
+            self.stdout.write(self.style.SUCCESS(f"Ran {ran} jobs"))
+            return
+
+        stop = threading.Event()
+
+        def shutdown(signum, frame):
+            # Finish the jobs in hand; anything unfinished is retried after JOB_LOCK_TIMEOUT
+            self.stdout.write("Stopping after current jobs...")
+            stop.set()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        threads = [
+            threading.Thread(target=self._work, args=(stop, options['poll_interval']), name=f'job-worker-{n}')
+            for n in range(options['concurrency'])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f"Started {len(threads)} job workers")
+        # Sleep in short waits so the main thread stays responsive to signals
+        while any(thread.is_alive() for thread in threads):
+            stop.wait(1)
+        for thread in threads:
+            thread.join()
+
+    def _work(self, stop, poll_interval):
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                try:
+                    jobs = claim()
+                    if jobs:
+                        run_job(jobs[0])
+                        continue
+                except Exception:
+                    # e.g. the database restarting; the job is retried once its lock goes stale
+                    logger.exception("Job worker error")
+                stop.wait(poll_interval)
+        finally:
+            connection.close()
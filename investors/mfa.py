@@ -0,0 +1,144 @@
+"""TOTP and backup-code verification with replay protection and failure throttling.
+
+Accepted TOTP time steps are recorded per user in the shared cache, so a code
+works once. Failed attempts drain token buckets kept per user and per client
+IP. Backup codes are stored as SHA-256 hashes and compared in constant time.
+"""
+import hashlib
+import hmac
+import secrets
+import time
+
+import pyotp
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import exceptions
+
+from .models import InvestorProfile
+
+STEP = 30  # seconds per TOTP code
+VALID_WINDOW = 1  # accept one step either side for clock drift
+
+
+class TokenBucket:
+    """A token bucket whose state lives in the shared cache under ``key``.
+
+    Only failures take tokens, so legitimate users are never slowed down.
+    Updates are read-modify-write: under heavy concurrency a few extra
+    attempts can slip through, which is fine for a throttle.
+    """
+
+    def __init__(self, key, capacity, per_minute):
+        self.key = key
+        self.capacity = capacity
+        self.rate = per_minute / 60.0
+
+    def _tokens(self, now):
+        state = cache.get(self.key)
+        if state is None:
+            return float(self.capacity)
+        tokens, updated = state
+        return min(self.capacity, tokens + (now - updated) * self.rate)
+
+    def wait(self):
+        """Seconds until an attempt is allowed again (0 if one is allowed now)."""
+        tokens = self._tokens(time.time())
+        return 0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def consume(self):
+        now = time.time()
+        tokens = max(0.0, self._tokens(now) - 1)
+        # Expire once the bucket would be full again anyway
+        cache.set(self.key, (tokens, now), int((self.capacity - tokens) / self.rate) + 1)
+
+
+def _buckets(user_id, ip):
+    buckets = [TokenBucket(f'mfa:bucket:user:{user_id}', settings.MFA_USER_BURST, settings.MFA_USER_PER_MINUTE)]
+    if ip:
+        buckets.append(TokenBucket(f'mfa:bucket:ip:{ip}', settings.MFA_IP_BURST, settings.MFA_IP_PER_MINUTE))
+    return buckets
+
+
+def provisioning_uri(user, secret):
+    """otpauth:// URI that authenticator apps enrol from (what the QR code encodes)."""
+    return pyotp.TOTP(secret).provisioning_uri(name=user.email, issuer_name="SecureInvestor")
+
+
+def match_totp_step(secret, code, for_time=None):
+    """Return the time step ``code`` is valid for within the drift window, or None."""
+    totp = pyotp.TOTP(secret)
+    current = int((time.time() if for_time is None else for_time) // STEP)
+    matched = None
+    # Check every step without returning early so timing doesn't reveal which one matched
+    for step in range(current - VALID_WINDOW, current + VALID_WINDOW + 1):
+        if hmac.compare_digest(totp.generate_otp(step), code):
+            matched = step
+    return matched
+
+
+def _claim_step(user_id, step):
+    # cache.add is atomic on shared backends: only the first caller gets True
+    ttl = STEP * (2 * VALID_WINDOW + 2)
+    return cache.add(f'mfa:used:{user_id}:{step}', 1, ttl)
+
+
+def hash_backup_code(code):
+    return hashlib.sha256(_normalize(code).encode()).hexdigest()
+
+
+def _normalize(code):
+    return str(code or '').strip().replace('-', '').replace(' ', '').lower()
+
+
+def generate_backup_codes(profile, count=None):
+    """Replace ``profile``'s backup codes; return the plaintext codes (shown once)."""
+    count = count or settings.MFA_BACKUP_CODE_COUNT
+    codes = [f'{secrets.token_hex(3)}-{secrets.token_hex(3)}' for _ in range(count)]
+    profile.backup_codes = [hash_backup_code(code) for code in codes]
+    profile.save(update_fields=['backup_codes'])
+    return codes
+
+
+def _consume_backup_code(profile, code):
+    candidate = hash_backup_code(code)
+    with transaction.atomic():
+        # Lock so one backup code can't be spent by two concurrent requests
+        locked = InvestorProfile.objects.select_for_update().get(pk=profile.pk)
+        remaining, used = [], False
+        for stored in locked.backup_codes:
+            if hmac.compare_digest(stored, candidate):
+                used = True
+            else:
+                remaining.append(stored)
+        if used:
+            locked.backup_codes = remaining
+            locked.save(update_fields=['backup_codes'])
+            profile.backup_codes = remaining
+    return used
+
+
+def verify_code(profile, code, ip=None, allow_backup=False):
+    """Check an MFA ``code`` for ``profile``.
+
+    Returns ``'totp'`` or ``'backup'`` for the method that accepted it, or None.
+    Raises ``Throttled`` while the user or IP has exhausted its failed attempts.
+    """
+    buckets = _buckets(profile.user_id, ip)
+    wait = max(bucket.wait() for bucket in buckets)
+    if wait:
+        raise exceptions.Throttled(wait=wait, detail="Too many failed MFA attempts.")
+
+    code = str(code or '').strip()
+    method = None
+    if profile.mfa_secret and code.isdigit() and len(code) == 6:
+        step = match_totp_step(profile.mfa_secret, code)
+        if step is not None and _claim_step(profile.user_id, step):
+            method = 'totp'
+    elif allow_backup and code and _consume_backup_code(profile, code):
+        method = 'backup'
+
+    if method is None:
+        for bucket in buckets:
+            bucket.consume()
+    return method
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investors', '0004_investorprofile_backup_codes_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['investor', 'name', 'doc_type', '-version'], name='document_lineage_idx'),
+        ),
+    ]
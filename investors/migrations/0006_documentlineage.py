@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investors', '0005_document_lineage_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentLineage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('doc_type', models.CharField(max_length=50)),
+                ('latest_version', models.PositiveIntegerField(default=0)),
+                ('version_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('head', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lineage', to='investors.document')),
+                ('investor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='document_lineages', to='investors.investorprofile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('investor', 'name', 'doc_type'), name='unique_document_lineage')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:49
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investors', '0006_documentlineage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('doc_type', models.CharField(max_length=50)),
+                ('s3_key', models.CharField(max_length=512, unique=True)),
+                ('content_type', models.CharField(max_length=255)),
+                ('max_size', models.PositiveBigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('document', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pending_upload', to='investors.document')),
+                ('investor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_uploads', to='investors.investorprofile')),
+            ],
+        ),
+    ]
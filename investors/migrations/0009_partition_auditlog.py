@@ -0,0 +1,142 @@
+"""Turn investors_auditlog into a table range-partitioned by month on PostgreSQL.
+
+Other databases keep the plain table. The primary key becomes (id, timestamp)
+because PostgreSQL requires the partition key in every unique constraint;
+the ORM still treats id as the primary key.
+"""
+import datetime
+
+from django.db import migrations
+
+# Frozen copies of investors.partitions as of this migration, so later changes there can't alter it
+TABLE = 'investors_auditlog'
+DEFAULT_PARTITION = f'{TABLE}_default'
+OLD_TABLE = f'{TABLE}_unpartitioned'
+COLUMNS = '"id", "action", "timestamp", "details", "user_id"'
+# post_migrate tops this up to AUDIT_LOG_PARTITIONS_AHEAD
+MONTHS_AHEAD = 3
+
+
+def month_start(value):
+    return datetime.datetime(value.year, value.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def create_partition(schema_editor, month):
+    # Rows are copied in after every partition exists, so none are stranded in DEFAULT yet
+    schema_editor.execute(
+        f'CREATE TABLE "{TABLE}_p{month:%Y%m}" PARTITION OF "{TABLE}" FOR VALUES FROM (%s) TO (%s)',
+        [month, add_months(month, 1)],
+    )
+
+
+def _secondary_constraints(schema_editor, table):
+    """FKs and plain indexes of ``table`` so they can be recreated under the same names."""
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return {
+        name: info for name, info in constraints.items()
+        if not info['primary_key'] and (info['foreign_key'] or (info['index'] and not info['unique']))
+    }
+
+
+def _recreate_constraints(schema_editor, constraints):
+    for name, info in constraints.items():
+        columns = ', '.join(f'"{column}"' for column in info['columns'])
+        if info['foreign_key']:
+            to_table, to_column = info['foreign_key']
+            schema_editor.execute(
+                f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" FOREIGN KEY ({columns}) '
+                f'REFERENCES "{to_table}" ("{to_column}") DEFERRABLE INITIALLY DEFERRED'
+            )
+        else:
+            schema_editor.execute(f'CREATE INDEX "{name}" ON "{TABLE}" ({columns})')
+
+
+def _swap_in(schema_editor, create_sql):
+    """Move the current table aside and create its replacement with ``create_sql``.
+
+    Returns the secondary constraints to recreate once the old table is dropped.
+    """
+    constraints = _secondary_constraints(schema_editor, TABLE)
+    schema_editor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{OLD_TABLE}"')
+    schema_editor.execute(f'ALTER SEQUENCE IF EXISTS "{TABLE}_id_seq" RENAME TO "{OLD_TABLE}_id_seq"')
+    schema_editor.execute(f'ALTER TABLE "{OLD_TABLE}" RENAME CONSTRAINT "{TABLE}_pkey" TO "{OLD_TABLE}_pkey"')
+
+    schema_editor.execute(f'CREATE SEQUENCE "{TABLE}_id_seq" AS bigint')
+    schema_editor.execute(create_sql)
+    schema_editor.execute(f'ALTER SEQUENCE "{TABLE}_id_seq" OWNED BY "{TABLE}"."id"')
+    return constraints
+
+
+def _copy_rows_and_finish(schema_editor, constraints):
+    schema_editor.execute(f'INSERT INTO "{TABLE}" ({COLUMNS}) SELECT {COLUMNS} FROM "{OLD_TABLE}"')
+    schema_editor.execute(
+        f'SELECT setval(\'"{TABLE}_id_seq"\', COALESCE((SELECT MAX("id") FROM "{TABLE}"), 0) + 1, false)'
+    )
+    schema_editor.execute(f'DROP TABLE "{OLD_TABLE}"')
+    _recreate_constraints(schema_editor, constraints)
+
+
+def partition_auditlog(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    constraints = _swap_in(schema_editor, f'''
+        CREATE TABLE "{TABLE}" (
+            "id" bigint NOT NULL DEFAULT nextval('"{TABLE}_id_seq"'),
+            "action" varchar(255) NOT NULL,
+            "timestamp" timestamp with time zone NOT NULL,
+            "details" text NOT NULL,
+            "user_id" integer NULL,
+            CONSTRAINT "{TABLE}_pkey" PRIMARY KEY ("id", "timestamp")
+        ) PARTITION BY RANGE ("timestamp")
+    ''')
+    schema_editor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+
+    # One partition per month that already has rows, plus the months ahead
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT MIN("timestamp") FROM "{OLD_TABLE}"')
+        oldest = cursor.fetchone()[0]
+    now = datetime.datetime.now(datetime.timezone.utc)
+    month = month_start(oldest or now)
+    while month <= add_months(month_start(now), MONTHS_AHEAD):
+        create_partition(schema_editor, month)
+        month = add_months(month, 1)
+
+    _copy_rows_and_finish(schema_editor, constraints)
+
+
+def unpartition_auditlog(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    constraints = _swap_in(schema_editor, f'''
+        CREATE TABLE "{TABLE}" (
+            "id" bigint NOT NULL DEFAULT nextval('"{TABLE}_id_seq"'),
+            "action" varchar(255) NOT NULL,
+            "timestamp" timestamp with time zone NOT NULL,
+            "details" text NOT NULL,
+            "user_id" integer NULL,
+            CONSTRAINT "{TABLE}_pkey" PRIMARY KEY ("id")
+        )
+    ''')
+    _copy_rows_and_finish(schema_editor, constraints)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investors', '0008_auditlog_event_timestamp'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_auditlog, unpartition_auditlog),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:56
+
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+
+def _search_index():
+    # Must stay the expression of models.audit_details_search_vector(), which AuditLogQuerySet.search()
+    # filters on, so the planner can use the index
+    return GinIndex(SearchVector('details', config='english'), name='auditlog_details_search_idx')
+
+
+def add_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('investors', 'AuditLog'), _search_index())
+
+
+def remove_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('investors', 'AuditLog'), _search_index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investors', '0010_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['user', '-timestamp'], name='auditlog_user_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['action', '-timestamp'], name='auditlog_action_timestamp_idx'),
+        ),
+        migrations.RunPython(add_search_index, remove_search_index),
+    ]
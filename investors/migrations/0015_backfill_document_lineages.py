@@ -0,0 +1,58 @@
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_lineages(apps, schema_editor):
+    """Give every (investor, name, doc_type) a lineage pointing at its highest version.
+
+    Covers documents uploaded before 0006 and lineages whose head was lost to a
+    delete. Existing heads are left alone and counters never go backwards.
+    """
+    Document = apps.get_model('investors', 'Document')
+    DocumentLineage = apps.get_model('investors', 'DocumentLineage')
+
+    existing = {
+        (lineage.investor_id, lineage.name, lineage.doc_type): lineage
+        for lineage in DocumentLineage.objects.all()
+    }
+    rows = Document.objects.order_by('investor_id', 'name', 'doc_type', '-version').values_list(
+        'id', 'investor_id', 'name', 'doc_type', 'version'
+    )
+
+    lineages = {}
+    for document_id, investor_id, name, doc_type, version in rows.iterator(chunk_size=BATCH_SIZE):
+        key = (investor_id, name, doc_type)
+        if key in lineages:
+            if lineages[key] is not None:
+                lineages[key].version_count += 1
+            continue
+        lineage = existing.get(key)
+        if lineage is not None and lineage.head_id is not None:
+            lineages[key] = None
+            continue
+        if lineage is None:
+            lineage = DocumentLineage(investor_id=investor_id, name=name, doc_type=doc_type)
+        lineage.head_id = document_id
+        lineage.latest_version = max(lineage.latest_version, version)
+        lineage.version_count = 1
+        lineages[key] = lineage
+
+    lineages = [lineage for lineage in lineages.values() if lineage is not None]
+    DocumentLineage.objects.bulk_create([lineage for lineage in lineages if lineage.pk is None], batch_size=BATCH_SIZE)
+    DocumentLineage.objects.bulk_update(
+        [lineage for lineage in lineages if lineage.pk is not None],
+        ['head', 'latest_version', 'version_count'],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investors', '0014_jobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_lineages, migrations.RunPython.noop),
+    ]
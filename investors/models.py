@@ -1,5 +1,16 @@
-from django.db import models
+import datetime
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db import connections, models, transaction
+from django.db.models import Case, Count, F, Max, Q, Value, When, Window
+from django.db.models.functions import RowNumber
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .changes import bump_documents
 
 class InvestorProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
@@ -13,6 +24,64 @@ class InvestorProfile(models.Model):
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
+class DocumentQuerySet(models.QuerySet):
+    def latest_versions(self):
+        """Keep only the highest version of each (investor, name, doc_type) lineage.
+
+        Resolved in a single query with ROW_NUMBER() over the lineage instead of
+        one lookup per lineage.
+        """
+        return self.annotate(
+            lineage_rank=Window(
+                expression=RowNumber(),
+                partition_by=[F('investor'), F('name'), F('doc_type')],
+                order_by=F('version').desc(),
+            )
+        ).filter(lineage_rank=1)
+
+class DocumentBlob(models.Model):
+    """A content-addressed S3 object shared by every Document with the same bytes.
+
+    ``ref_count`` tracks referencing documents; blobs that reach zero are
+    removed by ``manage.py gc_document_blobs`` once untouched for a grace period.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    s3_key = models.CharField(max_length=512, unique=True)
+    size = models.PositiveBigIntegerField()
+    content_type = models.CharField(max_length=255)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Set by the verify_blob job once S3 confirms the object's size and checksum
+    verified_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'updated_at'], name='documentblob_gc_idx'),
+        ]
+
+    @classmethod
+    def touch(cls, sha256):
+        """Return the blob for ``sha256`` if stored, marking it recently used so GC leaves it alone."""
+        # The update waits while gc_document_blobs holds the row, and matches nothing if it was collected
+        if cls.objects.filter(sha256=sha256).update(updated_at=timezone.now()):
+            return cls.objects.get(sha256=sha256)
+        return None
+
+    @classmethod
+    def register(cls, sha256, s3_key, size, content_type):
+        """Record a freshly uploaded blob (or return the one a concurrent upload registered)."""
+        blob, created = cls.objects.get_or_create(
+            sha256=sha256,
+            defaults={'s3_key': s3_key, 'size': size, 'content_type': content_type},
+        )
+        if not created:
+            cls.touch(sha256)
+        return blob
+
+    def __str__(self):
+        return f"{self.sha256[:12]}… ({self.size} bytes, {self.ref_count} refs)"
+
 class Document(models.Model):
     investor = models.ForeignKey(InvestorProfile, on_delete=models.CASCADE, related_name='documents')
     name = models.CharField(max_length=255)
@@ -26,15 +95,258 @@ class Document(models.Model):
         ('agreement', 'Agreement'),
         ('other', 'Other'),
     ], default='other')
+    blob = models.ForeignKey(DocumentBlob, null=True, blank=True, on_delete=models.PROTECT, related_name='documents')
+
+    objects = DocumentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['investor', 'name', 'doc_type', '-version'], name='document_lineage_idx'),
+            models.Index(fields=['-uploaded_at', '-id'], name='document_uploaded_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} v{self.version} ({self.investor})"
 
+class DocumentLineage(models.Model):
+    """Current head and version counter for one (investor, name, doc_type) lineage."""
+    investor = models.ForeignKey(InvestorProfile, on_delete=models.CASCADE, related_name='document_lineages')
+    name = models.CharField(max_length=255)
+    doc_type = models.CharField(max_length=50)
+    head = models.OneToOneField(Document, null=True, blank=True, on_delete=models.SET_NULL, related_name='lineage')
+    latest_version = models.PositiveIntegerField(default=0)
+    version_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['investor', 'name', 'doc_type'], name='unique_document_lineage'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.doc_type}) v{self.latest_version} ({self.investor})"
+
+    def documents(self):
+        return Document.objects.filter(investor_id=self.investor_id, name=self.name, doc_type=self.doc_type)
+
+    def refresh(self):
+        """Recompute head and counters from the Document rows; drops the lineage once it is empty."""
+        stats = self.documents().aggregate(count=Count('id'), max_version=Max('version'))
+        if not stats['count']:
+            self.delete()
+            return
+        self.head = self.documents().order_by('-version').first()
+        # The counter never goes backwards so a deleted version number is not reused
+        self.latest_version = max(self.latest_version, stats['max_version'])
+        self.version_count = stats['count']
+        self.save()
+
+    @classmethod
+    def record_version(cls, investor, name, doc_type, file, blob=None):
+        """Create the next Document version of a lineage.
+
+        The lineage row is locked with SELECT ... FOR UPDATE, so concurrent
+        uploads of the same document are serialized and never share a version.
+        A ``blob`` gains a reference in the same transaction.
+        """
+        with transaction.atomic():
+            lineage, created = cls.objects.select_for_update().get_or_create(
+                investor=investor, name=name, doc_type=doc_type
+            )
+            if created and lineage.documents().exists():
+                # Pick up documents uploaded before this lineage was tracked
+                lineage.refresh()
+
+            document = Document.objects.create(
+                investor=investor,
+                name=name,
+                doc_type=doc_type,
+                version=lineage.latest_version + 1,
+                previous_version=lineage.head,
+                file=file,
+                blob=blob,
+            )
+            if blob is not None:
+                DocumentBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+            lineage.head = document
+            lineage.latest_version = document.version
+            lineage.version_count += 1
+            lineage.save()
+        return document
+
+    @classmethod
+    def record_versions(cls, investor, entries):
+        """Create Document versions for many ``(name, doc_type, blob)`` entries in one transaction.
+
+        Every affected lineage is locked up front, documents are inserted with
+        bulk_create (one insert per "wave" when a batch holds several versions
+        of the same document) and lineages and blob counts are updated in bulk.
+        Returns the new documents in ``entries`` order.
+        """
+        keys = list(dict.fromkeys((name, doc_type) for name, doc_type, _ in entries))
+        now = timezone.now()
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                [cls(investor=investor, name=name, doc_type=doc_type) for name, doc_type in keys],
+                ignore_conflicts=True,
+            )
+            lookup = Q()
+            for name, doc_type in keys:
+                lookup |= Q(name=name, doc_type=doc_type)
+            lineages = {
+                (lineage.name, lineage.doc_type): lineage
+                for lineage in cls.objects.select_for_update().filter(lookup, investor=investor)
+            }
+            for lineage in lineages.values():
+                if not lineage.version_count and lineage.documents().exists():
+                    # Pick up documents uploaded before this lineage was tracked
+                    lineage.refresh()
+
+            documents = [None] * len(entries)
+            pending = list(enumerate(entries))
+            while pending:
+                wave, later, seen = [], [], set()
+                for index, (name, doc_type, blob) in pending:
+                    if (name, doc_type) in seen:
+                        later.append((index, (name, doc_type, blob)))
+                        continue
+                    seen.add((name, doc_type))
+                    lineage = lineages[(name, doc_type)]
+                    wave.append((index, lineage, Document(
+                        investor=investor,
+                        name=name,
+                        doc_type=doc_type,
+                        version=lineage.latest_version + 1,
+                        previous_version_id=lineage.head_id,
+                        file=blob.s3_key,
+                        blob=blob,
+                    )))
+                Document.objects.bulk_create([document for _, _, document in wave])
+                for index, lineage, document in wave:
+                    documents[index] = document
+                    lineage.head = document
+                    lineage.latest_version = document.version
+                    lineage.version_count += 1
+                    lineage.updated_at = now
+                pending = later
+
+            cls.objects.bulk_update(lineages.values(), ['head', 'latest_version', 'version_count', 'updated_at'])
+            references = Counter(blob.pk for _, _, blob in entries)
+            DocumentBlob.objects.filter(pk__in=references).update(ref_count=F('ref_count') + Case(
+                *[When(pk=pk, then=Value(count)) for pk, count in references.items()],
+                output_field=models.IntegerField(),
+            ))
+            # bulk_create sends no post_save, so polled lists are told about the new versions here
+            bump_documents(investor.pk)
+        return documents
+
+class PendingUpload(models.Model):
+    """A presigned direct-to-S3 upload waiting to be finalized into a Document version."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    investor = models.ForeignKey(InvestorProfile, on_delete=models.CASCADE, related_name='pending_uploads')
+    name = models.CharField(max_length=255)
+    doc_type = models.CharField(max_length=50)
+    s3_key = models.CharField(max_length=512, unique=True)
+    content_type = models.CharField(max_length=255)
+    max_size = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    document = models.OneToOneField(Document, null=True, blank=True, on_delete=models.SET_NULL, related_name='pending_upload')
+
+    def __str__(self):
+        return f"Upload {self.id} of {self.name} ({self.investor})"
+
+    @staticmethod
+    def finalize_window():
+        # The presigned POST's lifetime, plus a grace period for a finalize sent as the upload completes
+        return datetime.timedelta(seconds=settings.DOCUMENT_UPLOAD_URL_EXPIRY + settings.DOCUMENT_UPLOAD_FINALIZE_GRACE)
+
+    def is_expired(self):
+        return timezone.now() > self.created_at + self.finalize_window()
+
+    @classmethod
+    def stale(cls):
+        """Uploads never finalized and past their window, whose S3 objects (if any) are orphans."""
+        return cls.objects.filter(document__isnull=True, created_at__lt=timezone.now() - cls.finalize_window())
+
+class AuthToken(models.Model):
+    """An expiring per-device API token; the signed token handed out references this row."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='auth_tokens')
+    device = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    revoked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'device'], name='authtoken_user_device_idx'),
+        ]
+
+    @property
+    def is_active(self):
+        return self.revoked_at is None and self.expires_at > timezone.now()
+
+    def __str__(self):
+        return f"Token {self.id} for {self.user} ({self.device or 'unnamed device'})"
+
+class Job(models.Model):
+    """A queued unit of background work, run by ``manage.py run_worker`` (see investors.jobs)."""
+    PENDING, RUNNING, FAILED = 'pending', 'running', 'failed'
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=[
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ], default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status}, attempt {self.attempts})"
+
+def audit_details_search_vector():
+    return SearchVector('details', config='english')
+
+class AuditLogQuerySet(models.QuerySet):
+    def search(self, text):
+        """Full-text search over details.
+
+        On PostgreSQL this matches the GIN index on the details tsvector
+        (migration 0011); other databases fall back to a substring match.
+        """
+        if connections[self.db].vendor != 'postgresql':
+            return self.filter(details__icontains=text)
+        return self.annotate(details_search=audit_details_search_vector()).filter(
+            details_search=SearchQuery(text, config='english', search_type='websearch')
+        )
+
 class AuditLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    # Event type such as LOGIN or UPLOAD; matched exactly so the (action, timestamp) index is used
     action = models.CharField(max_length=255)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the event happens, not when a batched write reaches the database
+    timestamp = models.DateTimeField(default=timezone.now)
     details = models.TextField(blank=True)
 
+    objects = AuditLogQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-timestamp', '-id'], name='auditlog_timestamp_idx'),
+            models.Index(fields=['user', '-timestamp'], name='auditlog_user_timestamp_idx'),
+            models.Index(fields=['action', '-timestamp'], name='auditlog_action_timestamp_idx'),
+        ]
+
     def __str__(self):
         return f"{self.timestamp}: {self.user} - {self.action}"
\ No newline at end of file
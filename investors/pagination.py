@@ -0,0 +1,38 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class DefaultCursorPagination(CursorPagination):
+    """Keyset pagination; clients may pick ?page_size= up to API_MAX_PAGE_SIZE."""
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+
+class DocumentCursorPagination(DefaultCursorPagination):
+    ordering = ('-uploaded_at', '-id')
+
+
+class AuditLogCursorPagination(DefaultCursorPagination):
+    ordering = ('-timestamp', '-id')
+
+
+def paginated_envelope(view, queryset, key, ordering=None, **envelope):
+    """Paginate ``queryset`` into ``key`` of a custom action's response envelope.
+
+    The envelope keeps its own fields and gains ``next``/``previous`` cursor links.
+    """
+    paginator = view.paginator
+    if paginator is None:
+        return Response({**envelope, key: view.get_serializer(queryset, many=True).data})
+
+    if ordering:
+        paginator.ordering = ordering
+    page = paginator.paginate_queryset(queryset, view.request, view=view)
+    return Response({
+        **envelope,
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link(),
+        key: view.get_serializer(page, many=True).data,
+    })
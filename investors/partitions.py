@@ -0,0 +1,152 @@
+"""Monthly range partitioning of the AuditLog table (PostgreSQL only).
+
+Partitions are named ``investors_auditlog_pYYYYMM`` and cover one calendar
+month of ``timestamp``. A DEFAULT partition catches rows outside every
+monthly range so an insert never fails because a partition is missing;
+``ensure_partitions`` moves such rows into their month once it is created.
+"""
+import datetime
+import gzip
+import json
+import tempfile
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .storage import get_s3_client
+
+TABLE = 'investors_auditlog'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+
+def month_start(value):
+    return datetime.datetime(value.year, value.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+def is_partitioned(connection):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s AND relkind IN ('p', 'r')", [TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def list_partitions(connection):
+    """Return [(name, month_start)] of the monthly partitions, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s AND child.relname <> %s
+            ORDER BY child.relname
+            """,
+            [TABLE, DEFAULT_PARTITION],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = f'{TABLE}_p'
+    return [
+        (name, datetime.datetime.strptime(name[len(prefix):], '%Y%m').replace(tzinfo=datetime.timezone.utc))
+        for name in names if name.startswith(prefix)
+    ]
+
+
+def create_partition(connection, month):
+    """Create the partition for ``month``, moving any matching rows out of the DEFAULT partition.
+
+    Runs in one transaction: a failure after detaching DEFAULT must not leave
+    the table without it, or inserts outside the monthly ranges would fail.
+    """
+    name = partition_name(month)
+    bounds = [month, add_months(month, 1)]
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE "timestamp" >= %s AND "timestamp" < %s)',
+            bounds,
+        )
+        stranded = cursor.fetchone()[0]
+        if stranded:
+            cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{DEFAULT_PARTITION}"')
+        cursor.execute(
+            f'CREATE TABLE "{name}" PARTITION OF "{TABLE}" FOR VALUES FROM (%s) TO (%s)',
+            bounds,
+        )
+        if stranded:
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+                f'INSERT INTO "{TABLE}" SELECT * FROM moved',
+                bounds,
+            )
+            cursor.execute(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{DEFAULT_PARTITION}" DEFAULT')
+    return name
+
+
+def ensure_partitions(connection, months_ahead=None, now=None):
+    """Create any missing partitions from the current month up to ``months_ahead`` months ahead."""
+    if months_ahead is None:
+        months_ahead = settings.AUDIT_LOG_PARTITIONS_AHEAD
+    current = month_start(now or datetime.datetime.now(datetime.timezone.utc))
+    existing = {month for _, month in list_partitions(connection)}
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if month not in existing:
+            created.append(create_partition(connection, month))
+    return created
+
+
+def expired_partitions(connection, retention_months, now=None):
+    """Monthly partitions that end before the retention window starts."""
+    cutoff = add_months(month_start(now or datetime.datetime.now(datetime.timezone.utc)), -retention_months)
+    return [(name, month) for name, month in list_partitions(connection) if add_months(month, 1) <= cutoff]
+
+
+def export_partition(connection, name, chunk_size=5000):
+    """Upload the rows of partition ``name`` to S3 as gzip JSONL and return the object key."""
+    key = f'{settings.AUDIT_LOG_ARCHIVE_PREFIX}{name}.jsonl.gz'
+    with tempfile.TemporaryFile() as spool:
+        with gzip.GzipFile(fileobj=spool, mode='wb') as archive:
+            # A named (server-side) cursor keeps memory flat however large the partition is
+            with connection.chunked_cursor() as cursor:
+                cursor.execute(
+                    f'SELECT "id", "user_id", "action", "timestamp", "details" FROM "{name}" ORDER BY "timestamp", "id"'
+                )
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        record = dict(zip(('id', 'user_id', 'action', 'timestamp', 'details'), row))
+                        archive.write((json.dumps(record, cls=DjangoJSONEncoder) + '\n').encode())
+        spool.seek(0)
+        get_s3_client().upload_fileobj(
+            spool,
+            settings.AWS_STORAGE_BUCKET_NAME,
+            key,
+            ExtraArgs={
+                'ServerSideEncryption': 'AES256',
+                'ContentType': 'application/x-ndjson',
+                'ContentEncoding': 'gzip',
+            },
+        )
+    return key
+
+
+def drop_partition(connection, name, keep_table=False):
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+        if not keep_table:
+            cursor.execute(f'DROP TABLE "{name}"')
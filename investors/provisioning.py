@@ -0,0 +1,228 @@
+"""Bulk investor provisioning from CSV or JSON Lines.
+
+Records are read as a stream and handled in chunks. Per chunk:
+- one query finds usernames that already exist;
+- passwords are hashed on a process pool, since PBKDF2 is CPU-bound and
+  holds the GIL;
+- users, profiles and audit rows are written with bulk_create in one
+  transaction.
+
+bulk_create skips save() and its signals. The checks that would normally run
+there, such as the required-email rule in ``InvestorsConfig.ready``, are
+therefore applied by ``validate_record``.
+"""
+import csv
+import io
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from . import changes
+from .hashing import hash_password, init_worker
+from .models import AuditLog, InvestorProfile
+
+_api_pool = None
+_api_pool_pid = None
+_api_pool_lock = threading.Lock()
+
+FIELDS = ('username', 'email', 'password', 'phone_number', 'first_name', 'last_name')
+
+
+class ProvisioningReport:
+    """Running totals and per-record errors of an import."""
+
+    def __init__(self):
+        self.processed = 0
+        self.created = 0
+        self.errors = []
+
+    def error(self, line, username, message):
+        self.errors.append({'line': line, 'username': username, 'error': message})
+
+    def as_dict(self):
+        return {
+            'processed': self.processed,
+            'created': self.created,
+            'failed': len(self.errors),
+            'errors': self.errors,
+        }
+
+
+def read_records(stream, fmt):
+    """Yield (line number, record dict or error message) from a text stream of CSV or JSONL."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'jsonl':
+        for line, text in enumerate(stream, start=1):
+            if not text.strip():
+                continue
+            try:
+                record = json.loads(text)
+            except ValueError as exc:
+                yield line, f"Invalid JSON: {exc}"
+                continue
+            yield line, record if isinstance(record, dict) else "Expected a JSON object"
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+def text_stream(uploaded_file):
+    """Wrap an uploaded (binary) file so it can be read line by line as UTF-8 text."""
+    return io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+
+
+_validate_username = UnicodeUsernameValidator()
+
+
+def validate_record(record):
+    """Return a cleaned copy of ``record``; raises ValidationError with a readable message."""
+    cleaned = {field: str(record.get(field) or '').strip() for field in FIELDS}
+    if not cleaned['username']:
+        raise ValidationError("Username is required")
+    if len(cleaned['username']) > 150:
+        raise ValidationError("Username is longer than 150 characters")
+    _validate_username(cleaned['username'])
+    if not cleaned['email']:
+        raise ValidationError("Email is required for all users.")
+    validate_email(cleaned['email'])
+    if len(cleaned['phone_number']) > 15:
+        raise ValidationError("Phone number is longer than 15 characters")
+    for name in ('first_name', 'last_name'):
+        if len(cleaned[name]) > 150:
+            raise ValidationError(f"{name} is longer than 150 characters")
+    return cleaned
+
+
+def hash_pool(workers=None):
+    """Process pool for password hashing, or None to hash inline when ``workers`` is 0.
+
+    Workers come from a forkserver where available: forking a web worker that
+    runs background threads (audit sink, S3 transfers) directly is not safe.
+    """
+    workers = settings.PROVISIONING_HASH_WORKERS if workers is None else workers
+    if workers == 0:
+        return None
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method),
+                               initializer=init_worker)
+
+
+def api_hash_pool():
+    """The web worker's hashing pool for ``POST /api/investors/bulk/``, or None to hash inline.
+
+    Created on first use and shared by every request in the process, so
+    concurrent imports queue on PROVISIONING_API_HASH_WORKERS processes instead
+    of each starting (and setting up Django in) a pool of their own.
+    """
+    global _api_pool, _api_pool_pid
+    if settings.PROVISIONING_API_HASH_WORKERS == 0:
+        return None
+    pid = os.getpid()
+    if _api_pool is None or _api_pool_pid != pid:
+        with _api_pool_lock:
+            if _api_pool is None or _api_pool_pid != pid:
+                # A forked child can't use its parent's pool
+                _api_pool = hash_pool(settings.PROVISIONING_API_HASH_WORKERS)
+                _api_pool_pid = pid
+    return _api_pool
+
+
+def provision_investors(records, actor=None, chunk_size=None, pool=None, progress=None):
+    """Create users with investor profiles from ``(line, record)`` pairs; returns a ProvisioningReport.
+
+    ``pool`` hashes passwords in parallel (see ``hash_pool``); ``progress`` is
+    called with the report after every chunk.
+    """
+    chunk_size = chunk_size or settings.PROVISIONING_CHUNK_SIZE
+    report = ProvisioningReport()
+    seen = set()
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        _provision_chunk(chunk, actor, pool, report, seen)
+        if progress:
+            progress(report)
+    return report
+
+
+def _provision_chunk(chunk, actor, pool, report, seen):
+    report.processed += len(chunk)
+    valid = []
+    for line, record in chunk:
+        if isinstance(record, str):
+            report.error(line, None, record)
+            continue
+        username = str(record.get('username') or '').strip() or None
+        try:
+            cleaned = validate_record(record)
+        except ValidationError as exc:
+            report.error(line, username, ' '.join(exc.messages))
+            continue
+        if cleaned['username'] in seen:
+            report.error(line, username, "Duplicate username in this import")
+            continue
+        seen.add(cleaned['username'])
+        valid.append((line, cleaned))
+
+    existing = set(User.objects.filter(username__in=[c['username'] for _, c in valid]).values_list('username', flat=True))
+    for line, cleaned in valid:
+        if cleaned['username'] in existing:
+            report.error(line, cleaned['username'], "Username already exists")
+    valid = [(line, cleaned) for line, cleaned in valid if cleaned['username'] not in existing]
+    if not valid:
+        return
+
+    passwords = [cleaned['password'] for _, cleaned in valid]
+    if pool is None:
+        hashes = [hash_password(password) for password in passwords]
+    else:
+        hashes = list(pool.map(hash_password, passwords, chunksize=max(1, len(passwords) // 32)))
+
+    try:
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username=cleaned['username'], email=cleaned['email'], password=password_hash,
+                     first_name=cleaned['first_name'], last_name=cleaned['last_name'])
+                for (_, cleaned), password_hash in zip(valid, hashes)
+            ])
+            InvestorProfile.objects.bulk_create([
+                InvestorProfile(user=user, phone_number=cleaned['phone_number'])
+                for user, (_, cleaned) in zip(users, valid)
+            ])
+            AuditLog.objects.bulk_create([
+                AuditLog(user=actor, action="CREATE_USER", details=f"Created user '{user.username}' with profile (bulk import)")
+                for user in users
+            ])
+            # bulk_create sends no post_save signals
+            changes.bump(changes.INVESTORS)
+    except IntegrityError:
+        # A username was taken concurrently; fall back to one transaction per record for this chunk
+        for (line, cleaned), password_hash in zip(valid, hashes):
+            try:
+                with transaction.atomic():
+                    user = User.objects.create(username=cleaned['username'], email=cleaned['email'],
+                                               password=password_hash, first_name=cleaned['first_name'],
+                                               last_name=cleaned['last_name'])
+                    InvestorProfile.objects.create(user=user, phone_number=cleaned['phone_number'])
+                    AuditLog.objects.create(user=actor, action="CREATE_USER",
+                                            details=f"Created user '{user.username}' with profile (bulk import)")
+            except IntegrityError:
+                report.error(line, cleaned['username'], "Username already exists")
+            else:
+                report.created += 1
+        return
+    report.created += len(users)
@@ -0,0 +1,78 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional dependency; the stdlib encoder is used instead
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes with orjson when it is installed.
+
+    For compact, unicode JSON the output decodes to what DRF's JSONRenderer
+    produces for the types these serializers emit (strings, integers, dates),
+    and matches it byte for byte for those. Floats are not covered: orjson
+    spells them differently (``1e16`` rather than ``1e+16``) and encodes NaN
+    and infinities as ``null`` where the strict stdlib encoder raises. Any
+    other configuration, an indented (browsable) request or a value orjson
+    cannot encode falls back to the stdlib path.
+    """
+    _encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or not (self.compact and self.ensure_ascii is False and self.strict)
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                # DRF's encoder formats datetimes (e.g. the trailing 'Z') and any non-JSON types
+                default=self._encoder.default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except TypeError:  # orjson.JSONEncodeError, e.g. integers wider than 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Match JSONRenderer, which escapes these for JavaScript compatibility
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class PassthroughRenderer(BaseRenderer):
+    """Negotiates a format whose body the view builds itself (streams, images).
+
+    Anything rendered through it, such as an error response, is sent as JSON.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data)
+
+
+class CSVStreamRenderer(PassthroughRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class JSONLinesRenderer(PassthroughRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'jsonl'
+
+
+class SVGRenderer(PassthroughRenderer):
+    media_type = 'image/svg+xml'
+    format = 'svg'
+
+
+class PNGRenderer(PassthroughRenderer):
+    media_type = 'image/png'
+    format = 'png'
+
+
+class ZipRenderer(PassthroughRenderer):
+    media_type = 'application/zip'
+    format = 'zip'
@@ -1,7 +1,28 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
 from .models import InvestorProfile, Document, AuditLog
 
+def requested_expansions(request):
+    """Relations the client asked to nest with ?expand=a,b."""
+    if request is None:
+        return set()
+    return {name.strip() for name in request.query_params.get('expand', '').split(',') if name.strip()}
+
+class ExpandableFieldsMixin:
+    """Render relations as primary keys unless they are requested with ?expand=.
+
+    ``expandable_fields`` maps a field name to the serializer used when it is expanded.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = requested_expansions(self.context.get('request'))
+        for name, serializer_class in self.expandable_fields.items():
+            if name in expand:
+                self.fields[name] = serializer_class(read_only=True)
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -14,8 +35,8 @@ class InvestorProfileSerializer(serializers.ModelSerializer):
         model = InvestorProfile
         fields = ['id', 'user', 'phone_number', 'mfa_enabled']
 
-class DocumentSerializer(serializers.ModelSerializer):
-    investor = InvestorProfileSerializer(read_only=True)
+class DocumentSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    investor = serializers.PrimaryKeyRelatedField(read_only=True)
     file = serializers.FileField(write_only=True)
 
     class Meta:
@@ -26,9 +47,26 @@ class DocumentSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['uploaded_at', 'version']
 
-class AuditLogSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+    expandable_fields = {'investor': InvestorProfileSerializer}
+
+class UploadUrlRequestSerializer(serializers.Serializer):
+    """Parameters for requesting a presigned direct-to-S3 upload."""
+    name = serializers.CharField(max_length=255)
+    doc_type = serializers.ChoiceField(choices=Document._meta.get_field('doc_type').choices, default='other')
+    filename = serializers.CharField(max_length=255, required=False)
+    content_type = serializers.ChoiceField(choices=settings.DOCUMENT_UPLOAD_CONTENT_TYPES)
+    size = serializers.IntegerField(min_value=1, max_value=settings.DOCUMENT_UPLOAD_MAX_SIZE)
+
+class BatchUploadItemSerializer(serializers.Serializer):
+    """Metadata for one file of a batch upload; ``name`` defaults to the file name."""
+    name = serializers.CharField(max_length=255)
+    doc_type = serializers.ChoiceField(choices=Document._meta.get_field('doc_type').choices, default='other')
+
+class AuditLogSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
 
     class Meta:
         model = AuditLog
-        fields = ['id', 'user', 'action', 'timestamp', 'details']
\ No newline at end of file
+        fields = ['id', 'user', 'action', 'timestamp', 'details']
+
+    expandable_fields = {'user': UserSerializer}
\ No newline at end of file
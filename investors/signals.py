@@ -0,0 +1,54 @@
+"""Signal handlers that keep caches and counters in step with the database."""
+from django.db.models import F
+
+from . import changes
+from .authentication import invalidate_token, invalidate_user, mark_revoked
+from .models import DocumentBlob, DocumentLineage, InvestorProfile
+
+
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Covers deactivation, deletion, password and permission changes
+    invalidate_user(instance.pk)
+    if update_fields != frozenset({'last_login'}):  # logins don't change the investor list
+        # Document lists embed the investor and user with ?expand=investor
+        profile_ids = InvestorProfile.objects.filter(user_id=instance.pk).values_list('pk', flat=True)
+        changes.bump(changes.INVESTORS, *changes.document_scopes(*profile_ids))
+
+
+def profile_changed(sender, instance, **kwargs):
+    # Covers MFA setup, enablement and removal
+    invalidate_user(instance.user_id)
+    changes.bump(changes.INVESTORS, *changes.document_scopes(instance.pk))
+
+
+def token_deleted(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+def auth_token_changed(sender, instance, **kwargs):
+    # Revocations made outside revoke_tokens(), e.g. in the admin
+    if not instance.is_active:
+        mark_revoked(instance.pk, instance.expires_at)
+
+
+def auth_token_deleted(sender, instance, **kwargs):
+    mark_revoked(instance.pk, instance.expires_at)
+
+
+def document_saved(sender, instance, **kwargs):
+    changes.bump_documents(instance.investor_id)
+
+
+def document_deleted(sender, instance, **kwargs):
+    # Also runs for cascades (investor or user deletion), the admin and queryset deletes,
+    # all inside the delete's transaction, so the lineage lock is held until it commits
+    lineage = DocumentLineage.objects.select_for_update().filter(
+        investor_id=instance.investor_id,
+        name=instance.name,
+        doc_type=instance.doc_type
+    ).first()
+    if lineage:
+        lineage.refresh()
+    if instance.blob_id:
+        DocumentBlob.objects.filter(pk=instance.blob_id).update(ref_count=F('ref_count') - 1)
+    changes.bump_documents(instance.investor_id)
@@ -0,0 +1,232 @@
+"""S3 helpers for document storage."""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from django.conf import settings
+from django.core.cache import cache
+
+_client = None
+_client_pid = None
+_override = None
+_lock = threading.Lock()
+
+
+def _build_client():
+    # A dedicated session: boto3's default session is not safe to share between threads
+    session = boto3.session.Session(
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        region_name=settings.AWS_S3_REGION_NAME,
+    )
+    return session.client(
+        's3',
+        endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+        config=Config(
+            max_pool_connections=settings.AWS_S3_MAX_POOL_CONNECTIONS,
+            retries={'max_attempts': settings.AWS_S3_MAX_ATTEMPTS, 'mode': 'standard'},
+            connect_timeout=settings.AWS_S3_CONNECT_TIMEOUT,
+            read_timeout=settings.AWS_S3_READ_TIMEOUT,
+            tcp_keepalive=True,
+        ),
+    )
+
+
+def get_s3_client():
+    """Return the process-wide S3 client, creating it on first use.
+
+    The client (and its connection pool) is shared by all threads of a worker.
+    Connections must not cross fork(), so a forked child builds its own client.
+    """
+    global _client, _client_pid
+    if _override is not None:
+        return _override
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _lock:
+            if _client is None or _client_pid != pid:
+                _client = _build_client()
+                _client_pid = pid
+    return _client
+
+
+def set_s3_client(client):
+    """Use ``client`` instead of the real S3 client; ``None`` restores the default."""
+    global _override
+    _override = client
+
+
+@contextmanager
+def override_s3_client(client):
+    """Temporarily swap the S3 client, e.g. for a local stand-in in tests."""
+    previous = _override
+    set_s3_client(client)
+    try:
+        yield client
+    finally:
+        set_s3_client(previous)
+
+
+def transfer_config():
+    """Multipart settings for uploads.
+
+    Peak memory per upload is bounded by multipart_chunksize x max_concurrency,
+    whatever the size of the file.
+    """
+    return TransferConfig(
+        multipart_threshold=settings.AWS_S3_MULTIPART_THRESHOLD,
+        multipart_chunksize=settings.AWS_S3_MULTIPART_CHUNKSIZE,
+        max_concurrency=settings.AWS_S3_MAX_CONCURRENCY,
+        use_threads=settings.AWS_S3_MAX_CONCURRENCY > 1,
+    )
+
+
+def upload_document(file_obj, key, content_type=None, sha256=None):
+    """Stream an uploaded file to S3, switching to a parallel multipart upload for large files.
+
+    s3transfer aborts the multipart upload if any part fails, so no orphaned
+    parts are left behind in the bucket. ``sha256`` is kept as object metadata.
+    """
+    extra_args = {
+        'ServerSideEncryption': 'AES256',
+        'ContentType': content_type or 'application/pdf',
+    }
+    if sha256:
+        extra_args['Metadata'] = {'sha256': sha256}
+    file_obj.seek(0)
+    get_s3_client().upload_fileobj(
+        file_obj,
+        settings.AWS_STORAGE_BUCKET_NAME,
+        key,
+        ExtraArgs=extra_args,
+        Config=transfer_config(),
+    )
+
+
+def file_sha256(file_obj):
+    """SHA-256 of an uploaded file: taken from the hashing upload handler, or computed in chunks."""
+    digest = getattr(file_obj, 'sha256', None)
+    if digest is None:
+        hasher = hashlib.sha256()
+        file_obj.seek(0)
+        for chunk in file_obj.chunks():
+            hasher.update(chunk)
+        digest = hasher.hexdigest()
+    return digest
+
+
+def object_sha256(key):
+    """Stream an S3 object and return (sha256, size, content type) without holding it in memory."""
+    response = get_s3_client().get_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key)
+    hasher = hashlib.sha256()
+    size = 0
+    for chunk in response['Body'].iter_chunks(chunk_size=1024 * 1024):
+        hasher.update(chunk)
+        size += len(chunk)
+    return hasher.hexdigest(), size, response.get('ContentType') or 'application/octet-stream'
+
+
+def blob_key(sha256):
+    return f'{settings.DOCUMENT_BLOB_PREFIX}{sha256}'
+
+
+def delete_objects(keys):
+    """Delete S3 objects in batches of 1000 (the DeleteObjects limit); return the keys that failed."""
+    failed = []
+    client = get_s3_client()
+    for start in range(0, len(keys), 1000):
+        response = client.delete_objects(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+            Delete={'Objects': [{'Key': key} for key in keys[start:start + 1000]], 'Quiet': True},
+        )
+        failed.extend(error['Key'] for error in response.get('Errors', []))
+    return failed
+
+
+class _LocalLRU:
+    """Small in-process LRU of (value, expires_at) pairs in front of the shared cache."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_presigned_urls = _LocalLRU(maxsize=settings.DOCUMENT_DOWNLOAD_URL_LOCAL_CACHE_SIZE)
+_presign_stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(outcome):
+    with _stats_lock:
+        _presign_stats[outcome] += 1
+
+
+def presign_cache_stats():
+    """Hit/miss counters of the presigned URL cache for this process."""
+    with _stats_lock:
+        return dict(_presign_stats)
+
+
+def presigned_download_url(key, user_id, disposition=None):
+    """Return a presigned GET URL for ``key``, reusing a cached one while it is still safely valid.
+
+    URLs are signed for DOCUMENT_DOWNLOAD_URL_EXPIRY seconds but only handed
+    out again for that window minus DOCUMENT_DOWNLOAD_URL_MIN_REMAINING, so a
+    client never receives a URL that is about to expire.
+    """
+    cache_key = 'presign:' + hashlib.sha256(f'{key}|{user_id}|{disposition}'.encode()).hexdigest()
+    now = time.time()
+
+    url = _presigned_urls.get(cache_key, now)
+    if url is not None:
+        _count('local_hits')
+        return url
+
+    cached = cache.get(cache_key)
+    if cached is not None and cached[1] > now:
+        _count('shared_hits')
+        _presigned_urls.set(cache_key, cached[0], cached[1])
+        return cached[0]
+
+    _count('misses')
+    params = {'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': key}
+    if disposition:
+        params['ResponseContentDisposition'] = disposition
+    expires_in = settings.DOCUMENT_DOWNLOAD_URL_EXPIRY
+    url = get_s3_client().generate_presigned_url('get_object', Params=params, ExpiresIn=expires_in)
+
+    reuse_for = expires_in - settings.DOCUMENT_DOWNLOAD_URL_MIN_REMAINING
+    if reuse_for > 0:
+        expires_at = now + reuse_for
+        cache.set(cache_key, (url, expires_at), timeout=reuse_for)
+        _presigned_urls.set(cache_key, url, expires_at)
+    return url
@@ -0,0 +1,34 @@
+"""Streamed response bodies that stay streamed under ASGI.
+
+Under ASGI Django reads a sync iterator passed to StreamingHttpResponse with
+``sync_to_async(list)``, which builds the whole body in memory before the
+first byte is sent. ``streaming_content`` hands ASGI an async iterator that
+pulls one chunk at a time instead, on the request's thread-sensitive thread,
+so generators holding database cursors keep the connection they started on.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+_DONE = object()
+
+
+async def _aiter(chunks):
+    iterator = iter(chunks)
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            chunk = await next_chunk(iterator, _DONE)
+            if chunk is _DONE:
+                return
+            yield chunk
+    finally:
+        # The client went away or the body is done: let the generator release what it holds
+        if hasattr(iterator, 'close'):
+            await sync_to_async(iterator.close, thread_sensitive=True)()
+
+
+def streaming_content(request, chunks):
+    """``chunks`` as StreamingHttpResponse content for the server handling ``request``."""
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        return _aiter(chunks)
+    return chunks
@@ -0,0 +1,61 @@
+"""Background job handlers (see investors.jobs); each takes its job payload as keyword arguments."""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .jobs import task
+from .models import Document, DocumentBlob
+from .storage import delete_objects, get_s3_client, object_sha256
+
+logger = logging.getLogger(__name__)
+
+
+@task('verify_blob')
+def verify_blob(blob_id):
+    """Check a freshly uploaded blob's S3 object against the size and checksum we recorded."""
+    blob = DocumentBlob.objects.filter(pk=blob_id, verified_at__isnull=True).first()
+    if blob is None:
+        return  # verified already, or collected
+    head = get_s3_client().head_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=blob.s3_key)
+    stored_sha256 = head.get('Metadata', {}).get('sha256')
+    if head['ContentLength'] != blob.size or stored_sha256 != blob.sha256:
+        raise ValueError(
+            f"s3://{settings.AWS_STORAGE_BUCKET_NAME}/{blob.s3_key} is {head['ContentLength']} bytes "
+            f"with sha256 {stored_sha256}, expected {blob.size} bytes with sha256 {blob.sha256}"
+        )
+    DocumentBlob.objects.filter(pk=blob.pk).update(verified_at=timezone.now())
+    logger.info("Verified blob %s", blob.sha256)
+
+
+@task('checksum_document')
+def checksum_document(document_id):
+    """Hash a document uploaded straight to S3 and move it into the content-addressed blob store.
+
+    If the same bytes are already stored, the document is pointed at the
+    existing blob and its own copy is deleted.
+    """
+    document = Document.objects.filter(pk=document_id, blob__isnull=True).first()
+    if document is None:
+        return  # has a blob already, or was deleted
+    key = document.file.name
+    sha256, size, content_type = object_sha256(key)
+
+    with transaction.atomic():
+        # Locking waits out a collector deleting this blob; a blob it removed is then created anew
+        blob, created = DocumentBlob.objects.select_for_update().get_or_create(
+            sha256=sha256,
+            # Hashed from the object itself, so there is nothing left to verify
+            defaults={'s3_key': key, 'size': size, 'content_type': content_type, 'verified_at': timezone.now()},
+        )
+        attached = Document.objects.filter(pk=document.pk, blob__isnull=True).update(blob=blob, file=blob.s3_key)
+        if attached:
+            DocumentBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1, updated_at=timezone.now())
+
+    if attached and blob.s3_key != key:
+        # Duplicate content: only the shared blob's object is kept
+        for failed in delete_objects([key]):
+            logger.warning("Could not delete duplicate object s3://%s/%s", settings.AWS_STORAGE_BUCKET_NAME, failed)
+    logger.info("Document %s has sha256 %s", document_id, sha256)
@@ -1,3 +1,1399 @@
-from django.test import TestCase
+import csv
+import datetime
+import fcntl
+import gzip
+import hashlib
+import importlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.db import connection
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.urls import include, path, resolve
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth.models import User
+import pyotp
+from asgiref.sync import sync_to_async
+from botocore.exceptions import ClientError
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from django.core.management import call_command
+from investors.models import InvestorProfile, Document, DocumentBlob, DocumentLineage, AuditLog, AuthToken, Job, PendingUpload
+from django.core.cache import cache
+from django.utils import timezone
+from investors import storage
+from investors.audit import AuditSink
+from investors.authentication import CachedTokenAuthentication, issue_token
+from investors import async_views, jobs, mfa, partitions, uploads
+from investors.storage import get_s3_client, override_s3_client, presign_cache_stats, presigned_download_url, upload_document
+from investors.provisioning import provision_investors
+from investors import renderers
+from investors.renderers import ORJSONRenderer
+from investors.rows import row_shaper
+from investors.serializers import AuditLogSerializer, DocumentSerializer
+from investors.views import DocumentViewSet
+from rest_framework.renderers import JSONRenderer
+from secureinvestor import urls as project_urls
 
-# Create your tests here.
+# The project URLconf with the async document views mounted, as with ASYNC_DOCUMENT_VIEWS=True
+urlpatterns = [path('api/', include('investors.async_urls')), *project_urls.urlpatterns]
+
+class LatestDocumentVersionTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='testpass123', is_staff=True
+        )
+        self.factory = APIRequestFactory()
+
+    def _make_lineages(self, count, versions=3):
+        start = InvestorProfile.objects.count()
+        for i in range(start, start + count):
+            user = User.objects.create(username=f'investor{i}', email=f'investor{i}@example.com')
+            profile = InvestorProfile.objects.create(user=user)
+            for version in range(1, versions + 1):
+                DocumentLineage.record_version(
+                    investor=profile, name='statement', doc_type='statement',
+                    file=f'documents/statement_{i}_{version}.pdf'
+                )
+
+    def _list_queryset(self, action='list'):
+        view = DocumentViewSet(action=action)
+        view.request = Request(self.factory.get('/api/documents/'))
+        view.request.user = self.admin
+        return view.get_queryset()
+
+    def test_list_returns_only_latest_versions(self):
+        self._make_lineages(3)
+        docs = list(self._list_queryset())
+        self.assertEqual(len(docs), 3)
+        self.assertTrue(all(doc.version == 3 for doc in docs))
+
+    def test_latest_resolution_is_a_single_query(self):
+        self._make_lineages(2)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self._list_queryset()), 2)
+
+        self._make_lineages(20)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self._list_queryset()), 22)
+
+    def test_by_type_filter_keeps_latest_versions(self):
+        self._make_lineages(2)
+        docs = list(self._list_queryset().filter(doc_type='statement'))
+        self.assertEqual(sorted(doc.version for doc in docs), [3, 3])
+
+
+class DocumentLineageTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='investor', email='investor@example.com')
+        self.profile = InvestorProfile.objects.create(user=user)
+
+    def test_record_version_advances_head(self):
+        first = DocumentLineage.record_version(self.profile, 'agreement', 'agreement', 'documents/a1.pdf')
+        second = DocumentLineage.record_version(self.profile, 'agreement', 'agreement', 'documents/a2.pdf')
+
+        lineage = DocumentLineage.objects.get(investor=self.profile, name='agreement', doc_type='agreement')
+        self.assertEqual((first.version, second.version), (1, 2))
+        self.assertEqual(second.previous_version, first)
+        self.assertEqual(lineage.head, second)
+        self.assertEqual((lineage.latest_version, lineage.version_count), (2, 2))
+
+    def test_deleting_head_repoints_lineage(self):
+        first = DocumentLineage.record_version(self.profile, 'agreement', 'agreement', 'documents/a1.pdf')
+        second = DocumentLineage.record_version(self.profile, 'agreement', 'agreement', 'documents/a2.pdf')
+        lineage = second.lineage
+        # A queryset delete, as the admin does, never goes through the viewset
+        Document.objects.filter(pk=second.pk).delete()
+        lineage.refresh_from_db()
+
+        self.assertEqual(lineage.head, first)
+        self.assertEqual(lineage.version_count, 1)
+        third = DocumentLineage.record_version(self.profile, 'agreement', 'agreement', 'documents/a3.pdf')
+        self.assertEqual(third.version, 3)
+
+        client = APIClient()
+        client.force_authenticate(self.profile.user)
+        Document.objects.filter(pk=third.pk).delete()
+        self.assertEqual([doc['id'] for doc in client.get('/api/documents/').json()['results']], [first.id])
+
+        first.delete()
+        self.assertFalse(DocumentLineage.objects.exists())
+
+    def test_history_without_lineage(self):
+        for version in (1, 2):
+            document = Document.objects.create(
+                investor=self.profile, name='statement', doc_type='statement',
+                version=version, file=f'documents/s{version}.pdf'
+            )
+        client = APIClient()
+        client.force_authenticate(self.profile.user)
+        response = client.get(f'/api/documents/{document.id}/history/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_versions'], 2)
+
+    def test_migration_backfills_lineages(self):
+        backfill = importlib.import_module('investors.migrations.0015_backfill_document_lineages').backfill_lineages
+        for version in (1, 2, 3):
+            Document.objects.create(
+                investor=self.profile, name='statement', doc_type='statement',
+                version=version, file=f'documents/s{version}.pdf'
+            )
+        kept = DocumentLineage.record_version(self.profile, 'agreement', 'agreement', 'documents/a1.pdf')
+        backfill(django_apps, None)
+
+        lineage = DocumentLineage.objects.get(name='statement')
+        self.assertEqual(lineage.head.version, 3)
+        self.assertEqual((lineage.latest_version, lineage.version_count), (3, 3))
+        self.assertEqual(DocumentLineage.objects.get(name='agreement').head, kept)
+
+    def test_backfill_command(self):
+        for version in (1, 2, 3):
+            Document.objects.create(
+                investor=self.profile, name='statement', doc_type='statement',
+                version=version, file=f'documents/s{version}.pdf'
+            )
+        call_command('backfill_document_lineages', stdout=StringIO())
+
+        lineage = DocumentLineage.objects.get()
+        self.assertEqual(lineage.head.version, 3)
+        self.assertEqual((lineage.latest_version, lineage.version_count), (3, 3))
+
+
+class StreamingUploadTests(TestCase):
+    @override_settings(AWS_STORAGE_BUCKET_NAME='bucket', AWS_S3_MULTIPART_CHUNKSIZE=5 * 1024 * 1024, AWS_S3_MAX_CONCURRENCY=2)
+    def test_upload_streams_file_object_with_transfer_config(self):
+        calls = []
+
+        class RecordingS3:
+            def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None, Config=None):
+                calls.append((fileobj, bucket, key, ExtraArgs, Config))
+
+        file_obj = SimpleUploadedFile('scan.pdf', b'%PDF-1.4 test', content_type='application/pdf')
+        file_obj.read()
+        with override_s3_client(RecordingS3()):
+            upload_document(file_obj, 'documents/scan.pdf', content_type='application/pdf')
+
+        fileobj, bucket, key, extra_args, config = calls[0]
+        self.assertIs(fileobj, file_obj)
+        self.assertEqual(fileobj.tell(), 0)
+        self.assertEqual((bucket, key), ('bucket', 'documents/scan.pdf'))
+        self.assertEqual(extra_args['ServerSideEncryption'], 'AES256')
+        self.assertEqual((config.multipart_chunksize, config.max_concurrency), (5 * 1024 * 1024, 2))
+
+
+class S3ClientFactoryTests(TestCase):
+    def test_client_is_shared_and_swappable(self):
+        self.assertIs(get_s3_client(), get_s3_client())
+        stand_in = object()
+        with override_s3_client(stand_in):
+            self.assertIs(get_s3_client(), stand_in)
+        self.assertIsNot(get_s3_client(), stand_in)
+
+
+class PresignedUploadTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='investor', email='investor@example.com')
+        InvestorProfile.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.s3 = mock.Mock()
+        self.s3.generate_presigned_post.return_value = {'url': 'https://bucket.s3.amazonaws.com/', 'fields': {'key': 'k'}}
+        self.enterContext(override_s3_client(self.s3))
+
+    def _request_upload(self):
+        response = self.client.post('/api/documents/upload-url/', {
+            'name': 'subscription', 'doc_type': 'agreement', 'filename': 'scan.pdf',
+            'content_type': 'application/pdf', 'size': 2048,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def test_upload_url_limits_size_and_content_type(self):
+        data = self._request_upload()
+        conditions = self.s3.generate_presigned_post.call_args.kwargs['Conditions']
+        self.assertIn(['content-length-range', 1, 2048], conditions)
+        self.assertIn({'Content-Type': 'application/pdf'}, conditions)
+        self.assertTrue(data['key'].startswith('documents/subscription_'))
+
+    def test_finalize_creates_version_once(self):
+        data = self._request_upload()
+        self.s3.head_object.return_value = {'ContentLength': 1024, 'ContentType': 'application/pdf'}
+
+        first = self.client.post(f"/api/documents/{data['upload_id']}/finalize/")
+        again = self.client.post(f"/api/documents/{data['upload_id']}/finalize/")
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(Document.objects.get().file.name, data['key'])
+        self.assertEqual(AuditLog.objects.filter(action='UPLOAD').count(), 1)
+
+    def test_finalize_rejects_oversized_object(self):
+        data = self._request_upload()
+        self.s3.head_object.return_value = {'ContentLength': 4096, 'ContentType': 'application/pdf'}
+
+        response = self.client.post(f"/api/documents/{data['upload_id']}/finalize/")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Document.objects.exists())
+
+    def test_expired_uploads_are_refused_and_collected(self):
+        data = self._request_upload()
+        fresh = self._request_upload()
+        window = PendingUpload.finalize_window() + datetime.timedelta(seconds=1)
+        PendingUpload.objects.filter(pk=data['upload_id']).update(created_at=timezone.now() - window)
+        self.s3.head_object.return_value = {'ContentLength': 1024, 'ContentType': 'application/pdf'}
+
+        response = self.client.post(f"/api/documents/{data['upload_id']}/finalize/")
+        self.assertEqual(response.status_code, 410)
+        self.assertFalse(Document.objects.exists())
+
+        self.s3.delete_objects.return_value = {}
+        call_command('gc_document_blobs', stdout=StringIO())
+        deleted = self.s3.delete_objects.call_args.kwargs['Delete']['Objects']
+        self.assertEqual(deleted, [{'Key': data['key']}])
+        self.assertEqual(list(PendingUpload.objects.values_list('pk', flat=True)), [fresh['upload_id']])
+        self.assertEqual(self.client.post(f"/api/documents/{fresh['upload_id']}/finalize/").status_code, 201)
+
+
+@override_settings(DOCUMENT_DOWNLOAD_URL_EXPIRY=300, DOCUMENT_DOWNLOAD_URL_MIN_REMAINING=60)
+class PresignedDownloadCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        storage._presigned_urls.clear()
+        self.s3 = mock.Mock()
+        self.s3.generate_presigned_url.side_effect = lambda *args, **kwargs: f'https://signed/{self.s3.generate_presigned_url.call_count}'
+        self.enterContext(override_s3_client(self.s3))
+
+    def test_repeated_downloads_reuse_signature(self):
+        before = presign_cache_stats()
+        first = presigned_download_url('documents/a.pdf', 1)
+        second = presigned_download_url('documents/a.pdf', 1)
+        after = presign_cache_stats()
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.s3.generate_presigned_url.call_count, 1)
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['local_hits'] - before['local_hits'], 1)
+
+    def test_key_includes_user_and_disposition(self):
+        presigned_download_url('documents/a.pdf', 1)
+        presigned_download_url('documents/a.pdf', 2)
+        presigned_download_url('documents/a.pdf', 1, 'attachment; filename="a.pdf"')
+        self.assertEqual(self.s3.generate_presigned_url.call_count, 3)
+
+    def test_entries_expire_before_the_signature(self):
+        with mock.patch('investors.storage.time.time', return_value=1000.0):
+            presigned_download_url('documents/a.pdf', 1)
+        with mock.patch('investors.storage.time.time', return_value=1000.0 + 241):
+            presigned_download_url('documents/a.pdf', 1)
+        self.assertEqual(self.s3.generate_presigned_url.call_count, 2)
+
+
+class AuditSinkTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='audited', email='audited@example.com')
+        self.spool_dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        # Drive the sink by hand instead of from its background thread
+        self.enterContext(mock.patch('investors.audit.threading.Thread'))
+        self.sink = AuditSink(batch_size=100, flush_interval=3600, spool_dir=self.spool_dir)
+
+    def test_entries_are_spooled_then_bulk_written(self):
+        self.sink.record([
+            {'user_id': self.user.pk, 'action': 'LOGIN', 'details': '', 'timestamp': '2026-01-01T00:00:00+00:00'},
+            {'user_id': self.user.pk, 'action': 'DOWNLOAD', 'details': 'doc', 'timestamp': '2026-01-01T00:00:01+00:00'},
+        ])
+        spooled = [line for path in self.spool_dir.iterdir() for line in path.read_text().splitlines()]
+        self.assertEqual(len(spooled), 2)
+        self.assertFalse(AuditLog.objects.exists())
+
+        with self.assertNumQueries(1):
+            self.sink.flush()
+        self.assertEqual(list(AuditLog.objects.order_by('timestamp').values_list('action', flat=True)), ['LOGIN', 'DOWNLOAD'])
+        self.assertEqual([path.read_text() for path in self.spool_dir.iterdir()], [''])
+
+    def test_orphaned_spool_is_replayed(self):
+        entry = {'user_id': self.user.pk, 'action': 'UPLOAD', 'details': 'x', 'timestamp': '2026-01-01T00:00:00+00:00'}
+        orphan = self.spool_dir / 'audit-1-dead.jsonl'
+        orphan.write_text(json.dumps(entry) + '\n{"user_id": 1, "act')
+
+        self.sink.replay_spool()
+
+        self.assertEqual(AuditLog.objects.get().action, 'UPLOAD')
+        self.assertFalse(orphan.exists())
+
+    def test_concurrent_replays_write_a_segment_once(self):
+        entry = {'user_id': self.user.pk, 'action': 'UPLOAD', 'details': 'x', 'timestamp': '2026-01-01T00:00:00+00:00'}
+        (self.spool_dir / 'audit-1-dead.jsonl').write_text(json.dumps(entry) + '\n')
+        other = AuditSink(batch_size=100, flush_interval=3600, spool_dir=self.spool_dir)
+        real_flock = fcntl.flock
+        raced = []
+
+        def flock(file, operation):
+            # This replayer has the segment open; the other one replays it before our lock is taken
+            if not raced:
+                raced.append(True)
+                other.replay_spool()
+            return real_flock(file, operation)
+
+        with mock.patch('investors.audit.fcntl.flock', side_effect=flock):
+            self.sink.replay_spool()
+
+        self.assertEqual(AuditLog.objects.count(), 1)
+        self.assertEqual(list(self.spool_dir.iterdir()), [])
+
+
+class AuditPartitionTests(TestCase):
+    def test_month_arithmetic_and_names(self):
+        december = partitions.month_start(datetime.datetime(2025, 12, 17, 8, tzinfo=datetime.timezone.utc))
+        self.assertEqual(partitions.add_months(december, 1), datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc))
+        self.assertEqual(partitions.add_months(december, -12).year, 2024)
+        self.assertEqual(partitions.partition_name(december), 'investors_auditlog_p202512')
+
+    def test_plain_table_is_left_alone(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest("the audit table is partitioned on PostgreSQL")
+        self.assertFalse(partitions.is_partitioned(connection))
+
+    @skipUnless(connection.vendor == 'postgresql', "partitioning is PostgreSQL only")
+    def test_failed_partition_creation_keeps_default(self):
+        month = datetime.datetime(1999, 3, 1, tzinfo=datetime.timezone.utc)
+        AuditLog.objects.create(action='LOGIN', details='stranded', timestamp=month + datetime.timedelta(days=1))
+        # Occupy the partition's name so CREATE fails after DEFAULT has been detached
+        with connection.cursor() as cursor:
+            cursor.execute(f'CREATE TABLE "{partitions.partition_name(month)}" (id bigint)')
+        with self.assertRaises(Exception):
+            partitions.create_partition(connection, month)
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relispartition FROM pg_class WHERE relname = %s", [partitions.DEFAULT_PARTITION])
+            self.assertTrue(cursor.fetchone()[0])
+        self.assertTrue(AuditLog.objects.filter(details='stranded').exists())
+
+    @skipUnless(connection.vendor == 'postgresql', "partitioning is PostgreSQL only")
+    def test_expired_partition_is_archived_and_detached(self):
+        self.assertTrue(partitions.is_partitioned(connection))
+        month = datetime.datetime(2001, 1, 1, tzinfo=datetime.timezone.utc)
+        name = partitions.create_partition(connection, month)
+        AuditLog.objects.create(action='LOGIN', details='long ago', timestamp=month + datetime.timedelta(days=14))
+        AuditLog.objects.create(action='LOGIN', details='recent')
+        self.assertIn((name, month), partitions.list_partitions(connection))
+
+        uploaded = {}
+        s3 = mock.Mock()
+        s3.upload_fileobj.side_effect = lambda fileobj, bucket, key, ExtraArgs: uploaded.update({key: fileobj.read()})
+        with override_s3_client(s3):
+            call_command('maintain_audit_partitions', '--retention-months=12', stdout=StringIO())
+
+        records = [json.loads(line) for line in gzip.decompress(uploaded[f'{settings.AUDIT_LOG_ARCHIVE_PREFIX}{name}.jsonl.gz']).splitlines()]
+        self.assertEqual([record['details'] for record in records], ['long ago'])
+        self.assertNotIn(name, [partition for partition, _ in partitions.list_partitions(connection)])
+        self.assertEqual(list(AuditLog.objects.values_list('details', flat=True)), ['recent'])
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='investor', email='investor@example.com')
+        profile = InvestorProfile.objects.create(user=user)
+        for i in range(3):
+            for version in (1, 2, 3):
+                DocumentLineage.record_version(profile, f'doc{i}', 'statement', f'documents/doc{i}_{version}.pdf')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def _walk(self, url, key):
+        items = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            items.extend(response.data[key])
+            url = response.data['next']
+        return items
+
+    def test_list_pages_through_latest_versions(self):
+        docs = self._walk('/api/documents/?page_size=2', 'results')
+        self.assertEqual(sorted(doc['name'] for doc in docs), ['doc0', 'doc1', 'doc2'])
+
+    def test_history_envelope_is_paginated_by_version(self):
+        head = Document.objects.get(name='doc0', version=3)
+        first_page = self.client.get(f'/api/documents/{head.id}/history/?page_size=2').data
+        self.assertEqual(first_page['total_versions'], 3)
+        self.assertEqual([doc['version'] for doc in first_page['versions']], [3, 2])
+
+        versions = self._walk(f'/api/documents/{head.id}/history/?page_size=2', 'versions')
+        self.assertEqual([doc['version'] for doc in versions], [3, 2, 1])
+
+
+class AuditLogFilterTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', email='admin@example.com', is_staff=True)
+        day = datetime.datetime(2026, 3, 1, tzinfo=datetime.timezone.utc)
+        AuditLog.objects.bulk_create([
+            AuditLog(user=self.admin, action='LOGIN', details='User logged in with MFA', timestamp=day),
+            AuditLog(user=self.admin, action='UPLOAD', details="Uploaded document 'statement'", timestamp=day + datetime.timedelta(days=1)),
+            AuditLog(user=self.admin, action='DOWNLOAD', details="Downloaded/viewed document 'statement'", timestamp=day + datetime.timedelta(days=2)),
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _actions(self, query):
+        response = self.client.get(f'/api/auditlogs/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return sorted(entry['action'] for entry in response.data['results'])
+
+    def test_action_is_exact_and_accepts_lists(self):
+        self.assertEqual(self._actions('action=login,upload'), ['LOGIN', 'UPLOAD'])
+        self.assertEqual(self._actions('action=LOG'), [])
+
+    def test_time_range(self):
+        self.assertEqual(self._actions('since=2026-03-02&until=2026-03-03T00:00:00Z'), ['UPLOAD'])
+        self.assertEqual(self.client.get('/api/auditlogs/?since=yesterday').status_code, 400)
+
+    def test_details_search(self):
+        self.assertEqual(self._actions('q=statement'), ['DOWNLOAD', 'UPLOAD'])
+
+
+class SerializerQueryCountTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', email='admin@example.com', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _add_documents(self, count):
+        start = InvestorProfile.objects.count()
+        for i in range(start, start + count):
+            user = User.objects.create(username=f'investor{i}', email=f'investor{i}@example.com')
+            profile = InvestorProfile.objects.create(user=user)
+            DocumentLineage.record_version(profile, 'statement', 'statement', f'documents/s{i}.pdf')
+            AuditLog.objects.create(user=user, action='UPLOAD', details='statement')
+
+    def _assert_constant_queries(self, url, queries):
+        for count in (2, 10):
+            self._add_documents(count)
+            with self.assertNumQueries(queries):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_documents_are_flat_by_default(self):
+        response = self._assert_constant_queries('/api/documents/', 1)
+        self.assertIsInstance(response.data['results'][0]['investor'], int)
+
+    def test_expanded_documents_join_investor_and_user(self):
+        response = self._assert_constant_queries('/api/documents/?expand=investor', 1)
+        self.assertEqual(response.data['results'][0]['investor']['user']['username'], 'investor11')
+
+    def test_expanded_audit_logs_join_user(self):
+        response = self._assert_constant_queries('/api/auditlogs/?expand=user', 1)
+        self.assertIn('username', response.data['results'][0]['user'])
+
+    def test_investor_list_joins_user(self):
+        self._assert_constant_queries('/api/investors/', 1)
+
+
+class FastListPathTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='investor', email='investor@example.com')
+        profile = InvestorProfile.objects.create(user=user)
+        for version in (1, 2):
+            DocumentLineage.record_version(profile, 'Relevé\u2028 "Q1"', 'statement', f'documents/q1_{version}.pdf')
+        AuditLog.objects.create(user=user, action='UPLOAD', details='ünïcode \u2029 details')
+        AuditLog.objects.create(user=None, action='LOGIN', details='')
+
+    def _assert_same_bytes(self, queryset, serializer_class):
+        columns, shape_rows = row_shaper(serializer_class)
+        fast = shape_rows(queryset.values_list(*columns))
+        slow = serializer_class(queryset, many=True).data
+        self.assertEqual(ORJSONRenderer().render(fast), JSONRenderer().render(slow))
+
+    def test_documents_match_serializer_output(self):
+        self._assert_same_bytes(Document.objects.order_by('id'), DocumentSerializer)
+
+    def test_audit_logs_match_serializer_output(self):
+        self._assert_same_bytes(AuditLog.objects.order_by('id'), AuditLogSerializer)
+
+    def test_renderer_falls_back_for_values_orjson_rejects(self):
+        data = {'big': 2 ** 70, 'when': datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    @skipUnless(renderers.orjson, "orjson is not installed")
+    def test_renderer_float_output(self):
+        data = {'large': 1e16, 'small': 0.1}
+        self.assertEqual(ORJSONRenderer().render(data), b'{"large":1e16,"small":0.1}')
+        self.assertEqual(JSONRenderer().render(data), b'{"large":1e+16,"small":0.1}')
+        self.assertEqual(json.loads(ORJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+
+        nan = {'value': float('nan'), 'limit': float('inf')}
+        self.assertEqual(ORJSONRenderer().render(nan), b'{"value":null,"limit":null}')
+        with self.assertRaises(ValueError):
+            JSONRenderer().render(nan)
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class StreamingExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', email='admin@example.com', is_staff=True)
+        AuditLog.objects.bulk_create([
+            AuditLog(user=self.admin, action='LOGIN' if i % 2 else 'UPLOAD', details=f'entry, "{i}"')
+            for i in range(5)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _body(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_export_applies_list_filters(self):
+        response, body = self._body('/api/auditlogs/export/?format=csv&action=login')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(StringIO(body.decode())))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual({row['action'] for row in rows}, {'LOGIN'})
+        self.assertTrue(rows[0]['details'].startswith('entry, "'))
+
+    def test_csv_export_neutralizes_formulas(self):
+        AuditLog.objects.all().delete()
+        AuditLog.objects.bulk_create([
+            AuditLog(user=self.admin, action='UPLOAD', details=details)
+            for details in ('=HYPERLINK("http://x")', '+1', '-1', '@SUM(A1)', '\tcmd', 'plain - text')
+        ])
+        _, body = self._body('/api/auditlogs/export/?format=csv&action=upload')
+        details = sorted(row['details'] for row in csv.DictReader(StringIO(body.decode())))
+        self.assertEqual(details, sorted(["'=HYPERLINK(\"http://x\")", "'+1", "'-1", "'@SUM(A1)", "'\tcmd", 'plain - text']))
+        # JSON Lines carries values as they are
+        _, body = self._body('/api/auditlogs/export/?format=jsonl&action=upload')
+        self.assertIn('=HYPERLINK("http://x")', [json.loads(line)['details'] for line in body.splitlines()])
+
+    def test_gzipped_jsonl_export(self):
+        response, body = self._body('/api/auditlogs/export/?format=jsonl&gzip=1')
+        self.assertIn('.jsonl.gz', response['Content-Disposition'])
+        entries = [json.loads(line) for line in gzip.decompress(body).decode().splitlines()]
+        # The export's own audit entry is written before the body streams
+        self.assertEqual(len(entries), 6)
+        self.assertEqual(entries[0]['action'], 'EXPORT')
+        self.assertEqual(entries[0]['user'], self.admin.id)
+
+    def test_document_export_is_scoped_to_owner(self):
+        profile = InvestorProfile.objects.create(user=User.objects.create(username='investor', email='investor@example.com'))
+        for version in (1, 2):
+            DocumentLineage.record_version(profile, 'statement', 'statement', f'documents/s{version}.pdf')
+        self.client.force_authenticate(profile.user)
+        _, body = self._body('/api/documents/export/?format=jsonl')
+        self.assertEqual([json.loads(line)['version'] for line in body.splitlines()], [2])
+        _, body = self._body('/api/documents/export/?format=jsonl&all_versions=1')
+        self.assertEqual(len(body.splitlines()), 2)
+
+    async def test_asgi_export_is_streamed(self):
+        signed, _ = await sync_to_async(issue_token)(self.admin)
+        response = await AsyncClient().get('/api/auditlogs/export/?format=csv',
+                                           headers={'Authorization': f'Token {signed}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        # Header and one chunk per EXPORT_CHUNK_SIZE rows, not one buffered body
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(len(list(csv.DictReader(StringIO(b''.join(chunks).decode())))), 6)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='investor', email='investor@example.com')
+        self.profile = InvestorProfile.objects.create(user=self.user)
+        self.token = Token.objects.create(user=self.user)
+        self.auth = CachedTokenAuthentication()
+
+    def test_cache_hit_needs_no_queries_including_profile(self):
+        with self.assertNumQueries(1):
+            user, _ = self.auth.authenticate_credentials(self.token.key)
+            self.assertFalse(user.profile.mfa_enabled)
+        with self.assertNumQueries(0):
+            user, token = self.auth.authenticate_credentials(self.token.key)
+            self.assertEqual(user.profile.pk, self.profile.pk)
+        self.assertEqual(token.key, self.token.key)
+
+    def test_snapshot_leaves_credentials_out_of_the_cache(self):
+        self.user.set_password('pw-123456')
+        self.user.save()
+        InvestorProfile.objects.filter(pk=self.profile.pk).update(mfa_secret='JBSWY3DPEHPK3PXP', backup_codes=['hash'])
+        self.auth.authenticate_credentials(self.token.key)
+
+        cached = repr(cache.get(f'authuser:{self.user.pk}'))
+        for secret in (self.user.password, 'JBSWY3DPEHPK3PXP', 'hash'):
+            self.assertNotIn(secret, cached)
+
+        user, _ = self.auth.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.profile.mfa_secret, 'JBSWY3DPEHPK3PXP')
+        # Saving the stand-in writes only loaded fields, never blanks over the rest
+        user.profile.phone_number = '555'
+        user.profile.save()
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.phone_number, self.profile.backup_codes), ('555', ['hash']))
+        self.assertTrue(user.check_password('pw-123456'))
+
+    def test_deactivation_and_profile_changes_invalidate(self):
+        self.auth.authenticate_credentials(self.token.key)
+        self.profile.mfa_enabled = True
+        self.profile.save()
+        user, _ = self.auth.authenticate_credentials(self.token.key)
+        self.assertTrue(user.profile.mfa_enabled)
+
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_logout_revokes_cached_token(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(client.get('/api/documents/').status_code, 200)
+        self.assertEqual(client.post('/api/auth/logout/').status_code, 200)
+        self.assertEqual(client.get('/api/documents/').status_code, 401)
+        self.assertTrue(AuditLog.objects.filter(user=self.user, action='LOGOUT').exists())
+
+
+class SignedTokenTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='investor', email='investor@example.com', password='pw-123456')
+        InvestorProfile.objects.create(user=self.user)
+        self.auth = CachedTokenAuthentication()
+
+    def _login(self, device):
+        response = APIClient().post('/api/auth/login/', {'username': 'investor', 'password': 'pw-123456', 'device': device})
+        self.assertEqual(response.status_code, 200)
+        return response.data['token']
+
+    def _status(self, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        return client.get('/api/documents/').status_code
+
+    def test_warm_requests_skip_the_database(self):
+        token, row = issue_token(self.user, 'laptop')
+        with self.assertNumQueries(1):
+            self.auth.authenticate_credentials(token)
+        with self.assertNumQueries(0):
+            user, auth = self.auth.authenticate_credentials(token)
+            self.assertIsNotNone(user.profile)
+        self.assertEqual(str(auth.pk), str(row.pk))
+
+    def test_login_rotates_only_the_same_device(self):
+        phone = self._login('phone')
+        laptop = self._login('laptop')
+        rotated = self._login('phone')
+        self.assertEqual(self._status(phone), 401)
+        self.assertEqual(self._status(laptop), 200)
+        self.assertEqual(self._status(rotated), 200)
+        self.assertEqual(AuthToken.objects.filter(user=self.user, revoked_at__isnull=True).count(), 2)
+
+    def test_revocation_survives_cache_loss(self):
+        token = self._login('phone')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        self.assertEqual(client.post('/api/auth/logout/').status_code, 200)
+        self.assertEqual(self._status(token), 401)
+        cache.clear()
+        self.assertEqual(self._status(token), 401)
+
+    def test_expired_and_tampered_tokens_are_rejected(self):
+        token, row = issue_token(self.user)
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(token[:-1] + ('A' if token[-1] != 'A' else 'B'))
+        with mock.patch('investors.authentication.time.time', return_value=row.expires_at.timestamp() + 1):
+            with self.assertRaises(AuthenticationFailed):
+                self.auth.authenticate_credentials(token)
+
+
+class MFAVerificationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='investor', email='investor@example.com', password='pw-123456')
+        self.profile = InvestorProfile.objects.create(user=self.user, mfa_secret=pyotp.random_base32())
+        self.totp = pyotp.TOTP(self.profile.mfa_secret)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # Pin the clock mid-step so codes can't roll over during a test
+        self.now = 1_800_000_005
+        self.enterContext(mock.patch('investors.mfa.time.time', return_value=self.now))
+
+    def _code(self, steps_ahead=0):
+        return self.totp.at(self.now + steps_ahead * mfa.STEP)
+
+    def _login(self, code):
+        return APIClient().post('/api/auth/login/', {'username': 'investor', 'password': 'pw-123456', 'mfa_code': code})
+
+    def _enable(self):
+        response = self.client.post('/api/investors/mfa/verify/', {'code': self._code()})
+        self.assertEqual(response.status_code, 200)
+        return response.data['backup_codes']
+
+    def test_totp_code_cannot_be_replayed(self):
+        self._enable()
+        # The code that enabled MFA is already spent
+        self.assertEqual(self._login(self._code()).status_code, 400)
+        next_code = self._code(1)
+        self.assertEqual(self._login(next_code).status_code, 200)
+        self.assertEqual(self._login(next_code).status_code, 400)
+
+    def test_backup_codes_are_hashed_and_single_use(self):
+        codes = self._enable()
+        self.profile.refresh_from_db()
+        self.assertEqual(len(self.profile.backup_codes), len(codes))
+        self.assertNotIn(codes[0], self.profile.backup_codes)
+        self.assertEqual(self._login(codes[0].upper()).status_code, 200)
+        self.assertEqual(self._login(codes[0]).status_code, 400)
+
+    def test_failed_attempts_are_throttled(self):
+        self._enable()
+        wrong = next(c for c in ('000000', '111111', '222222', '333333') if mfa.match_totp_step(self.profile.mfa_secret, c) is None)
+        for _ in range(settings.MFA_USER_BURST):
+            self.assertEqual(self._login(wrong).status_code, 400)
+        response = self._login(self._code(1))
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+class MFAQRCodeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='investor', email='investor@example.com')
+        InvestorProfile.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_setup_renders_no_qr_unless_asked(self):
+        with mock.patch('investors.views.render_qr') as render_qr:
+            response = self.client.post('/api/investors/mfa/setup/')
+        self.assertEqual(response.status_code, 200)
+        render_qr.assert_not_called()
+        self.assertNotIn('qr_code', response.data)
+        self.assertTrue(response.data['qr_url'].endswith('/api/investors/mfa/qr/'))
+
+        response = self.client.post('/api/investors/mfa/setup/', {'inline_qr': 'true'})
+        self.assertTrue(response.data['qr_code'].startswith('data:image/png;base64,'))
+        response = self.client.post('/api/investors/mfa/setup/', {'qr_format': 'svg'})
+        self.assertTrue(response.data['qr_code'].startswith('data:image/svg+xml;base64,'))
+
+    def test_qr_endpoint_serves_cacheable_images(self):
+        self.client.post('/api/investors/mfa/setup/')
+        response = self.client.get('/api/investors/mfa/qr/?format=svg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertTrue(response.content.startswith(b'<svg'))
+        self.assertTrue(response['Cache-Control'].startswith('private'))
+
+        cached = self.client.get('/api/investors/mfa/qr/?format=svg', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+        png = self.client.get('/api/investors/mfa/qr/?format=png')
+        self.assertTrue(png.content.startswith(b'\x89PNG'))
+        self.assertNotEqual(png['ETag'], response['ETag'])
+
+    def test_qr_endpoint_requires_pending_setup(self):
+        self.assertEqual(self.client.get('/api/investors/mfa/qr/').status_code, 404)
+
+
+class DocumentBlobTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='investor', email='investor@example.com')
+        InvestorProfile.objects.create(user=user)
+        self.s3 = mock.Mock()
+        self.s3.delete_objects.return_value = {}
+        self.s3.generate_presigned_url.return_value = 'https://s3.example.com/signed'
+        self.enterContext(override_s3_client(self.s3))
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def _upload(self, name, content):
+        upload = SimpleUploadedFile(f'{name}.pdf', content, content_type='application/pdf')
+        response = self.client.post('/api/documents/', {'name': name, 'doc_type': 'statement', 'file': upload})
+        self.assertEqual(response.status_code, 201)
+        return Document.objects.get(name=name, version=Document.objects.filter(name=name).count())
+
+    def test_identical_uploads_share_one_object(self):
+        content = b'%PDF-1.4 quarterly statement'
+        first = self._upload('q1', content)
+        second = self._upload('q1-copy', content)
+        self._upload('q2', b'%PDF-1.4 something else')
+
+        digest = hashlib.sha256(content).hexdigest()
+        self.assertEqual(self.s3.upload_fileobj.call_count, 2)
+        self.assertEqual(first.blob_id, second.blob_id)
+        blob = DocumentBlob.objects.get(sha256=digest)
+        self.assertEqual((blob.s3_key, blob.ref_count, blob.size), (f'blobs/sha256/{digest}', 2, len(content)))
+        self.assertEqual(first.file.name, blob.s3_key)
+
+        response = self.client.get(f'/api/documents/{second.id}/download/?disposition=attachment')
+        self.assertEqual(response.data['sha256'], digest)
+
+    def test_gc_removes_unreferenced_blobs(self):
+        kept = self._upload('kept', b'kept')
+        dropped = self._upload('dropped', b'dropped')
+        self.assertEqual(self.client.delete(f'/api/documents/{dropped.id}/').status_code, 204)
+        self.assertEqual(DocumentBlob.objects.get(pk=dropped.blob_id).ref_count, 0)
+
+        call_command('gc_document_blobs', '--grace-hours=0', stdout=StringIO())
+        self.assertEqual(list(DocumentBlob.objects.values_list('pk', flat=True)), [kept.blob_id])
+        deleted = self.s3.delete_objects.call_args.kwargs['Delete']['Objects']
+        self.assertEqual(deleted, [{'Key': dropped.file.name}])
+
+    def test_gc_deletes_objects_before_rows(self):
+        dropped = self._upload('dropped', b'dropped')
+        stuck = self._upload('stuck', b'stuck')
+        Document.objects.all().delete()
+
+        def delete_objects(Bucket, Delete, **kwargs):
+            # Rows are still there (and locked) while their objects go
+            keys = [item['Key'] for item in Delete['Objects']]
+            self.assertEqual(DocumentBlob.objects.filter(s3_key__in=keys).count(), 2)
+            return {'Errors': [{'Key': stuck.file.name}]}
+
+        self.s3.delete_objects.side_effect = delete_objects
+        stderr = StringIO()
+        call_command('gc_document_blobs', '--grace-hours=0', stdout=StringIO(), stderr=stderr)
+        self.assertEqual(list(DocumentBlob.objects.values_list('pk', flat=True)), [stuck.blob_id])
+        self.assertIn(stuck.file.name, stderr.getvalue())
+
+        # Content the collector removed is uploaded again rather than pointed at a deleted object
+        again = self._upload('again', b'dropped')
+        self.assertNotEqual(again.blob_id, dropped.blob_id)
+        self.assertEqual(self.s3.upload_fileobj.call_count, 3)
+
+    def test_recount_repairs_drift(self):
+        document = self._upload('statement', b'statement')
+        DocumentBlob.objects.update(ref_count=0)
+        call_command('gc_document_blobs', '--grace-hours=0', '--recount', stdout=StringIO())
+        self.assertEqual(DocumentBlob.objects.get(pk=document.blob_id).ref_count, 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', "needs PostgreSQL row locks")
+class DocumentBlobCollectionRaceTests(TransactionTestCase):
+    def _store(self, content):
+        try:
+            uploads.store_blob(SimpleUploadedFile('s.pdf', content, content_type='application/pdf'))
+        finally:
+            connection.close()
+
+    def test_upload_during_collection_uploads_again(self):
+        content = b'%PDF-1.4 recycled'
+        digest = hashlib.sha256(content).hexdigest()
+        collected = DocumentBlob.objects.create(sha256=digest, s3_key=storage.blob_key(digest),
+                                                size=len(content), content_type='application/pdf')
+        DocumentBlob.objects.filter(pk=collected.pk).update(updated_at=timezone.now() - datetime.timedelta(days=1))
+
+        events = []
+        uploader = threading.Thread(target=self._store, args=(content,))
+
+        def delete_objects(**kwargs):
+            # The same content is uploaded again while the collector is deleting its object
+            uploader.start()
+            uploader.join(timeout=1)
+            events.append(('uploader waiting', uploader.is_alive()))
+            events.append('deleted')
+            return {}
+
+        s3 = mock.Mock()
+        s3.delete_objects.side_effect = delete_objects
+        s3.upload_fileobj.side_effect = lambda *args, **kwargs: events.append('uploaded')
+        with override_s3_client(s3):
+            call_command('gc_document_blobs', '--grace-hours=0', stdout=StringIO())
+            uploader.join()
+
+        self.assertEqual(events, [('uploader waiting', True), 'deleted', 'uploaded'])
+        self.assertNotEqual(DocumentBlob.objects.get(sha256=digest).pk, collected.pk)
+
+
+class BatchUploadTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='investor', email='investor@example.com')
+        self.profile = InvestorProfile.objects.create(user=user)
+        self.s3 = mock.Mock()
+        self.enterContext(override_s3_client(self.s3))
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def _post(self, files, metadata=None):
+        data = {'files': [SimpleUploadedFile(name, content, content_type='application/pdf') for name, content in files]}
+        if metadata is not None:
+            data['metadata'] = json.dumps(metadata)
+        return self.client.post('/api/documents/batch/', data, format='multipart')
+
+    def test_versions_chain_within_one_batch(self):
+        DocumentLineage.record_version(self.profile, 'statement', 'statement', 'documents/old.pdf')
+        response = self._post(
+            [('a.pdf', b'one'), ('b.pdf', b'two'), ('c.pdf', b'one')],
+            [{'name': 'statement', 'doc_type': 'statement'}, {'name': 'statement', 'doc_type': 'statement'},
+             {'name': 'id card', 'doc_type': 'id'}],
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([r['version'] for r in response.data['results']], [2, 3, 1])
+        # Duplicate content within the batch is uploaded once
+        self.assertEqual(self.s3.upload_fileobj.call_count, 2)
+
+        lineage = DocumentLineage.objects.get(name='statement')
+        self.assertEqual((lineage.latest_version, lineage.version_count, lineage.head_id),
+                         (3, 3, response.data['results'][1]['id']))
+        third = Document.objects.get(pk=response.data['results'][1]['id'])
+        self.assertEqual(third.previous_version_id, response.data['results'][0]['id'])
+        self.assertEqual(DocumentBlob.objects.get(sha256=hashlib.sha256(b'one').hexdigest()).ref_count, 2)
+        self.assertEqual(AuditLog.objects.filter(action='UPLOAD').count(), 3)
+
+    def test_partial_failure_reports_each_file(self):
+        failing = hashlib.sha256(b'broken').hexdigest()
+
+        def upload(fileobj, bucket, key, **kwargs):
+            if key.endswith(failing):
+                raise RuntimeError('S3 unavailable')
+
+        self.s3.upload_fileobj.side_effect = upload
+        response = self._post(
+            [('ok.pdf', b'fine'), ('bad-type.pdf', b'x'), ('broken.pdf', b'broken')],
+            [{}, {'doc_type': 'nonsense'}, {}],
+        )
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'failed', 'failed'])
+        self.assertIn('doc_type', response.data['results'][1]['error'])
+        self.assertEqual(response.data['results'][0]['name'], 'ok')
+        self.assertEqual(Document.objects.count(), 1)
+        self.assertFalse(DocumentBlob.objects.filter(sha256=failing).exists())
+
+
+class BulkProvisioningTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', email='admin@example.com', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_bulk_endpoint_reports_each_failure(self):
+        response = self.client.post('/api/investors/bulk/', {'investors': [
+            {'username': 'alice', 'email': 'alice@example.com', 'phone_number': '555-0100'},
+            {'username': 'bob', 'email': 'not-an-email'},
+            {'username': 'carol'},
+            {'username': 'alice', 'email': 'alice2@example.com'},
+            {'username': 'admin', 'email': 'other@example.com'},
+            'garbage',
+        ]}, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual((response.data['processed'], response.data['created'], response.data['failed']), (6, 1, 5))
+        self.assertEqual([error['line'] for error in response.data['errors']], [2, 3, 4, 6, 5])
+
+        alice = User.objects.get(username='alice')
+        self.assertEqual(alice.profile.phone_number, '555-0100')
+        self.assertFalse(alice.has_usable_password())
+        self.assertTrue(AuditLog.objects.filter(user=self.admin, action='CREATE_USER', details__contains="'alice'").exists())
+
+    def test_requests_share_one_hashing_pool(self):
+        pool = mock.Mock()
+        pool.map.side_effect = lambda func, items, chunksize: map(func, items)
+        self.enterContext(mock.patch('investors.provisioning._api_pool', None))
+        with mock.patch('investors.provisioning.hash_pool', return_value=pool) as hash_pool:
+            for username in ('erin', 'frank'):
+                response = self.client.post('/api/investors/bulk/', {'investors': [
+                    {'username': username, 'email': f'{username}@example.com', 'password': 's3cret-pass'},
+                ]}, format='json')
+                self.assertEqual(response.status_code, 201)
+        hash_pool.assert_called_once_with(settings.PROVISIONING_API_HASH_WORKERS)
+        self.assertEqual(pool.map.call_count, 2)
+        pool.shutdown.assert_not_called()
+        self.assertTrue(User.objects.get(username='frank').check_password('s3cret-pass'))
+
+    def test_import_command_streams_csv_with_hashing_pool(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write('username,email,password\n')
+            handle.write('dave,dave@example.com,s3cret-pass\n')
+            for i in range(5):
+                handle.write(f'user{i},user{i}@example.com,\n')
+        self.addCleanup(os.unlink, handle.name)
+
+        out = StringIO()
+        call_command('import_investors', handle.name, '--workers=1', '--chunk-size=2', stdout=out, stderr=StringIO())
+        self.assertIn('Created 6 of 6 investors', out.getvalue())
+        self.assertEqual(InvestorProfile.objects.count(), 6)
+        self.assertTrue(User.objects.get(username='dave').check_password('s3cret-pass'))
+
+
+@override_settings(ROOT_URLCONF='investors.tests')
+class AsyncDocumentViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='investor', email='investor@example.com')
+        InvestorProfile.objects.create(user=self.user)
+        self.s3 = mock.Mock()
+        self.s3.generate_presigned_url.return_value = 'https://s3.example.com/signed'
+        self.s3.generate_presigned_post.return_value = {'url': 'https://bucket.s3.amazonaws.com/', 'fields': {}}
+        self.enterContext(override_s3_client(self.s3))
+        signed, _ = issue_token(self.user)
+        self.client = APIClient(HTTP_AUTHORIZATION=f'Token {signed}')
+
+    def _upload(self, content):
+        upload = SimpleUploadedFile('statement.pdf', content, content_type='application/pdf')
+        return self.client.post('/api/documents/', {'name': 'statement', 'doc_type': 'statement', 'file': upload})
+
+    def test_upload_download_and_history(self):
+        self.assertIs(resolve('/api/documents/1/download/').func, async_views.download)
+        first = self._upload(b'%PDF-1.4 v1')
+        second = self._upload(b'%PDF-1.4 v2')
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        self.assertEqual((second.json()['version'], second.json()['previous_version']), (2, first.json()['id']))
+        self.assertEqual(self.s3.upload_fileobj.call_count, 2)
+
+        document_id = second.json()['id']
+        download = self.client.get(f'/api/documents/{document_id}/download/?disposition=attachment')
+        self.assertEqual(download.json(), {
+            'url': 'https://s3.example.com/signed', 'sha256': hashlib.sha256(b'%PDF-1.4 v2').hexdigest(),
+        })
+
+        history = self.client.get(f'/api/documents/{document_id}/history/?page_size=1')
+        self.assertEqual(history.status_code, 200)
+        self.assertEqual(history.json()['total_versions'], 2)
+        self.assertEqual([v['version'] for v in history.json()['versions']], [2])
+        self.assertIsNotNone(history.json()['next'])
+
+        # Listing is still served by the sync viewset
+        self.assertEqual([d['id'] for d in self.client.get('/api/documents/').json()['results']], [document_id])
+        self.assertEqual(AuditLog.objects.filter(action='UPLOAD').count(), 2)
+        self.assertEqual(AuditLog.objects.filter(action='VIEW_HISTORY').count(), 1)
+
+    def test_finalize_creates_version_once(self):
+        data = self.client.post('/api/documents/upload-url/', {
+            'name': 'subscription', 'doc_type': 'agreement', 'content_type': 'application/pdf', 'size': 2048,
+        }, format='json').json()
+        self.s3.head_object.return_value = {'ContentLength': 1024, 'ContentType': 'application/pdf'}
+
+        first = self.client.post(f"/api/documents/{data['upload_id']}/finalize/")
+        again = self.client.post(f"/api/documents/{data['upload_id']}/finalize/")
+        self.assertEqual((first.status_code, again.status_code), (201, 200))
+        self.assertEqual(first.json()['id'], again.json()['id'])
+        self.assertEqual(AuditLog.objects.filter(action='UPLOAD').count(), 1)
+
+    def test_errors_match_drf(self):
+        anonymous = APIClient().get('/api/documents/1/download/')
+        self.assertEqual(anonymous.status_code, 401)
+        self.assertEqual(anonymous['WWW-Authenticate'], 'Token')
+        self.assertEqual(self.client.get('/api/documents/999/history/').status_code, 404)
+        self.assertEqual(self.client.delete('/api/documents/1/download/').status_code, 405)
+        self.assertEqual(self.client.post('/api/documents/', {'name': 'statement'}).status_code, 400)
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='investor', email='investor@example.com')
+        InvestorProfile.objects.create(user=user)
+        self.s3 = mock.Mock()
+        self.s3.delete_objects.return_value = {}
+        self.s3.generate_presigned_post.return_value = {'url': 'https://bucket.s3.amazonaws.com/', 'fields': {}}
+        self.enterContext(override_s3_client(self.s3))
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def _upload(self, content):
+        upload = SimpleUploadedFile('statement.pdf', content, content_type='application/pdf')
+        response = self.client.post('/api/documents/', {'name': 'statement', 'doc_type': 'statement', 'file': upload})
+        self.assertEqual(response.status_code, 201)
+
+    def test_upload_is_verified_by_worker(self):
+        self._upload(b'%PDF-1.4 statement')
+        self.s3.head_object.assert_not_called()
+        job = Job.objects.get()
+        self.assertEqual(job.task, 'verify_blob')
+
+        blob = DocumentBlob.objects.get()
+        self.s3.head_object.return_value = {'ContentLength': blob.size, 'Metadata': {'sha256': blob.sha256}}
+        call_command('run_worker', '--once', stdout=StringIO())
+        blob.refresh_from_db()
+        self.assertIsNotNone(blob.verified_at)
+        self.assertFalse(Job.objects.exists())
+
+    def test_failures_back_off_then_fail(self):
+        jobs.enqueue('no_such_task', value=1)
+        with self.assertLogs('investors.jobs', 'WARNING'):
+            self.assertEqual(jobs.run_pending(), 1)
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertIn('no_such_task', job.last_error)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertEqual(jobs.run_pending(), 0)
+
+        # A job left running by a dead worker is reclaimed once its lock is stale
+        Job.objects.update(status=Job.RUNNING, locked_at=timezone.now() - datetime.timedelta(hours=1),
+                           attempts=job.max_attempts - 1)
+        with self.assertLogs('investors.jobs', 'ERROR'):
+            self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+
+    def test_direct_upload_is_hashed_into_existing_blob(self):
+        content = b'%PDF-1.4 agreement'
+        self._upload(content)
+        Job.objects.all().delete()
+        blob = DocumentBlob.objects.get()
+
+        data = self.client.post('/api/documents/upload-url/', {
+            'name': 'agreement', 'doc_type': 'agreement', 'content_type': 'application/pdf', 'size': 2048,
+        }, format='json').data
+        self.s3.head_object.return_value = {'ContentLength': len(content), 'ContentType': 'application/pdf'}
+        self.assertEqual(self.client.post(f"/api/documents/{data['upload_id']}/finalize/").status_code, 201)
+
+        body = mock.Mock()
+        body.iter_chunks.return_value = [content[:5], content[5:]]
+        self.s3.get_object.return_value = {'Body': body, 'ContentType': 'application/pdf'}
+        self.assertEqual(jobs.run_pending(), 1)
+
+        document = Document.objects.get(name='agreement')
+        self.assertEqual((document.blob_id, document.file.name), (blob.pk, blob.s3_key))
+        self.assertEqual(DocumentBlob.objects.get().ref_count, 2)
+        deleted = self.s3.delete_objects.call_args.kwargs['Delete']['Objects']
+        self.assertEqual(deleted, [{'Key': data['key']}])
+
+
+class DocumentArchiveTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='admin', email='admin@example.com', is_staff=True)
+        user = User.objects.create(username='investor', email='investor@example.com')
+        other = User.objects.create(username='other', email='other@example.com')
+        self.profile = InvestorProfile.objects.create(user=user)
+        other_profile = InvestorProfile.objects.create(user=other)
+        DocumentLineage.record_version(self.profile, 'statement', 'statement', 'documents/s1.pdf')
+        DocumentLineage.record_version(self.profile, 'statement', 'statement', 'documents/s2.pdf')
+        DocumentLineage.record_version(self.profile, 'passport', 'id', 'documents/passport.png')
+        DocumentLineage.record_version(other_profile, 'statement', 'statement', 'documents/other.pdf')
+
+        self.s3 = mock.Mock()
+        self.s3.get_object.side_effect = self._get_object
+        self.enterContext(override_s3_client(self.s3))
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _get_object(self, Bucket, Key):
+        if Key == 'documents/missing.pdf':
+            raise RuntimeError('NoSuchKey')
+        body = mock.Mock()
+        content = f'contents of {Key}'.encode()
+        body.iter_chunks.return_value = [content[:4], content[4:]]
+        return {'Body': body}
+
+    def _archive(self, query):
+        response = self.client.get(f'/api/documents/archive/?{query}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response['Content-Type'], response['Accept-Ranges']), ('application/zip', 'none'))
+        return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_archive_of_latest_versions(self):
+        archive = self._archive(f'investor={self.profile.pk}')
+        self.assertEqual(sorted(archive.namelist()), ['investor/id/passport v1.png', 'investor/statement/statement v2.pdf'])
+        self.assertEqual(archive.read('investor/statement/statement v2.pdf'), b'contents of documents/s2.pdf')
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(AuditLog.objects.filter(action='DOWNLOAD').count(), 2)
+        self.assertEqual(AuditLog.objects.get(action='ARCHIVE').details, 'Downloaded an archive of 2 documents')
+
+    def test_all_versions_and_doc_type(self):
+        archive = self._archive(f'investor={self.profile.pk}&doc_type=statement&all_versions=1')
+        self.assertEqual(sorted(archive.namelist()),
+                         ['investor/statement/statement v1.pdf', 'investor/statement/statement v2.pdf'])
+
+    def test_unreadable_documents_are_reported(self):
+        DocumentLineage.record_version(self.profile, 'lost', 'other', 'documents/missing.pdf')
+        archive = self._archive(f'investor={self.profile.pk}')
+        self.assertEqual(len(archive.namelist()), 3)
+        self.assertIn('investor/other/lost v1.pdf: NoSuchKey', archive.read('ERRORS.txt').decode())
+
+    def test_investors_only_archive_their_own_documents(self):
+        self.client.force_authenticate(User.objects.get(username='other'))
+        self.assertEqual(self._archive('').namelist(), ['other/statement/statement v1.pdf'])
+
+    async def test_asgi_streams_without_buffering(self):
+        signed, _ = await sync_to_async(issue_token)(self.admin)
+        response = await AsyncClient().get(f'/api/documents/archive/?investor={self.profile.pk}',
+                                           headers={'Authorization': f'Token {signed}'})
+        self.assertEqual(response.status_code, 200)
+        # Django would read a sync iterator into one list before sending anything
+        self.assertTrue(response.is_async)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join([chunk async for chunk in response.streaming_content])))
+        self.assertEqual(archive.read('investor/id/passport v1.png'), b'contents of documents/passport.png')
+
+
+class FakeS3Body(io.BytesIO):
+    def iter_chunks(self, chunk_size=1024):
+        return iter(lambda: self.read(chunk_size), b'')
+
+
+def s3_error(status, **headers):
+    return ClientError({'Error': {'Code': str(status), 'Message': ''},
+                        'ResponseMetadata': {'HTTPStatusCode': status, 'HTTPHeaders': headers}}, 'GetObject')
+
+
+@override_settings(DOCUMENT_STREAM_CHUNK_SIZE=4)
+class StreamedDownloadTests(TestCase):
+    content = b'%PDF-1.4 twelve'
+
+    def setUp(self):
+        user = User.objects.create(username='investor', email='investor@example.com')
+        profile = InvestorProfile.objects.create(user=user)
+        self.document = DocumentLineage.record_version(profile, 'statement', 'statement', 'documents/s.pdf')
+        self.s3 = mock.Mock()
+        self.s3.get_object.side_effect = self._get_object
+        self.enterContext(override_s3_client(self.s3))
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.url = f'/api/documents/{self.document.id}/download/?mode=stream'
+
+    def _get_object(self, **params):
+        content, extra = self.content, {}
+        if 'Range' in params:
+            start, end = params['Range'][len('bytes='):].split('-')
+            content = self.content[int(start):int(end) + 1]
+            extra['ContentRange'] = f'bytes {start}-{end}/{len(self.content)}'
+        return {'Body': FakeS3Body(content), 'ContentLength': len(content), 'ContentType': 'application/pdf',
+                'ETag': '"v1"', 'LastModified': datetime.datetime(2026, 1, 2, tzinfo=datetime.timezone.utc), **extra}
+
+    def test_streams_whole_file_in_chunks(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='application/pdf')
+        self.assertEqual(response.status_code, 200)
+        chunks = list(response.streaming_content)
+        self.assertEqual(b''.join(chunks), self.content)
+        self.assertEqual(max(len(chunk) for chunk in chunks), 4)
+        self.assertEqual(response['ETag'], '"v1"')
+        self.assertEqual(response['Last-Modified'], 'Fri, 02 Jan 2026 00:00:00 GMT')
+        self.assertEqual(response['Content-Disposition'], 'inline; filename="s.pdf"')
+        self.assertEqual((response['Accept-Ranges'], response['Content-Length']), ('bytes', str(len(self.content))))
+
+    def test_range_is_passed_to_s3(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=4-7', HTTP_IF_RANGE='"v1"')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'-1.4')
+        self.assertEqual(response['Content-Range'], f'bytes 4-7/{len(self.content)}')
+        self.assertEqual(self.s3.get_object.call_args.kwargs['IfMatch'], '"v1"')
+
+    def test_stale_if_range_sends_whole_file(self):
+        self.s3.get_object.side_effect = [s3_error(412), self._get_object()]
+        response = self.client.get(self.url, HTTP_RANGE='bytes=4-7', HTTP_IF_RANGE='"v0"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertNotIn('Range', self.s3.get_object.call_args.kwargs)
+
+    def test_not_modified(self):
+        self.s3.get_object.side_effect = s3_error(304, etag='"v1"')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"v1"', HTTP_IF_MODIFIED_SINCE='Fri, 02 Jan 2026 00:00:00 GMT')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], '"v1"')
+        params = self.s3.get_object.call_args.kwargs
+        self.assertEqual(params['IfNoneMatch'], '"v1"')
+        self.assertNotIn('IfModifiedSince', params)
+
+    def test_unknown_mode(self):
+        self.assertEqual(self.client.get(self.url.replace('stream', 'carrier-pigeon')).status_code, 400)
+
+    @override_settings(ROOT_URLCONF='investors.tests')
+    async def test_async_view_streams_range(self):
+        signed, _ = await sync_to_async(issue_token)(await User.objects.aget(username='investor'))
+        response = await AsyncClient().get(self.url, headers={'Authorization': f'Token {signed}', 'Range': 'bytes=0-3'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), b'%PDF')
+
+    async def test_sync_view_under_asgi_streams_chunks(self):
+        signed, _ = await sync_to_async(issue_token)(await User.objects.aget(username='investor'))
+        response = await AsyncClient().get(self.url, headers={'Authorization': f'Token {signed}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual((b''.join(chunks), max(len(chunk) for chunk in chunks)), (self.content, 4))
+
+
+@override_settings(CONDITIONAL_LIST_RESPONSES=True)
+class ConditionalListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='investor', email='investor@example.com')
+        self.profile = InvestorProfile.objects.create(user=self.user)
+        DocumentLineage.record_version(self.profile, 'statement', 'statement', 'documents/s1.pdf')
+        signed, _ = issue_token(self.user)
+        self.client = APIClient(HTTP_AUTHORIZATION=f'Token {signed}')
+        # The clock only moves when a test advances it
+        self.now = time.time()
+        self.enterContext(mock.patch('investors.changes.time.time', side_effect=lambda: self.now))
+
+    def _poll(self, url, status, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, status)
+        return response
+
+    def test_unchanged_documents_cost_no_queries(self):
+        self.now += 5
+        first = self._poll('/api/documents/latest/', 200)
+        with self.assertNumQueries(0):
+            self._poll('/api/documents/latest/', 304, HTTP_IF_NONE_MATCH=first['ETag'])
+        with self.assertNumQueries(0):
+            self._poll('/api/documents/latest/', 304, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        # Another page or representation has its own ETag
+        self._poll('/api/documents/latest/?page_size=1', 200, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        DocumentLineage.record_version(self.profile, 'statement', 'statement', 'documents/s2.pdf')
+        self.now += 5
+        changed = self._poll('/api/documents/latest/', 200, HTTP_IF_NONE_MATCH=first['ETag'],
+                             HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+        self.assertEqual(changed.data['results'][0]['version'], 2)
+
+    def test_last_modified_waits_for_its_second_to_pass(self):
+        cache.clear()
+        self.assertFalse(self._poll('/api/documents/', 200).has_header('Last-Modified'))
+        self.now += 1
+        self.assertTrue(self._poll('/api/documents/', 200).has_header('Last-Modified'))
+
+    def test_scopes_are_per_investor_and_bulk_writes_bump_them(self):
+        other = InvestorProfile.objects.create(user=User.objects.create(username='other', email='other@example.com'))
+        first = self._poll('/api/documents/', 200)
+        DocumentLineage.record_version(other, 'statement', 'statement', 'documents/other.pdf')
+        self._poll('/api/documents/', 304, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        DocumentLineage.record_versions(self.profile, [('passport', 'id', DocumentBlob.objects.create(
+            sha256='a' * 64, s3_key='blobs/sha256/a', size=1, content_type='image/png'))])
+        self._poll('/api/documents/', 200, HTTP_IF_NONE_MATCH=first['ETag'])
+
+    def test_versions_expire(self):
+        with mock.patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+            DocumentLineage.record_version(self.profile, 'statement', 'statement', 'documents/s2.pdf')
+        self.assertEqual(set_many.call_args.kwargs['timeout'], settings.CHANGE_VERSION_TTL)
+
+    @override_settings(CONDITIONAL_LIST_RESPONSES=False)
+    def test_off_without_a_shared_cache(self):
+        first = self._poll('/api/documents/', 200)
+        self.assertFalse(first.has_header('ETag'))
+        self._poll('/api/documents/', 200, HTTP_IF_NONE_MATCH='"anything"')
+
+    def test_expanded_documents_follow_investor_changes(self):
+        first = self._poll('/api/documents/?expand=investor', 200)
+        self.profile.mfa_enabled = True
+        self.profile.save()
+        second = self._poll('/api/documents/?expand=investor', 200, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.user.email = 'new@example.com'
+        self.user.save()
+        self._poll('/api/documents/?expand=investor', 200, HTTP_IF_NONE_MATCH=second['ETag'])
+
+    def test_investor_list(self):
+        admin = User.objects.create(username='admin', email='admin@example.com', is_staff=True)
+        signed, _ = issue_token(admin)
+        self.client = APIClient(HTTP_AUTHORIZATION=f'Token {signed}')
+        first = self._poll('/api/investors/', 200)
+        with self.assertNumQueries(0):
+            self._poll('/api/investors/', 304, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        # A login only touches last_login, which the list doesn't show
+        admin.last_login = timezone.now()
+        admin.save(update_fields=['last_login'])
+        self._poll('/api/investors/', 304, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        provision_investors([(1, {'username': 'new', 'email': 'new@example.com', 'password': ''})])
+        self._poll('/api/investors/', 200, HTTP_IF_NONE_MATCH=first['ETag'])
@@ -0,0 +1,26 @@
+"""Upload handlers."""
+import hashlib
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class HashingTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Spool uploads to disk like TemporaryFileUploadHandler, hashing them on the way.
+
+    The SHA-256 of each file is computed from the chunks as the request body
+    streams in and exposed as ``uploaded_file.sha256``, so content addressing
+    needs no second pass over the file.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self.hasher.hexdigest()
+        return uploaded
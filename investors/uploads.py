@@ -0,0 +1,87 @@
+"""Store uploaded files as content-addressed blobs, one at a time or as a concurrent batch."""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from . import async_storage
+from .jobs import enqueue, enqueue_many
+from .models import DocumentBlob
+from .storage import blob_key, file_sha256, upload_document
+
+
+def _content_type(file_obj):
+    return file_obj.content_type or 'application/pdf'
+
+
+def store_blob(file_obj):
+    """Return the DocumentBlob for ``file_obj``, uploading it to S3 only if its content is new."""
+    sha256 = file_sha256(file_obj)
+    blob = DocumentBlob.touch(sha256)
+    if blob is None:
+        s3_key = blob_key(sha256)
+        # Stream to S3 in parts straight from the spooled upload, never reading it into memory
+        upload_document(file_obj, s3_key, content_type=_content_type(file_obj), sha256=sha256)
+        blob = DocumentBlob.register(sha256, s3_key, file_obj.size, _content_type(file_obj))
+        # The object is checked against size and checksum by a worker, off the request path
+        enqueue('verify_blob', blob_id=blob.pk)
+    return blob
+
+
+async def astore_blob(file_obj):
+    """Async ``store_blob``: lookups use the async ORM and S3 work runs off the event loop."""
+    sha256 = await async_storage.file_sha256(file_obj)
+    if await DocumentBlob.objects.filter(sha256=sha256).aupdate(updated_at=timezone.now()):
+        return await DocumentBlob.objects.aget(sha256=sha256)
+    s3_key = blob_key(sha256)
+    await async_storage.upload_document(file_obj, s3_key, content_type=_content_type(file_obj), sha256=sha256)
+    blob = await sync_to_async(DocumentBlob.register)(sha256, s3_key, file_obj.size, _content_type(file_obj))
+    await sync_to_async(enqueue)('verify_blob', blob_id=blob.pk)
+    return blob
+
+
+def store_blobs(files):
+    """Store many uploaded files; returns ``{index: DocumentBlob or Exception}`` for ``{index: file}``.
+
+    Each distinct new content is uploaded once, on a thread pool bounded by
+    DOCUMENT_BATCH_UPLOAD_WORKERS; known blobs are touched in a single update.
+    """
+    digests = {index: file_sha256(file_obj) for index, file_obj in files.items()}
+    distinct = set(digests.values())
+
+    # Touch first, as DocumentBlob.touch does: the update waits for a collector holding a row,
+    # and rows it removed in the meantime are no longer found by the select
+    DocumentBlob.objects.filter(sha256__in=distinct).update(updated_at=timezone.now())
+    blobs = {blob.sha256: blob for blob in DocumentBlob.objects.filter(sha256__in=distinct)}
+
+    missing = {}
+    for index, digest in digests.items():
+        if digest not in blobs:
+            missing.setdefault(digest, files[index])
+
+    errors = {}
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(settings.DOCUMENT_BATCH_UPLOAD_WORKERS, len(missing))) as pool:
+            futures = {
+                pool.submit(upload_document, file_obj, blob_key(digest),
+                            content_type=_content_type(file_obj), sha256=digest): digest
+                for digest, file_obj in missing.items()
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as exc:
+                    errors[futures[future]] = exc
+
+        uploaded = [digest for digest in missing if digest not in errors]
+        DocumentBlob.objects.bulk_create(
+            [DocumentBlob(sha256=digest, s3_key=blob_key(digest), size=missing[digest].size,
+                          content_type=_content_type(missing[digest])) for digest in uploaded],
+            ignore_conflicts=True,  # a concurrent upload of the same content may have registered it first
+        )
+        stored = list(DocumentBlob.objects.filter(sha256__in=uploaded))
+        blobs.update((blob.sha256, blob) for blob in stored)
+        enqueue_many('verify_blob', [{'blob_id': blob.pk} for blob in stored if blob.verified_at is None])
+
+    return {index: blobs.get(digest) or errors[digest] for index, digest in digests.items()}
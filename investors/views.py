@@ -1,61 +1,114 @@
 from django.db import models
-from rest_framework import viewsets, permissions, status
+from rest_framework import viewsets, permissions, serializers, status
 from rest_framework.response import Response
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.parsers import JSONParser, MultiPartParser
 from django.db.models import Max, Q
-from .models import InvestorProfile, Document, AuditLog
-from .serializers import InvestorProfileSerializer, DocumentSerializer, AuditLogSerializer
+from django.db import transaction
+from .models import InvestorProfile, Document, DocumentLineage, PendingUpload, AuditLog, AuthToken
+from .serializers import (
+    InvestorProfileSerializer, DocumentSerializer, AuditLogSerializer, BatchUploadItemSerializer,
+    UploadUrlRequestSerializer, requested_expansions
+)
+from .archives import archive_entries, archive_response
+from .audit import audit_log, audit_log_many
+from .authentication import issue_token, revoke_tokens
+from .changes import conditional_list, document_scope, investor_scope
+from .downloads import stream_download
+from .exports import export_response
+from .jobs import enqueue
+from .mfa import generate_backup_codes, provisioning_uri, verify_code
+from .qr import CONTENT_TYPES as QR_CONTENT_TYPES, render_qr
+from .renderers import CSVStreamRenderer, JSONLinesRenderer, PNGRenderer, SVGRenderer, ZipRenderer
+from .rows import FastListMixin
+from .provisioning import api_hash_pool, provision_investors, read_records, text_stream
+from .pagination import AuditLogCursorPagination, DocumentCursorPagination, paginated_envelope
+from .storage import get_s3_client, presign_cache_stats, presigned_download_url
+from .uploads import store_blob, store_blobs
+import datetime
+import json
+from itertools import islice
+import logging
 import os
 import pyotp
-import qrcode
-import io
 import base64
+import hashlib
+import mimetypes
+import uuid
 from django.http import HttpResponse
-from django.contrib.auth import authenticate, login
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.reverse import reverse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.contrib.auth import authenticate, login, logout
 from rest_framework.authtoken.models import Token
 from django.conf import settings
-import boto3
+from botocore.exceptions import ClientError
 
+logger = logging.getLogger(__name__)
+
+@method_decorator(conditional_list(investor_scope), name='list')
 class InvestorProfileViewSet(viewsets.ModelViewSet):
-    queryset = InvestorProfile.objects.all()
+    queryset = InvestorProfile.objects.select_related('user')
     serializer_class = InvestorProfileSerializer
     permission_classes = [permissions.IsAdminUser]  # Only admins can view/edit investors
 
     # Add these MFA methods to InvestorProfileViewSet
     @action(detail=False, methods=['post'], url_path='mfa/setup', permission_classes=[permissions.IsAuthenticated])
     def setup_mfa(self, request):
-        """Generate MFA secret and QR code"""
+        """Generate MFA secret; the QR code is fetched from mfa/qr, or inlined on request (inline_qr, qr_format)"""
         user_profile = request.user.profile
         
         if user_profile.mfa_enabled:
             return Response({"error": "MFA already enabled"}, status=400)
+
+        # Rendering stays off this request unless the client asks for an inline image (PNG, as before)
+        inline = str(request.data.get('inline_qr', '')).lower() in ('1', 'true')
+        qr_format = request.data.get('qr_format') or ('png' if inline else 'none')
+        if qr_format not in ('svg', 'png', 'none'):
+            return Response({"error": "qr_format must be svg, png or none"}, status=400)
         
         # Generate secret
         secret = pyotp.random_base32()
         user_profile.mfa_secret = secret
         user_profile.save()
         
-        # Generate QR code
-        totp_uri = pyotp.totp.TOTP(secret).provisioning_uri(
-            name=request.user.email,
-            issuer_name="SecureInvestor"
-        )
-        
-        # Create QR code image
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(totp_uri)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        qr_code = base64.b64encode(buffer.getvalue()).decode()
-        
-        return Response({
+        response = {
             "secret": secret,
-            "qr_code": f"data:image/png;base64,{qr_code}",
+            "qr_url": reverse('investorprofile-mfa-qr', request=request),
             "message": "Scan QR code with Google Authenticator"
-        })
+        }
+        if qr_format != 'none':
+            qr_code = base64.b64encode(render_qr(provisioning_uri(request.user, secret), qr_format)).decode()
+            response["qr_code"] = f"data:{QR_CONTENT_TYPES[qr_format]};base64,{qr_code}"
+        
+        return Response(response)
+
+    @action(detail=False, methods=['get'], url_path='mfa/qr', permission_classes=[permissions.IsAuthenticated],
+            renderer_classes=[SVGRenderer, PNGRenderer])
+    def mfa_qr(self, request):
+        """QR code for a pending MFA setup as SVG or PNG (?format=svg|png)"""
+        user_profile = request.user.profile
+
+        if user_profile.mfa_enabled or not user_profile.mfa_secret:
+            return Response({"error": "No MFA setup in progress"}, status=404)
+
+        fmt = request.accepted_renderer.format
+        uri = provisioning_uri(request.user, user_profile.mfa_secret)
+        etag = quote_etag(hashlib.sha256(f'{fmt}:{uri}'.encode()).hexdigest()[:32])
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponse(status=304)
+        else:
+            response = HttpResponse(render_qr(uri, fmt), content_type=QR_CONTENT_TYPES[fmt])
+        response['ETag'] = etag
+        # The image embeds the secret: never let shared caches keep it
+        response['Cache-Control'] = f'private, max-age={settings.MFA_QR_MAX_AGE}'
+        patch_vary_headers(response, ['Authorization', 'Cookie'])
+        return response
     
     @action(detail=False, methods=['post'], url_path='mfa/verify', permission_classes=[permissions.IsAuthenticated])
     def verify_mfa(self, request):
@@ -66,41 +119,42 @@ class InvestorProfileViewSet(viewsets.ModelViewSet):
         if not user_profile.mfa_secret:
             return Response({"error": "MFA not set up"}, status=400)
         
-        totp = pyotp.TOTP(user_profile.mfa_secret)
-        
-        if totp.verify(code):
+        if verify_code(user_profile, code, ip=request.META.get('REMOTE_ADDR')):
             user_profile.mfa_enabled = True
             user_profile.save()
+            backup_codes = generate_backup_codes(user_profile)
             
             # Audit log
-            AuditLog.objects.create(
+            audit_log(
                 user=request.user,
                 action="MFA_ENABLED",
                 details="Multi-factor authentication enabled"
             )
             
-            return Response({"message": "MFA enabled successfully"})
+            return Response({
+                "message": "MFA enabled successfully",
+                "backup_codes": backup_codes,
+            })
         else:
             return Response({"error": "Invalid code"}, status=400)
     
     @action(detail=False, methods=['post'], url_path='mfa/disable', permission_classes=[permissions.IsAuthenticated])
     def disable_mfa(self, request):
-        """Disable MFA (requires current TOTP code)"""
+        """Disable MFA (requires current TOTP code or a backup code)"""
         user_profile = request.user.profile
         code = request.data.get('code')
         
         if not user_profile.mfa_enabled:
             return Response({"error": "MFA not enabled"}, status=400)
         
-        totp = pyotp.TOTP(user_profile.mfa_secret)
-        
-        if totp.verify(code):
+        if verify_code(user_profile, code, ip=request.META.get('REMOTE_ADDR'), allow_backup=True):
             user_profile.mfa_enabled = False
             user_profile.mfa_secret = ''
+            user_profile.backup_codes = []
             user_profile.save()
             
             # Audit log
-            AuditLog.objects.create(
+            audit_log(
                 user=request.user,
                 action="MFA_DISABLED",
                 details="Multi-factor authentication disabled"
@@ -110,6 +164,27 @@ class InvestorProfileViewSet(viewsets.ModelViewSet):
         else:
             return Response({"error": "Invalid code"}, status=400)
 
+    @action(detail=False, methods=['post'], url_path='mfa/backup-codes', permission_classes=[permissions.IsAuthenticated])
+    def regenerate_backup_codes(self, request):
+        """Replace backup codes (requires current TOTP code)"""
+        user_profile = request.user.profile
+
+        if not user_profile.mfa_enabled:
+            return Response({"error": "MFA not enabled"}, status=400)
+
+        if not verify_code(user_profile, request.data.get('code'), ip=request.META.get('REMOTE_ADDR')):
+            return Response({"error": "Invalid code"}, status=400)
+
+        backup_codes = generate_backup_codes(user_profile)
+
+        audit_log(
+            user=request.user,
+            action="MFA_BACKUP_CODES",
+            details="Backup codes regenerated"
+        )
+
+        return Response({"backup_codes": backup_codes})
+
     @action(detail=False, methods=['post'], url_path='create_user', permission_classes=[permissions.IsAdminUser])
     def create_user(self, request):
         username = request.data.get('username')
@@ -126,7 +201,7 @@ class InvestorProfileViewSet(viewsets.ModelViewSet):
         InvestorProfile.objects.create(user=user)
         
         # Audit log
-        AuditLog.objects.create(
+        audit_log(
             user=request.user,
             action="CREATE_USER",
             details=f"Created user '{username}' with profile"
@@ -134,134 +209,243 @@ class InvestorProfileViewSet(viewsets.ModelViewSet):
         
         return Response({'message': 'User created successfully', 'username': username, 'email': email})
 
-class DocumentViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], url_path='bulk', permission_classes=[permissions.IsAdminUser],
+            parser_classes=[JSONParser, MultiPartParser])
+    def bulk_create_users(self, request):
+        """Create many investors from a JSON list ('investors') or an uploaded CSV/JSONL 'file'"""
+        upload = request.FILES.get('file')
+        if upload is not None:
+            fmt = os.path.splitext(upload.name)[1].lstrip('.').lower()
+            if fmt not in ('csv', 'jsonl'):
+                return Response({'error': 'file must be .csv or .jsonl'}, status=400)
+            records = read_records(text_stream(upload), fmt)
+        else:
+            investors = request.data.get('investors')
+            if not isinstance(investors, list):
+                return Response({'error': "Provide an 'investors' list or a CSV/JSONL 'file'"}, status=400)
+            records = ((line, record if isinstance(record, dict) else "Expected an object")
+                       for line, record in enumerate(investors, start=1))
+
+        limit = settings.PROVISIONING_API_MAX_RECORDS
+        records = list(islice(records, limit + 1))
+        if len(records) > limit:
+            return Response({'error': f'At most {limit} investors per request; use manage.py import_investors'},
+                            status=400)
+
+        report = provision_investors(records, actor=request.user, pool=api_hash_pool())
+
+        result = report.as_dict()
+        return Response(result, status=status.HTTP_207_MULTI_STATUS if result['failed'] else status.HTTP_201_CREATED)
+
+
+def download_filename(document):
+    """Filename offered to browsers; blob keys are bare hashes, so build one from the document name."""
+    if document.blob_id:
+        extension = mimetypes.guess_extension(document.blob.content_type) or ''
+        return f'{document.name}{extension}'.replace('"', '')
+    return os.path.basename(document.file.name)
+
+def record_pending_upload(upload):
+    """Record a verified presigned upload as the next document version; returns (document, created)."""
+    with transaction.atomic():
+        # Lock the upload so a retried finalize cannot create a second version
+        # 404 if gc_document_blobs collected it as abandoned meanwhile
+        upload = get_object_or_404(PendingUpload.objects.select_for_update(), pk=upload.pk)
+        if upload.document_id:
+            return upload.document, False
+        document = DocumentLineage.record_version(
+            investor=upload.investor,
+            name=upload.name,
+            doc_type=upload.doc_type,
+            file=upload.s3_key
+        )
+        upload.document = document
+        upload.save(update_fields=['document'])
+        # The client uploaded the bytes itself, so a worker hashes them into the blob store
+        enqueue('checksum_document', document_id=document.pk)
+    return document, True
+
+# Polled lists answer If-None-Match/If-Modified-Since with 304 before any query runs
+@method_decorator(conditional_list(document_scope), name='list')
+class DocumentViewSet(FastListMixin, viewsets.ModelViewSet):
     queryset = Document.objects.all()
     serializer_class = DocumentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = DocumentCursorPagination
 
     def get_queryset(self):
         user = self.request.user
         base_queryset = Document.objects.all() if user.is_staff else Document.objects.filter(investor__user=user)
+        if 'investor' in requested_expansions(self.request):
+            # Nested investor and user come from the same query instead of two lookups per row
+            base_queryset = base_queryset.select_related('investor__user')
 
         # If this is a detail route (e.g., download, history), return all docs so any version can be found
-        if self.action in ['retrieve', 'download', 'history']:
+        if self.action == 'download':
+            return base_queryset.select_related('blob')
+        if self.action in ['retrieve', 'history']:
             return base_queryset.order_by('-uploaded_at')
+        if self.action in ('export', 'archive') and self.request.query_params.get('all_versions') in ('1', 'true'):
+            return base_queryset.order_by('-uploaded_at', '-id')
+
+        # Only return the current head of each (investor, name, doc_type) lineage for list
+        return base_queryset.filter(lineage__isnull=False).order_by('-uploaded_at')
 
-        # Only return latest version for each (investor, name, doc_type) combination for list
-        latest_versions = []
-        unique_docs = base_queryset.values('investor', 'name', 'doc_type').distinct()
-        for doc_combo in unique_docs:
-            latest_doc = base_queryset.filter(
-                investor=doc_combo['investor'],
-                name=doc_combo['name'],
-                doc_type=doc_combo['doc_type']
-            ).order_by('-version').first()
-            if latest_doc:
-                latest_versions.append(latest_doc.id)
-        return base_queryset.filter(id__in=latest_versions).order_by('-uploaded_at')
+    def perform_content_negotiation(self, request, force=False):
+        # Proxied downloads are sent in the file's own type, whatever the client says it accepts
+        if self.action == 'download' and request.query_params.get('mode') == 'stream':
+            force = True
+        return super().perform_content_negotiation(request, force)
+
+    def list(self, request, *args, **kwargs):
+        if requested_expansions(request):
+            return super().list(request, *args, **kwargs)
+        # Flat rows skip per-field ModelSerializer rendering on this hot endpoint
+        return self.fast_list(self.filter_queryset(self.get_queryset()))
+
+    @action(detail=False, methods=['get'], renderer_classes=[CSVStreamRenderer, JSONLinesRenderer])
+    def export(self, request):
+        """Stream documents as CSV or JSON Lines (?format=csv|jsonl, ?gzip=1, ?all_versions=1)"""
+        queryset = self.filter_queryset(self.get_queryset())
+        audit_log(
+            user=request.user,
+            action='EXPORT',
+            details=f"Exported documents as {request.accepted_renderer.format}",
+        )
+        return export_response(
+            request,
+            queryset,
+            self.get_serializer_class(),
+            request.accepted_renderer.format,
+            'documents',
+            compress=request.query_params.get('gzip') in ('1', 'true'),
+        )
+
+    @action(detail=False, methods=['get'], renderer_classes=[ZipRenderer])
+    def archive(self, request):
+        """Stream documents from S3 as one zip (?investor=, ?doc_type=, ?all_versions=1)"""
+        queryset = self.filter_queryset(self.get_queryset())
+        investor = request.query_params.get('investor')
+        if investor:
+            if not investor.isdigit():
+                return Response({"error": "investor must be an investor profile id"}, status=400)
+            queryset = queryset.filter(investor_id=investor)
+        doc_type = request.query_params.get('doc_type')
+        if doc_type:
+            queryset = queryset.filter(doc_type=doc_type)
+
+        entries = archive_entries(queryset, limit=settings.ARCHIVE_MAX_DOCUMENTS + 1)
+        if len(entries) > settings.ARCHIVE_MAX_DOCUMENTS:
+            return Response(
+                {"error": f"More than {settings.ARCHIVE_MAX_DOCUMENTS} documents match; narrow the archive down"},
+                status=400,
+            )
+
+        audit_log_many([
+            (request.user, 'DOWNLOAD',
+             f"Downloaded document '{entry.name}' (ID: {entry.id}, version: {entry.version}) in an archive")
+            for entry in entries
+        ] + [(request.user, 'ARCHIVE', f"Downloaded an archive of {len(entries)} documents")])
+        return archive_response(request, entries, 'documents')
 
     def perform_create(self, serializer):
-        import boto3
-        import uuid
-        from django.core.files.base import ContentFile
-        
-        print("🚀 Starting Django document upload...")
-        
         try:
             investor_profile = self.request.user.profile
-            print(f"✅ Found investor profile: {investor_profile}")
         except InvestorProfile.DoesNotExist:
-            return Response(
-                {"error": "User must have an investor profile to upload documents"}, 
-                status=status.HTTP_400_BAD_REQUEST
+            raise serializers.ValidationError(
+                {"error": "User must have an investor profile to upload documents"}
             )
 
         name = serializer.validated_data['name']
         doc_type = serializer.validated_data['doc_type']
         file_obj = serializer.validated_data.get('file')
-        
-        print(f"📄 Document: {name}, type: {doc_type}, size: {file_obj.size} bytes")
-
-        # Find the latest version
-        latest_doc = (
-            Document.objects
-            .filter(investor=investor_profile, name=name, doc_type=doc_type)
-            .order_by('-version')
-            .first()
-        )
 
-        version = latest_doc.version + 1 if latest_doc else 1
-        previous_version = latest_doc if latest_doc else None
-        
-        print(f"📈 Version: {version}")
+        # Content-addressed upload: identical bytes are stored once and shared.
+        # New objects are verified against their checksum by a background job.
+        blob = store_blob(file_obj)
 
-        try:
-            # Manual S3 upload
-            print("📤 Uploading file directly to S3...")
-            
-            s3 = boto3.client(
-                's3',
-                aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-                aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-                region_name=os.getenv('AWS_S3_REGION_NAME')
-            )
-            
-            # Generate unique filename
-            file_extension = file_obj.name.split('.')[-1] if '.' in file_obj.name else 'pdf'
-            unique_filename = f"{name}_{uuid.uuid4().hex[:8]}.{file_extension}"
-            s3_key = f"documents/{unique_filename}"
-            
-            # Read file content
-            file_obj.seek(0)
-            file_content = file_obj.read()
-            
-            # Upload to S3
-            s3.put_object(
-                Bucket=os.getenv('AWS_STORAGE_BUCKET_NAME'),
-                Key=s3_key,
-                Body=file_content,
-                ServerSideEncryption='AES256',
-                ContentType=file_obj.content_type or 'application/pdf'
-            )
-            
-            print(f"✅ File uploaded to S3: {s3_key}")
-            
-            # Create document record with S3 path
-            document = Document.objects.create(
-                investor=investor_profile,
-                name=name,
-                doc_type=doc_type,
-                version=version,
-                previous_version=previous_version,
-                file=s3_key  # Store the S3 key
-            )
-            
-            print(f"✅ Document created: ID {document.id}")
-            
-            # Verify file exists in S3
-            try:
-                s3.head_object(Bucket=os.getenv('AWS_STORAGE_BUCKET_NAME'), Key=s3_key)
-                print(f"✅ File confirmed in S3: {s3_key}")
-            except Exception as check_error:
-                print(f"❌ File verification failed: {check_error}")
-            
-        except Exception as e:
-            print(f"❌ Error during upload: {e}")
-            raise
+        # Create document record with S3 path; the version is assigned under the lineage lock
+        document = DocumentLineage.record_version(
+            investor=investor_profile,
+            name=name,
+            doc_type=doc_type,
+            file=blob.s3_key,  # Store the S3 key
+            blob=blob
+        )
+        logger.info("Stored document %s version %s (%s bytes) as %s",
+                    document.id, document.version, file_obj.size, blob.s3_key)
 
         # Audit log
-        AuditLog.objects.create(
+        audit_log(
             user=self.request.user,
             action="UPLOAD",
             details=f"Uploaded document '{document.name}' (ID: {document.id}, version: {document.version})"
         )
-        print("✅ Audit log created")
+
+    @action(detail=False, methods=['post'], url_path='batch', parser_classes=[MultiPartParser])
+    def batch(self, request):
+        """Upload many files at once: 'files' plus an optional 'metadata' JSON list of {name, doc_type}"""
+        try:
+            investor_profile = request.user.profile
+        except InvestorProfile.DoesNotExist:
+            return Response({"error": "User must have an investor profile to upload documents"}, status=400)
+
+        files = request.FILES.getlist('files')
+        if not files:
+            return Response({"error": "No files provided"}, status=400)
+        if len(files) > settings.DOCUMENT_BATCH_MAX_FILES:
+            return Response({"error": f"At most {settings.DOCUMENT_BATCH_MAX_FILES} files per batch"}, status=400)
+        try:
+            metadata = json.loads(request.data.get('metadata') or '[]')
+        except ValueError:
+            return Response({"error": "metadata must be a JSON list"}, status=400)
+        if not isinstance(metadata, list) or (metadata and len(metadata) != len(files)):
+            return Response({"error": "metadata must be a JSON list with one entry per file"}, status=400)
+
+        results = [{'index': index, 'filename': file_obj.name} for index, file_obj in enumerate(files)]
+        entries = {}
+        for index, file_obj in enumerate(files):
+            item = metadata[index] if metadata else {}
+            item = {'name': os.path.splitext(file_obj.name)[0], **item} if isinstance(item, dict) else item
+            item_serializer = BatchUploadItemSerializer(data=item)
+            if item_serializer.is_valid():
+                entries[index] = item_serializer.validated_data
+            else:
+                results[index].update(status='failed', error=item_serializer.errors)
+
+        # Distinct new content goes to S3 concurrently; per-file failures don't sink the batch
+        blobs = store_blobs({index: files[index] for index in entries})
+        stored = []
+        for index, blob in blobs.items():
+            if isinstance(blob, Exception):
+                logger.warning("Batch upload of %s failed: %s", files[index].name, blob)
+                results[index].update(status='failed', error="Upload to storage failed")
+            else:
+                stored.append(index)
+
+        documents = DocumentLineage.record_versions(investor_profile, [
+            (entries[index]['name'], entries[index]['doc_type'], blobs[index]) for index in stored
+        ]) if stored else []
+        for index, document in zip(stored, documents):
+            results[index].update(status='created', id=document.id, name=document.name,
+                                  doc_type=document.doc_type, version=document.version, sha256=blobs[index].sha256)
+
+        audit_log_many([
+            (request.user, "UPLOAD", f"Uploaded document '{document.name}' (ID: {document.id}, version: {document.version}) in batch")
+            for document in documents
+        ])
+
+        failed = len(files) - len(documents)
+        return Response(
+            {'created': len(documents), 'failed': failed, 'results': results},
+            status=status.HTTP_207_MULTI_STATUS if failed else status.HTTP_201_CREATED,
+        )
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         
         # Audit log for download/view
-        AuditLog.objects.create(
+        audit_log(
             user=request.user,
             action="DOWNLOAD",
             details=f"Downloaded/viewed document '{instance.name}' (ID: {instance.id}, version: {instance.version})"
@@ -276,88 +460,230 @@ class DocumentViewSet(viewsets.ModelViewSet):
         instance = self.get_object()
         
         # Get all versions for this document's (investor, name, doc_type)
-        versions = Document.objects.filter(
-            investor=instance.investor,
+        versions = self.get_queryset().filter(
+            investor_id=instance.investor_id,
             name=instance.name,
             doc_type=instance.doc_type
         ).order_by('-version')
+        lineage = DocumentLineage.objects.filter(
+            investor_id=instance.investor_id,
+            name=instance.name,
+            doc_type=instance.doc_type
+        ).first()
         
         # Audit log for viewing history
-        AuditLog.objects.create(
+        audit_log(
             user=request.user,
             action="VIEW_HISTORY",
             details=f"Viewed version history for document '{instance.name}'"
         )
         
-        serializer = self.get_serializer(versions, many=True)
-        return Response({
-            'document_name': instance.name,
-            'document_type': instance.doc_type,
-            'total_versions': versions.count(),
-            'versions': serializer.data
-        })
+        return paginated_envelope(
+            self, versions, 'versions', ordering=('-version',),
+            document_name=instance.name,
+            document_type=instance.doc_type,
+            # Lineages are built by migration 0015; counting covers one not rebuilt yet
+            total_versions=lineage.version_count if lineage else versions.count()
+        )
 
     @action(detail=False, methods=['get'], url_path='latest')
     def latest_documents(self, request):
         """Get only the latest version of each document"""
-        # This is the same as the default queryset, but as an explicit endpoint
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        # This is the same as the default list, but as an explicit endpoint
+        return self.list(request)
 
     @action(detail=False, methods=['get'], url_path='by-type/(?P<doc_type>[^/.]+)')
     def by_type(self, request, doc_type=None):
         """Get documents filtered by document type"""
         queryset = self.get_queryset().filter(doc_type=doc_type)
-        serializer = self.get_serializer(queryset, many=True)
+        return paginated_envelope(
+            self, queryset, 'documents',
+            document_type=doc_type,
+            count=queryset.count()
+        )
+
+    @action(detail=False, methods=['post'], url_path='upload-url')
+    def upload_url(self, request):
+        """Return a presigned POST so the client can upload the file straight to S3."""
+        try:
+            investor_profile = request.user.profile
+        except InvestorProfile.DoesNotExist:
+            return Response({"error": "User must have an investor profile to upload documents"}, status=400)
+
+        params = UploadUrlRequestSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        filename = data.get('filename', '')
+        file_extension = filename.split('.')[-1] if '.' in filename else 'pdf'
+        upload = PendingUpload.objects.create(
+            investor=investor_profile,
+            name=data['name'],
+            doc_type=data['doc_type'],
+            s3_key=f"documents/{data['name']}_{uuid.uuid4().hex[:8]}.{file_extension}",
+            content_type=data['content_type'],
+            max_size=data['size'],
+        )
+
+        s3 = get_s3_client()
+        # S3 itself enforces the declared content type, the size limit and encryption at rest
+        presigned = s3.generate_presigned_post(
+            Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+            Key=upload.s3_key,
+            Fields={
+                'Content-Type': upload.content_type,
+                'x-amz-server-side-encryption': 'AES256',
+            },
+            Conditions=[
+                {'Content-Type': upload.content_type},
+                {'x-amz-server-side-encryption': 'AES256'},
+                ['content-length-range', 1, upload.max_size],
+            ],
+            ExpiresIn=settings.DOCUMENT_UPLOAD_URL_EXPIRY
+        )
         return Response({
-            'document_type': doc_type,
-            'count': queryset.count(),
-            'documents': serializer.data
-        })
+            'upload_id': upload.id,
+            'key': upload.s3_key,
+            'url': presigned['url'],
+            'fields': presigned['fields'],
+            'max_size': upload.max_size,
+            'content_type': upload.content_type,
+            'expires_in': settings.DOCUMENT_UPLOAD_URL_EXPIRY,
+        }, status=201)
+
+    @action(detail=False, methods=['post'], url_path=r'(?P<upload_id>[0-9a-f-]{36})/finalize')
+    def finalize(self, request, upload_id=None):
+        """Verify a presigned upload landed in S3 and record it as the next document version."""
+        upload = get_object_or_404(PendingUpload, pk=upload_id, investor__user=request.user)
+        if upload.document_id:
+            return Response(self.get_serializer(upload.document).data)
+        if upload.is_expired():
+            return Response({"error": "Upload has expired; request a new upload URL"}, status=410)
+
+        s3 = get_s3_client()
+        try:
+            head = s3.head_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=upload.s3_key)
+        except ClientError:
+            return Response({"error": "File has not been uploaded"}, status=400)
+
+        if head['ContentLength'] > upload.max_size or head.get('ContentType') != upload.content_type:
+            return Response({"error": "Uploaded file does not match the requested upload"}, status=400)
+
+        document, created = record_pending_upload(upload)
+        if not created:
+            return Response(self.get_serializer(document).data)
+
+        # Audit log
+        audit_log(
+            user=request.user,
+            action="UPLOAD",
+            details=f"Uploaded document '{document.name}' (ID: {document.id}, version: {document.version})"
+        )
+
+        return Response(self.get_serializer(document).data, status=201)
 
     @action(detail=True, methods=['get'], url_path='download')
     def download(self, request, pk=None):
-        """Return a pre-signed S3 URL for downloading the document."""
+        """Return a pre-signed S3 URL for downloading the document, or the file itself with ?mode=stream."""
         document = self.get_object()
-        s3 = boto3.client(
-            's3',
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_S3_REGION_NAME
-        )
         # The file field stores the S3 key
         s3_key = document.file.name
-        bucket = settings.AWS_STORAGE_BUCKET_NAME
 
-        # Generate a pre-signed URL valid for 5 minutes
-        url = s3.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': bucket, 'Key': s3_key},
-            ExpiresIn=300
-        )
-        return Response({'url': url})
+        mode = request.query_params.get('mode', 'url')
+        if mode not in ('url', 'stream'):
+            return Response({"error": "mode must be 'url' or 'stream'"}, status=400)
+        disposition = request.query_params.get('disposition')
+        if disposition and disposition not in ('inline', 'attachment'):
+            return Response({"error": "disposition must be 'inline' or 'attachment'"}, status=400)
+        if mode == 'stream':
+            # Relayed through this worker for clients that can't follow a presigned URL
+            return stream_download(request, s3_key, download_filename(document), disposition or 'inline')
+        if disposition:
+            disposition = f'{disposition}; filename="{download_filename(document)}"'
+
+        # Pre-signed URLs are cached, so clients polling the same document reuse one signature
+        url = presigned_download_url(s3_key, request.user.id, disposition)
+        # Deduplicated documents carry a checksum clients can verify the download against
+        return Response({'url': url, 'sha256': document.blob.sha256 if document.blob_id else None})
 
-class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
+    @action(detail=False, methods=['get'], url_path='download-cache-stats', permission_classes=[permissions.IsAdminUser])
+    def download_cache_stats(self, request):
+        """Hit/miss counters of this worker's presigned URL cache."""
+        return Response(presign_cache_stats())
+
+class AuditLogViewSet(FastListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = AuditLog.objects.all()
     serializer_class = AuditLogSerializer
     permission_classes = [permissions.IsAdminUser]  # Only admins can view logs
+    pagination_class = AuditLogCursorPagination
     
     def get_queryset(self):
         queryset = AuditLog.objects.all().order_by('-timestamp')
+        if 'user' in requested_expansions(self.request):
+            queryset = queryset.select_related('user')
         
         # Filter by user if specified
         user_id = self.request.query_params.get('user_id')
         if user_id:
             queryset = queryset.filter(user_id=user_id)
             
-        # Filter by action if specified
+        # Filter by event type(s) if specified, e.g. ?action=LOGIN,UPLOAD
         action = self.request.query_params.get('action')
         if action:
-            queryset = queryset.filter(action__icontains=action)
+            queryset = queryset.filter(action__in=[a.strip().upper() for a in action.split(',') if a.strip()])
+
+        # Filter by time range if specified (ISO 8601 datetimes or dates)
+        since = self._parse_time_param('since')
+        if since:
+            queryset = queryset.filter(timestamp__gte=since)
+        until = self._parse_time_param('until')
+        if until:
+            queryset = queryset.filter(timestamp__lt=until)
+
+        # Full-text search over details if specified
+        q = self.request.query_params.get('q')
+        if q:
+            queryset = queryset.search(q)
             
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        if requested_expansions(request):
+            return super().list(request, *args, **kwargs)
+        return self.fast_list(self.filter_queryset(self.get_queryset()))
+
+    @action(detail=False, methods=['get'], renderer_classes=[CSVStreamRenderer, JSONLinesRenderer])
+    def export(self, request):
+        """Stream filtered audit logs as CSV or JSON Lines (?format=csv|jsonl, ?gzip=1)"""
+        queryset = self.filter_queryset(self.get_queryset()).order_by('-timestamp', '-id')
+        audit_log(
+            user=request.user,
+            action='EXPORT',
+            details=f"Exported audit logs as {request.accepted_renderer.format} ({request.GET.urlencode()})",
+        )
+        return export_response(
+            request,
+            queryset,
+            self.get_serializer_class(),
+            request.accepted_renderer.format,
+            'auditlogs',
+            compress=request.query_params.get('gzip') in ('1', 'true'),
+        )
+
+    def _parse_time_param(self, name):
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                raise serializers.ValidationError({name: "Expected an ISO 8601 date or datetime"})
+            parsed = datetime.datetime.combine(day, datetime.time.min)
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, datetime.timezone.utc)
+        return parsed
+
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
 def login_with_mfa(request):
@@ -379,23 +705,44 @@ def login_with_mfa(request):
                 "message": "MFA code required"
             }, status=200)
         
-        # Verify MFA code
-        totp = pyotp.TOTP(user.profile.mfa_secret)
-        if not totp.verify(mfa_code):
+        # Verify MFA code (TOTP codes are single-use; backup codes also accepted)
+        if not verify_code(user.profile, mfa_code, ip=request.META.get('REMOTE_ADDR'), allow_backup=True):
             return Response({"error": "Invalid MFA code"}, status=400)
     
-    # Create or get token
-    token, created = Token.objects.get_or_create(user=user)
+    # Issue an expiring token for this device, replacing any earlier one
+    device = str(request.data.get('device') or '')[:255]
+    token, auth_token = issue_token(user, device)
     
     # Audit log
-    AuditLog.objects.create(
+    audit_log(
         user=user,
         action="LOGIN",
         details=f"User logged in {'with MFA' if user.profile.mfa_enabled else 'without MFA'}"
     )
     
     return Response({
-        "token": token.key,
+        "token": token,
+        "expires_at": auth_token.expires_at,
         "user_id": user.id,
         "mfa_enabled": user.profile.mfa_enabled
     })
+
+
+@api_view(['POST'])
+def logout_view(request):
+    """Revoke the token used for this request, or every device's token with all_devices"""
+    if request.data.get('all_devices'):
+        revoke_tokens(AuthToken.objects.filter(user=request.user))
+    elif isinstance(request.auth, AuthToken):
+        revoke_tokens(AuthToken.objects.filter(pk=request.auth.pk))
+    if isinstance(request.auth, Token):
+        request.auth.delete()  # post_delete drops its cached snapshot
+    logout(request._request)
+
+    audit_log(
+        user=request.user,
+        action="LOGOUT",
+        details="User logged out"
+    )
+
+    return Response({"message": "Logged out"})
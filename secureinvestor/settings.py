@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 
 # Load environment variables from .env
@@ -20,6 +21,8 @@ load_dotenv()
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -78,6 +81,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'secureinvestor.wsgi.application'
+ASGI_APPLICATION = 'secureinvestor.asgi.application'
 
 
 # Database
@@ -94,6 +98,30 @@ DATABASES = {
     }
 }
 
+# Cache
+# Auth snapshots and presigned URLs must be shared by every worker in production,
+# so point REDIS_URL at Redis there; the per-process fallback is for development.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
+# Conditional GETs on polled lists (investors.changes): 304s need the change versions every
+# worker bumps, so they are only answered with a shared cache. A version lives at most
+# CHANGE_VERSION_TTL seconds, which bounds how long a missed bump can go unnoticed.
+CONDITIONAL_LIST_RESPONSES = os.getenv('CONDITIONAL_LIST_RESPONSES', str(bool(os.getenv('REDIS_URL')))) == 'True'
+CHANGE_VERSION_TTL = int(os.getenv('CHANGE_VERSION_TTL', 300))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -139,13 +167,44 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Add to settings.py
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'investors.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'investors.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'investors.pagination.DefaultCursorPagination',
+    'PAGE_SIZE': int(os.getenv('API_PAGE_SIZE', 50)),
 }
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 500))
+
+# Lifetime of tokens issued by /api/auth/login/
+AUTH_TOKEN_TTL = int(os.getenv('AUTH_TOKEN_TTL', 12 * 60 * 60))
+# Seconds a user/profile snapshot or active-token state is served from cache
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', 60))
+# Failed MFA attempts allowed in a burst, and refilled per minute, per user and per client IP
+MFA_USER_BURST = int(os.getenv('MFA_USER_BURST', 5))
+MFA_USER_PER_MINUTE = float(os.getenv('MFA_USER_PER_MINUTE', 5))
+MFA_IP_BURST = int(os.getenv('MFA_IP_BURST', 20))
+MFA_IP_PER_MINUTE = float(os.getenv('MFA_IP_PER_MINUTE', 20))
+MFA_BACKUP_CODE_COUNT = 10
+# Seconds browsers may reuse the MFA enrolment QR image (private caches only)
+MFA_QR_MAX_AGE = int(os.getenv('MFA_QR_MAX_AGE', 300))
+
+# Bulk investor provisioning (import_investors, POST /api/investors/bulk/)
+PROVISIONING_CHUNK_SIZE = int(os.getenv('PROVISIONING_CHUNK_SIZE', 500))
+PROVISIONING_HASH_WORKERS = int(os.getenv('PROVISIONING_HASH_WORKERS', os.cpu_count() or 1))
+# Records accepted per API request; larger imports belong in the management command
+PROVISIONING_API_MAX_RECORDS = int(os.getenv('PROVISIONING_API_MAX_RECORDS', 1000))
+# Hashing processes per web worker for the API, shared by its requests (0 hashes inline)
+PROVISIONING_API_HASH_WORKERS = int(os.getenv('PROVISIONING_API_HASH_WORKERS', 2))
+
+# Rows fetched per database round trip when streaming CSV/JSONL exports
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 2000))
 
 # Comment out these lines in settings.py:
 # DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
@@ -158,6 +217,85 @@ AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
 AWS_STORAGE_BUCKET_NAME = os.getenv('AWS_STORAGE_BUCKET_NAME')
 AWS_S3_REGION_NAME = os.getenv('AWS_S3_REGION_NAME', 'us-east-2')
 
+# Shared S3 client (investors.storage.get_s3_client); the pool must cover AWS_S3_MAX_CONCURRENCY
+AWS_S3_ENDPOINT_URL = os.getenv('AWS_S3_ENDPOINT_URL') or None
+AWS_S3_MAX_POOL_CONNECTIONS = int(os.getenv('AWS_S3_MAX_POOL_CONNECTIONS', 20))
+AWS_S3_MAX_ATTEMPTS = int(os.getenv('AWS_S3_MAX_ATTEMPTS', 5))
+AWS_S3_CONNECT_TIMEOUT = int(os.getenv('AWS_S3_CONNECT_TIMEOUT', 5))
+AWS_S3_READ_TIMEOUT = int(os.getenv('AWS_S3_READ_TIMEOUT', 60))
+
+# Multipart upload tuning: peak memory per upload is roughly chunksize x concurrency
+AWS_S3_MULTIPART_THRESHOLD = int(os.getenv('AWS_S3_MULTIPART_THRESHOLD', 8 * 1024 * 1024))
+AWS_S3_MULTIPART_CHUNKSIZE = int(os.getenv('AWS_S3_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024))
+AWS_S3_MAX_CONCURRENCY = int(os.getenv('AWS_S3_MAX_CONCURRENCY', 4))
+
+# Presigned direct-to-S3 uploads (POST /api/documents/upload-url/)
+DOCUMENT_UPLOAD_URL_EXPIRY = int(os.getenv('DOCUMENT_UPLOAD_URL_EXPIRY', 900))
+# Seconds after the URL expires that finalize is still accepted; later, uploads are collected by gc_document_blobs
+DOCUMENT_UPLOAD_FINALIZE_GRACE = int(os.getenv('DOCUMENT_UPLOAD_FINALIZE_GRACE', 300))
+DOCUMENT_UPLOAD_MAX_SIZE = int(os.getenv('DOCUMENT_UPLOAD_MAX_SIZE', 5 * 1024 ** 3))
+DOCUMENT_UPLOAD_CONTENT_TYPES = [
+    'application/pdf',
+    'image/jpeg',
+    'image/png',
+    'image/tiff',
+]
+
+# Presigned download URLs are cached and reused until MIN_REMAINING seconds before they expire
+DOCUMENT_DOWNLOAD_URL_EXPIRY = int(os.getenv('DOCUMENT_DOWNLOAD_URL_EXPIRY', 300))
+DOCUMENT_DOWNLOAD_URL_MIN_REMAINING = int(os.getenv('DOCUMENT_DOWNLOAD_URL_MIN_REMAINING', 120))
+DOCUMENT_DOWNLOAD_URL_LOCAL_CACHE_SIZE = int(os.getenv('DOCUMENT_DOWNLOAD_URL_LOCAL_CACHE_SIZE', 1024))
+
+# Chunk size for relaying document bytes from S3 in proxied downloads (download?mode=stream)
+DOCUMENT_STREAM_CHUNK_SIZE = int(os.getenv('DOCUMENT_STREAM_CHUNK_SIZE', 64 * 1024))
+
+# Uploaded documents are stored once per distinct SHA-256 under this prefix; unreferenced
+# blobs are deleted by gc_document_blobs after the grace period
+DOCUMENT_BLOB_PREFIX = os.getenv('DOCUMENT_BLOB_PREFIX', 'blobs/sha256/')
+DOCUMENT_BLOB_GC_GRACE_HOURS = int(os.getenv('DOCUMENT_BLOB_GC_GRACE_HOURS', 24))
+
+# Batch uploads (POST /api/documents/batch/): files per request and concurrent S3 uploads
+DOCUMENT_BATCH_MAX_FILES = int(os.getenv('DOCUMENT_BATCH_MAX_FILES', 50))
+DOCUMENT_BATCH_UPLOAD_WORKERS = int(os.getenv('DOCUMENT_BATCH_UPLOAD_WORKERS', 8))
+
+# Serve document upload, finalize, download and history from async views (investors.async_views).
+# Only worth enabling under ASGI (the compose "asgi" profile); under WSGI each request gets its own event loop.
+ASYNC_DOCUMENT_VIEWS = os.getenv('ASYNC_DOCUMENT_VIEWS', 'False') == 'True'
+
+# Zip archives (GET /api/documents/archive/): most documents per archive, S3 objects opened
+# ahead of the one being written, and the size of the chunks streamed from S3
+ARCHIVE_MAX_DOCUMENTS = int(os.getenv('ARCHIVE_MAX_DOCUMENTS', 10000))
+ARCHIVE_PREFETCH = int(os.getenv('ARCHIVE_PREFETCH', 4))
+ARCHIVE_CHUNK_SIZE = int(os.getenv('ARCHIVE_CHUNK_SIZE', 256 * 1024))
+
+# Background jobs (investors.jobs, manage.py run_worker): retries back off from JOB_BACKOFF_BASE
+# seconds, doubling up to JOB_BACKOFF_MAX; a running job not finished within JOB_LOCK_TIMEOUT
+# seconds is assumed lost with its worker and is run again
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1.0))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 5))
+JOB_BACKOFF_BASE = int(os.getenv('JOB_BACKOFF_BASE', 10))
+JOB_BACKOFF_MAX = int(os.getenv('JOB_BACKOFF_MAX', 3600))
+JOB_LOCK_TIMEOUT = int(os.getenv('JOB_LOCK_TIMEOUT', 600))
+
+# Spool every upload to a temp file on disk (hashing it on the way) instead of holding it in worker memory
+FILE_UPLOAD_HANDLERS = ['investors.uploadhandlers.HashingTemporaryFileUploadHandler']
+FILE_UPLOAD_TEMP_DIR = os.getenv('FILE_UPLOAD_TEMP_DIR') or None
+
+# Audit entries are queued and bulk-inserted off the request thread (investors.audit).
+# Tests write them synchronously so assertions see them immediately.
+AUDIT_LOG_SYNC = os.getenv('AUDIT_LOG_SYNC', str(TESTING)) == 'True'
+AUDIT_LOG_BATCH_SIZE = int(os.getenv('AUDIT_LOG_BATCH_SIZE', 200))
+AUDIT_LOG_FLUSH_INTERVAL = float(os.getenv('AUDIT_LOG_FLUSH_INTERVAL', 2.0))
+AUDIT_LOG_SPOOL_DIR = os.getenv('AUDIT_LOG_SPOOL_DIR', os.path.join(BASE_DIR, 'audit_spool'))
+
+# Monthly AuditLog partitions on PostgreSQL (manage.py maintain_audit_partitions)
+AUDIT_LOG_PARTITIONS_AHEAD = int(os.getenv('AUDIT_LOG_PARTITIONS_AHEAD', 3))
+AUDIT_LOG_RETENTION_MONTHS = int(os.getenv('AUDIT_LOG_RETENTION_MONTHS', 84))
+AUDIT_LOG_ARCHIVE_PREFIX = os.getenv('AUDIT_LOG_ARCHIVE_PREFIX', 'audit-archive/')
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
 ]
+# Let the frontend's PDF viewer read the headers of proxied (?mode=stream) downloads
+CORS_EXPOSE_HEADERS = ['Accept-Ranges', 'Content-Disposition', 'Content-Length', 'Content-Range', 'ETag', 'Last-Modified']
@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework import routers
 from rest_framework.authtoken.views import obtain_auth_token
-from investors.views import InvestorProfileViewSet, DocumentViewSet, AuditLogViewSet, login_with_mfa
+from investors.views import InvestorProfileViewSet, DocumentViewSet, AuditLogViewSet, login_with_mfa, logout_view
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -16,7 +16,12 @@ urlpatterns = [
     path('api/', include(router.urls)),
     path('api/auth/token/', obtain_auth_token, name='api_token_auth'),
     path('api/auth/login/', login_with_mfa, name='login_with_mfa'),  # Add this line
+    path('api/auth/logout/', logout_view, name='logout'),
 ]
 
+if settings.ASYNC_DOCUMENT_VIEWS:
+    # Async upload/finalize/download/history take precedence over the router's sync actions
+    urlpatterns.insert(1, path('api/', include('investors.async_urls')))
+
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file